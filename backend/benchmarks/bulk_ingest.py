@@ -0,0 +1,89 @@
+"""Throughput of the streaming bulk order endpoint.
+
+Starts the API under uvicorn with in-memory storage and uploads N orders
+to /api/admin/orders/bulk as a streamed NDJSON and CSV body, reporting rows
+per second and the server's RSS growth. Results are printed as JSON.
+
+    python benchmarks/bulk_ingest.py --rows 50000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from common import PARCEL, admin_headers, free_port, rss_mb, start_server, wait_ready
+
+CSV_HEADER = (
+    "sender_name,sender_email,sender_phone,sender_address,"
+    "receiver_name,receiver_email,receiver_phone,receiver_address,"
+    "description,weight,value,length,width,height\n"
+)
+CSV_ROW = (
+    'Load Test,sender@example.com,1,"San Francisco, CA",'
+    'Load Test,receiver@example.com,2,"Los Angeles, CA",'
+    "Load test,1-5kg,1,1,1,1\n"
+)
+
+
+async def ndjson_body(rows: int, batch: int = 1000):
+    line = (json.dumps(PARCEL) + "\n").encode()
+    for start in range(0, rows, batch):
+        yield line * min(batch, rows - start)
+
+
+async def csv_body(rows: int, batch: int = 1000):
+    yield CSV_HEADER.encode()
+    line = CSV_ROW.encode()
+    for start in range(0, rows, batch):
+        yield line * min(batch, rows - start)
+
+
+async def upload(client, headers, body, fmt: str, rows: int, pid: int) -> dict:
+    rss_before = rss_mb(pid)
+    started = time.perf_counter()
+    async with client.stream(
+        "POST", f"/api/admin/orders/bulk?format={fmt}", content=body, headers=headers
+    ) as response:
+        response.raise_for_status()
+        summary = None
+        async for line in response.aiter_lines():
+            if line.startswith('{"summary"'):
+                summary = json.loads(line)["summary"]
+    seconds = time.perf_counter() - started
+    return {
+        "format": fmt,
+        "rows": rows,
+        "created": summary["created"],
+        "seconds": round(seconds, 2),
+        "rows_per_second": round(rows / seconds),
+        "rss_growth_mb": round(rss_mb(pid) - rss_before, 1),
+    }
+
+
+async def run(args) -> list:
+    port = free_port()
+    server = start_server(port, ENABLE_SIMULATION="false")
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+            await wait_ready(client)
+            headers = await admin_headers(client)
+            return [
+                await upload(client, headers, ndjson_body(args.rows), "ndjson", args.rows, server.pid),
+                await upload(client, headers, csv_body(args.rows), "csv", args.rows, server.pid),
+            ]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Cold start: import time of the API module and time until it serves.
+
+Three measurements, each repeated `--runs` times in fresh processes:
+
+- import:  wall time of `python -c "import main"`, plus the slowest modules
+           that main imports directly (from `-X importtime`, one run)
+- serving: from starting uvicorn until /api/health first answers 200
+- ready:   until /api/ready answers 200, i.e. the search index and
+           dashboard totals have been rebuilt from storage
+
+With `--parcels N` the server starts on a SQLite store that already holds
+N parcels, so the rebuild has real work to do and `serving` shows that
+requests are answered while it runs.
+
+Results are printed as JSON with the commit they were measured at.
+`--history FILE` also appends them as one line to FILE, so cold start can
+be followed from commit to commit:
+
+    python benchmarks/cold_start.py --runs 5 --history cold_start.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+
+from common import BACKEND_DIR, free_port, start_server
+from load_test import git_commit
+from parcel_memory import make_parcel
+
+sys.path.insert(0, BACKEND_DIR)
+
+from storage import SQLiteStorage  # noqa: E402
+
+# Keep the geocoder's on-disk cache out of the measurement
+SERVER_ENV = {"GEOCODER_CACHE_PATH": "", "ENABLE_SIMULATION": "false"}
+
+
+def summarize(samples: List[float]) -> Dict:
+    return {"min_ms": round(min(samples) * 1000, 1), "median_ms": round(statistics.median(samples) * 1000, 1)}
+
+
+def import_times(runs: int) -> Dict:
+    env = dict(os.environ, **SERVER_ENV)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - started)
+
+    trace = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    ).stderr
+    # Lines are "import time: self | cumulative | name"; a module's imports are
+    # listed just before it, indented one level deeper
+    rows = [line.split("|") for line in trace.splitlines()[1:]]
+    names = [(len(name) - len(name.lstrip()), name.strip(), int(cumulative)) for _, cumulative, name in rows]
+    end = next(i for i, (indent, name, _) in enumerate(names) if indent == 1 and name == "main")
+    start = max((i for i, (indent, _, _) in enumerate(names[:end]) if indent == 1), default=-1) + 1
+    modules = sorted(((us, name) for indent, name, us in names[start:end] if indent == 3), reverse=True)
+    return {
+        **summarize(samples),
+        "slowest_imports_ms": {name: round(us / 1000, 1) for us, name in modules[:10]},
+    }
+
+
+async def seed_store(path: str, parcels: int) -> None:
+    rng = random.Random(1)
+    store = SQLiteStorage(path)
+    await store.start()
+    for start in range(0, parcels, 5000):
+        await store.save_parcels([json.loads(make_parcel(rng, i)) for i in range(start, min(start + 5000, parcels))])
+    await store.close()
+
+
+async def startup_times(runs: int, parcels: int) -> Dict:
+    serving, ready = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(SERVER_ENV)
+        if parcels:
+            env.update(STORAGE_BACKEND="sqlite", STORAGE_SQLITE_PATH=os.path.join(directory, "swiftify.db"))
+            await seed_store(env["STORAGE_SQLITE_PATH"], parcels)
+        for _ in range(runs):
+            port = free_port()
+            started = time.perf_counter()
+            server = start_server(port, stdout=subprocess.DEVNULL, **env)
+            try:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+                    served_at = None
+                    while True:
+                        try:
+                            if served_at is None and (await client.get("/api/health")).status_code == 200:
+                                served_at = time.perf_counter()
+                            if served_at is not None and (await client.get("/api/ready")).status_code == 200:
+                                break
+                        except httpx.TransportError:
+                            pass
+                        if time.perf_counter() - started > 300:
+                            raise RuntimeError("server did not become ready within 300s")
+                        await asyncio.sleep(0.005)
+                    serving.append(served_at - started)
+                    ready.append(time.perf_counter() - started)
+            finally:
+                server.terminate()
+                server.wait()
+    return {"serving": summarize(serving), "ready": summarize(ready)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--parcels", type=int, default=0, help="parcels in a SQLite store the server starts on")
+    parser.add_argument("--history", help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+    result = {
+        "commit": git_commit(),
+        "measured_at": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "parcels": args.parcels,
+        "import": import_times(args.runs),
+        **asyncio.run(startup_times(args.runs, args.parcels)),
+    }
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
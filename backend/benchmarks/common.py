@@ -0,0 +1,62 @@
+"""Helpers shared by the benchmark scripts."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ADMIN_KEY = "SwiftifyAdmin2025!ComplexSecureKey#$%789XYZLogistics"
+
+PARCEL = {
+    "sender": {"name": "Load Test", "email": "sender@example.com", "phone": "1", "address": "San Francisco, CA"},
+    "receiver": {"name": "Load Test", "email": "receiver@example.com", "phone": "2", "address": "Los Angeles, CA"},
+    "parcelDetails": {"description": "Load test", "weight": "1-5kg", "dimensions": {"length": 1, "width": 1, "height": 1}, "value": 1},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def start_server(port: int, stdout=None, workers: int = 1, **env) -> subprocess.Popen:
+    """Run the API under uvicorn with in-memory storage; `stdout` redirects its output"""
+    # Benchmarks drive the API from one address, so per-client limits are off
+    server_env = dict(os.environ, **{"STORAGE_BACKEND": "memory", "RATE_LIMIT_ENABLED": "false", **env})
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--backlog", "4096", "--workers", str(workers)],
+        cwd=BACKEND_DIR,
+        env=server_env,
+        stdout=stdout,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            if (await client.get("/api/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def admin_headers(client: httpx.AsyncClient) -> dict:
+    key = os.getenv("ADMIN_KEY", DEFAULT_ADMIN_KEY)
+    response = await client.post("/api/admin/login", json={"key": key})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
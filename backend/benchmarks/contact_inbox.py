@@ -0,0 +1,113 @@
+"""Memory and query cost of the contact inbox under a flood of messages.
+
+Adds `--messages` synthetic contact messages to a `ContactInbox` with the
+given hot window and reports, at several points along the way, the memory
+the inbox holds (tracemalloc) and the resident memory of the process. The
+same run with `--hot-window 0` keeps every message in memory, for
+comparison. At the end it times a page of the newest messages, a page of
+the oldest, a page of the rarest status, and a bulk archive of everything
+read before the midpoint. Results are printed as JSON.
+
+    python benchmarks/contact_inbox.py --messages 1000000
+    python benchmarks/contact_inbox.py --messages 1000000 --hot-window 0
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from common import BACKEND_DIR, rss_mb
+
+sys.path.insert(0, BACKEND_DIR)
+
+from inbox import ContactInbox  # noqa: E402
+
+WORDS = "parcel delivery late address change refund pickup damaged invoice tracking please thanks".split()
+
+
+def make_message(rng: random.Random, i: int, start: datetime) -> dict:
+    return {
+        "id": f"{rng.getrandbits(128):032x}",
+        "name": f"Sender {i}",
+        "email": f"sender{i}@example.com",
+        "message": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 40))),
+        "timestamp": (start + timedelta(milliseconds=i * 50)).isoformat(),
+        "status": "new",
+    }
+
+
+def timed(fn, repeat: int = 20) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--hot-window", type=int, default=5000, help="0 keeps every message in memory")
+    parser.add_argument("--segment-size", type=int, default=1000)
+    parser.add_argument("--checkpoints", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = datetime(2026, 1, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        inbox = ContactInbox(directory, hot_size=args.hot_window, segment_size=args.segment_size)
+        inbox.open()
+        tracemalloc.start()
+        growth = []
+        step = max(1, args.messages // args.checkpoints)
+        started = time.perf_counter()
+        for i in range(args.messages):
+            message = make_message(rng, i, start)
+            # A few are read, so one status is rare
+            if rng.random() < 0.01:
+                message["status"] = "read"
+            inbox.add(message)
+            if (i + 1) % step == 0 or i + 1 == args.messages:
+                growth.append({
+                    "messages": i + 1,
+                    "inbox_mb": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 1),
+                    "rss_mb": round(rss_mb(os.getpid()), 1),
+                })
+        add_seconds = time.perf_counter() - started
+        tracemalloc.stop()
+
+        middle = (start + timedelta(milliseconds=args.messages * 25)).isoformat()
+        oldest = inbox.query(limit=1)[0]
+        queries = {
+            "newest_page_ms": timed(lambda: inbox.query(descending=True, limit=50)),
+            "oldest_page_ms": timed(lambda: inbox.query(after=("", ""), limit=50)),
+            "page_after_oldest_ms": timed(lambda: inbox.query(after=(oldest["timestamp"], oldest["id"]), limit=50)),
+            "rare_status_page_ms": timed(lambda: inbox.query(status="read", descending=True, limit=50)),
+            "counts_ms": timed(lambda: [inbox.count(status) for status in ("new", "read", "archived")]),
+        }
+        started = time.perf_counter()
+        archived = len(inbox.set_status("archived", status="read", before=middle))
+        bulk_seconds = time.perf_counter() - started
+
+        print(json.dumps({
+            "messages": args.messages,
+            "hot_window": args.hot_window,
+            "segment_size": args.segment_size,
+            "adds_per_second": round(args.messages / add_seconds),
+            "memory": growth,
+            "queries": queries,
+            "bulk_archive": {"archived": archived, "seconds": round(bulk_seconds, 3)},
+            "inbox": inbox.stats(),
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Reproducible load test of the API.
+
+Starts the local Supabase and SMTP stand-ins (`stubs.py`) and the API under
+uvicorn pointed at them. It seeds N parcels through /api/admin/orders/bulk,
+then drives each workload for a fixed time from concurrent async clients:
+
+- track:    tracking lookups of random seeded parcels, plus a few new orders
+- admin:    filtered parcel listings with cursor paging, search, dashboard stats
+- schedule: bursts of concurrent /api/schedule calls
+
+Every operation gets throughput and p50/p95/p99/max latency. The server
+gets its RSS (start, peak, end) and CPU time per workload. The results go
+to a JSON file together with the commit and settings. `--compare` puts the
+change against an earlier result file next to each number, so a change to
+main.py can be checked for regressions:
+
+    python benchmarks/load_test.py --parcels 100000 --output base.json
+    python benchmarks/load_test.py --parcels 100000 --compare base.json --output new.json
+
+Random choices are seeded (`--seed`), so two runs issue the same requests.
+The load generator shares the machine with the server; compare runs made
+on the same machine with the same settings.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from common import BACKEND_DIR, admin_headers, free_port, rss_mb, start_server, wait_ready
+
+STATUSES = ["pending", "picked-up", "in-transit", "at-hub", "out-for-delivery", "delivered"]
+NAMES = ["Ann Lee", "Bob Smith", "Carla Garcia", "Dmitri Novak", "Elena Rossi", "Farah Patel", "Hiro Kim"]
+ITEMS = ["Books", "Laptop", "Shoes", "Documents", "Camera", "Toys", "Ceramic vase"]
+WEIGHTS = ["<1kg", "1-5kg", "5-10kg", "10-20kg"]
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def load_places() -> List[str]:
+    with open(os.path.join(BACKEND_DIR, "data", "places.csv"), newline="") as f:
+        return [f"{row['name']}, {row['region']}" for row in csv.DictReader(f)]
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def make_order(rng: random.Random, places: List[str], i: int) -> Dict:
+    sender, receiver = rng.sample(NAMES, 2)
+    return {
+        "sender": {"name": sender, "email": f"sender{i}@example.com", "phone": "+1 555 0100", "address": f"{rng.randint(1, 999)} Main St, {rng.choice(places)}"},
+        "receiver": {"name": receiver, "email": f"receiver{i}@example.com", "phone": "+1 555 0199", "address": f"{rng.randint(1, 999)} Oak Ave, {rng.choice(places)}"},
+        "parcelDetails": {
+            "description": rng.choice(ITEMS),
+            "weight": rng.choice(WEIGHTS),
+            "dimensions": {"length": 30, "width": 20, "height": rng.randint(5, 40)},
+            "value": rng.randint(10, 1000),
+        },
+    }
+
+
+class Recorder:
+    """Latencies and error counts per operation"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def call(self, name: str, request) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            response = None
+        self.latencies.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+        if response is None or response.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            return None
+        return response
+
+    def summary(self, seconds: float) -> Dict:
+        operations = {}
+        for name, samples in sorted(self.latencies.items()):
+            samples.sort()
+            operations[name] = {
+                "requests": len(samples),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(samples) / seconds, 1),
+                "p50_ms": round(statistics.median(samples), 2),
+                "p95_ms": round(samples[int(len(samples) * 0.95) - 1] if len(samples) > 1 else samples[0], 2),
+                "p99_ms": round(samples[int(len(samples) * 0.99) - 1] if len(samples) > 1 else samples[0], 2),
+                "max_ms": round(samples[-1], 2),
+            }
+        total = sum(op["requests"] for op in operations.values())
+        return {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "throughput_rps": round(total / seconds, 1),
+            "operations": operations,
+        }
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, headers: Dict, ids: List[str], places: List[str], seed: int):
+        self.client = client
+        self.headers = headers
+        self.ids = ids
+        self.places = places
+        self.rng = random.Random(seed)
+        self.orders = 0
+
+    def order(self) -> Dict:
+        self.orders += 1
+        return make_order(self.rng, self.places, 10 ** 8 + self.orders)
+
+
+async def track_worker(ctx: Context, recorder: Recorder, deadline: float, schedule_share: float) -> None:
+    while time.perf_counter() < deadline:
+        if ctx.rng.random() < schedule_share:
+            await recorder.call("schedule", ctx.client.post("/api/schedule", json=ctx.order()))
+        else:
+            await recorder.call("track", ctx.client.get(f"/api/track/{ctx.rng.choice(ctx.ids)}"))
+
+
+async def admin_worker(ctx: Context, recorder: Recorder, deadline: float, max_pages: int) -> None:
+    while time.perf_counter() < deadline:
+        roll = ctx.rng.random()
+        if roll < 0.5:
+            params = {"limit": 50}
+            if ctx.rng.random() < 0.5:
+                params["status"] = ctx.rng.choice(STATUSES[:2])
+            response = await recorder.call("list", ctx.client.get("/api/admin/parcels", params=params, headers=ctx.headers))
+            for _ in range(ctx.rng.randint(0, max_pages - 1)):
+                cursor = response.json().get("nextCursor") if response is not None else None
+                if not cursor or time.perf_counter() >= deadline:
+                    break
+                response = await recorder.call(
+                    "list_next", ctx.client.get("/api/admin/parcels", params={**params, "cursor": cursor}, headers=ctx.headers)
+                )
+        elif roll < 0.8:
+            query = ctx.rng.choice([ctx.rng.choice(NAMES), ctx.rng.choice(ctx.places).split(",")[0], ctx.rng.choice(ctx.ids)[:10]])
+            await recorder.call("search", ctx.client.get("/api/admin/search", params={"q": query}, headers=ctx.headers))
+        else:
+            await recorder.call("stats", ctx.client.get("/api/admin/stats", headers=ctx.headers))
+
+
+async def schedule_bursts(ctx: Context, recorder: Recorder, deadline: float, burst: int, pause: float) -> None:
+    while time.perf_counter() < deadline:
+        await asyncio.gather(*(
+            recorder.call("schedule", ctx.client.post("/api/schedule", json=ctx.order())) for _ in range(burst)
+        ))
+        await asyncio.sleep(pause)
+
+
+async def run_workload(name: str, ctx: Context, args, pid: int) -> Dict:
+    async def drive(recorder: Recorder, seconds: float) -> None:
+        deadline = time.perf_counter() + seconds
+        if name == "track":
+            await asyncio.gather(*(track_worker(ctx, recorder, deadline, args.schedule_share) for _ in range(args.concurrency)))
+        elif name == "admin":
+            await asyncio.gather(*(admin_worker(ctx, recorder, deadline, args.max_pages) for _ in range(args.concurrency)))
+        else:
+            await schedule_bursts(ctx, recorder, deadline, args.burst, args.burst_pause)
+
+    if args.warmup:
+        await drive(Recorder(), args.warmup)
+
+    rss = [rss_mb(pid)]
+    stop = asyncio.Event()
+
+    async def sample_rss() -> None:
+        while not stop.is_set():
+            await asyncio.sleep(0.25)
+            rss.append(rss_mb(pid))
+
+    sampler = asyncio.create_task(sample_rss())
+    recorder = Recorder()
+    cpu = cpu_seconds(pid)
+    started = time.perf_counter()
+    await drive(recorder, args.duration)
+    seconds = time.perf_counter() - started
+    stop.set()
+    await sampler
+    return {
+        **recorder.summary(seconds),
+        "seconds": round(seconds, 1),
+        "server": {
+            "rss_mb_start": round(rss[0], 1),
+            "rss_mb_peak": round(max(rss), 1),
+            "rss_mb_end": round(rss_mb(pid), 1),
+            "cpu_seconds": round(cpu_seconds(pid) - cpu, 2),
+        },
+    }
+
+
+async def seed(client: httpx.AsyncClient, headers: Dict, places: List[str], parcels: int, seed_value: int, chunk: int) -> Dict:
+    """Create parcels through the bulk order endpoint; returns their tracking IDs and timing"""
+    rng = random.Random(seed_value)
+    ids: List[str] = []
+    started = time.perf_counter()
+    for start in range(0, parcels, chunk):
+        rows = min(chunk, parcels - start)
+        body = "".join(json.dumps(make_order(rng, places, start + i)) + "\n" for i in range(rows)).encode()
+        response = await client.post("/api/admin/orders/bulk?format=ndjson", content=body, headers=headers)
+        response.raise_for_status()
+        for line in response.text.splitlines():
+            result = json.loads(line)
+            if "trackingId" in result:
+                ids.append(result["trackingId"])
+    seconds = time.perf_counter() - started
+    return {
+        "ids": ids,
+        "parcels": len(ids),
+        "unique_ids": len(set(ids)),
+        "seconds": round(seconds, 1),
+        "rows_per_second": round(parcels / seconds),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def compare(base: Dict, current: Dict) -> Dict:
+    """Percentage change of each workload and operation metric against a base result"""
+    def change(old, new):
+        return round((new / old - 1) * 100, 1) if old else None
+
+    changes = {}
+    for name, workload in current["workloads"].items():
+        old = base.get("workloads", {}).get(name)
+        if old is None:
+            continue
+        entry = {"throughput_rps_pct": change(old["throughput_rps"], workload["throughput_rps"])}
+        entry["rss_mb_peak_pct"] = change(old["server"]["rss_mb_peak"], workload["server"]["rss_mb_peak"])
+        for op, stats in workload["operations"].items():
+            before = old["operations"].get(op)
+            if before is not None:
+                entry[op] = {key: change(before[key], stats[key]) for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")}
+        changes[name] = entry
+    return {
+        "base_commit": base.get("commit"),
+        # Changes are only meaningful between runs with the same settings
+        "settings_match": base.get("settings") == current["settings"],
+        "changes_pct": changes,
+    }
+
+
+async def run(args) -> Dict:
+    places = load_places()
+    stub_port, smtp_port, api_port = free_port(), free_port(), free_port()
+    stubs = None
+    env = {"ENABLE_SIMULATION": "false", "GEOCODER_CACHE_PATH": ""}
+    if args.storage == "postgrest":
+        stubs = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs.py"),
+             "--postgrest-port", str(stub_port), "--smtp-port", str(smtp_port), "--latency-ms", str(args.db_latency_ms)],
+            stdout=sys.stderr,
+        )
+        env.update(
+            STORAGE_BACKEND="postgrest",
+            SUPABASE_URL=f"http://127.0.0.1:{stub_port}",
+            SUPABASE_SERVICE_ROLE_KEY="stub",
+            ENABLE_EMAIL_NOTIFICATIONS="true",
+            SMTP_HOST="127.0.0.1",
+            SMTP_PORT=str(smtp_port),
+            SMTP_STARTTLS="false",
+            SMTP_FROM="loadtest@example.com",
+        )
+    server = None
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    try:
+        if stubs is not None:
+            # The API reads storage on startup, so the stand-ins come up first
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{stub_port}") as stub_client:
+                await wait_ready_stub(stub_client)
+        # Server output goes to stderr so stdout carries only the results
+        server = start_server(api_port, stdout=sys.stderr, **env)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{api_port}", timeout=60, limits=limits) as client:
+            await wait_ready(client)
+            headers = await admin_headers(client)
+            seeded = await seed(client, headers, places, args.parcels, args.seed, args.seed_chunk)
+            ids = seeded.pop("ids")
+            ctx = Context(client, headers, ids, places, args.seed + 1)
+            workloads = {}
+            for name in args.workloads:
+                workloads[name] = await run_workload(name, ctx, args, server.pid)
+                print(f"{name}: {workloads[name]['throughput_rps']} req/s", file=sys.stderr)
+            if stubs is not None:
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{stub_port}") as stub_client:
+                    seeded["stub"] = (await stub_client.get("/__stats")).json()
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if stubs is not None:
+            stubs.terminate()
+            stubs.wait()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {
+            key: getattr(args, key) for key in (
+                "parcels", "storage", "db_latency_ms", "concurrency", "duration", "warmup",
+                "schedule_share", "max_pages", "burst", "burst_pause", "seed",
+            )
+        },
+        "seed": seeded,
+        "workloads": workloads,
+    }
+
+
+async def wait_ready_stub(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            if (await client.get("/__stats")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("stubs did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=10000, help="parcels to seed, e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--storage", choices=["postgrest", "memory"], default="postgrest",
+                        help="postgrest uses the Supabase stand-in (and the SMTP sink); memory runs in process")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="delay added to every stand-in database call")
+    parser.add_argument("--workloads", nargs="+", choices=["track", "admin", "schedule"], default=["track", "admin", "schedule"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per workload")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unrecorded seconds before each workload")
+    parser.add_argument("--schedule-share", type=float, default=0.05, help="share of new orders in the track workload")
+    parser.add_argument("--max-pages", type=int, default=5, help="listing pages walked per admin listing")
+    parser.add_argument("--burst", type=int, default=50, help="concurrent orders per schedule burst")
+    parser.add_argument("--burst-pause", type=float, default=0.5, help="seconds between schedule bursts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-chunk", type=int, default=5000, help="orders per bulk upload while seeding")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    if args.compare:
+        with open(args.compare) as f:
+            result["comparison"] = compare(json.load(f), result)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
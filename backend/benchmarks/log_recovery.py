@@ -0,0 +1,169 @@
+"""Write throughput and restart time of the logged in-memory storage.
+
+Three steps, each in its own process:
+
+1. Concurrent writers append history entries to existing parcels, which
+   shows how many events share one fsync (group commit) and how many
+   bytes one history append costs in the log.
+2. N synthetic parcels are loaded, snapshotted, and followed by a tail
+   of logged updates, as a long-running instance would leave its log.
+3. A fresh storage recovers from that directory: snapshot load through
+   mmap plus replay of the tail.
+
+Results are printed as JSON.
+
+    python benchmarks/log_recovery.py --parcels 1000000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import BACKEND_DIR, rss_mb
+from parcel_memory import make_parcel
+
+sys.path.insert(0, BACKEND_DIR)
+
+from records import ParcelRecord  # noqa: E402
+from storage import LoggedMemoryStorage  # noqa: E402
+
+STATUSES = ["picked-up", "in-transit", "at-hub", "out-for-delivery", "delivered"]
+
+
+def status_update(parcel: dict, rng: random.Random) -> dict:
+    """The in-place change an admin status update makes"""
+    status = rng.choice(STATUSES)
+    now = datetime.utcnow().isoformat()
+    parcel["status"] = status
+    parcel["history"].append({"status": status, "timestamp": now, "location": "Denver", "notes": f"Status updated to {status}"})
+    parcel["updatedAt"] = now
+    return parcel
+
+
+async def bench_writes(directory: str, parcels: int, writers: int, updates: int) -> dict:
+    rng = random.Random(7)
+    storage = LoggedMemoryStorage(directory)
+    await storage.start()
+    ids = []
+    for i in range(parcels):
+        parcel = json.loads(make_parcel(rng, i))
+        await storage.save_parcel(parcel)
+        ids.append(parcel["id"])
+    events, commits, written = storage.journal.events, storage.journal.commits, storage.journal.bytes_written
+
+    async def writer(count: int) -> None:
+        for _ in range(count):
+            parcel = await storage.get_parcel(rng.choice(ids))
+            await storage.save_parcel(status_update(parcel, rng))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(updates // writers) for _ in range(writers)))
+    elapsed = time.perf_counter() - started
+    logged = storage.journal.events - events
+    fsyncs = storage.journal.commits - commits
+    result = {
+        "writers": writers,
+        "updates": logged,
+        "updates_per_second": round(logged / elapsed),
+        "fsyncs": fsyncs,
+        "updates_per_fsync": round(logged / max(fsyncs, 1), 1),
+        "bytes_per_history_append": round((storage.journal.bytes_written - written) / max(logged, 1)),
+    }
+    await storage.close()
+    return result
+
+
+async def populate(directory: str, parcels: int, tail: int) -> dict:
+    rng = random.Random(42)
+    storage = LoggedMemoryStorage(directory)
+    await storage.start()
+    started = time.perf_counter()
+    gc.disable()
+    for i in range(parcels):
+        record = ParcelRecord.from_dict(json.loads(make_parcel(rng, i)))
+        storage.parcels[record.id] = record
+    storage._reindex()
+    gc.enable()
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await storage.snapshot()
+    snapshot_s = time.perf_counter() - started
+    snapshot = storage.journal.snapshot_path(storage.journal.segment)
+
+    ids = list(storage.parcels)
+    for _ in range(tail):
+        parcel = await storage.get_parcel(rng.choice(ids))
+        await storage.save_parcel(status_update(parcel, rng))
+    await storage.close()
+    return {
+        "build_seconds": round(build_s, 1),
+        "snapshot_seconds": round(snapshot_s, 1),
+        "snapshot_mb": round(os.path.getsize(snapshot) / 1024 / 1024, 1),
+        "tail_events": tail,
+    }
+
+
+async def recover(directory: str) -> dict:
+    baseline = rss_mb(os.getpid())
+    storage = LoggedMemoryStorage(directory)
+    await storage.start()
+    result = {
+        "parcels": await storage.count_parcels(),
+        "recovery_seconds": round(storage.recovery_seconds, 2),
+        "rss_mb": round(rss_mb(os.getpid()) - baseline, 1),
+    }
+    await storage.close()
+    return result
+
+
+def run_step(*args: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *args],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=1000000)
+    parser.add_argument("--tail", type=int, default=20000, help="updates logged after the snapshot")
+    parser.add_argument("--writers", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--step", choices=["writes", "populate", "recover"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step == "writes":
+        result = asyncio.run(bench_writes(args.dir, 10000, args.writers, args.updates))
+    elif args.step == "populate":
+        result = asyncio.run(populate(args.dir, args.parcels, args.tail))
+    elif args.step == "recover":
+        result = asyncio.run(recover(args.dir))
+    if args.step:
+        print(json.dumps(result))
+        return
+
+    directory = tempfile.mkdtemp(prefix="swiftify-log-")
+    try:
+        writes = run_step("--step", "writes", "--dir", os.path.join(directory, "writes"),
+                          "--writers", str(args.writers), "--updates", str(args.updates))
+        data = os.path.join(directory, "data")
+        populated = run_step("--step", "populate", "--dir", data, "--parcels", str(args.parcels), "--tail", str(args.tail))
+        recovered = run_step("--step", "recover", "--dir", data)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    print(json.dumps({"writes": writes, "populate": populated, "recover": recovered}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
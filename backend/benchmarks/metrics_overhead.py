@@ -0,0 +1,163 @@
+"""Cost of the request metrics and the sampling profiler.
+
+Two measurements:
+
+1. In process: the metrics middleware around a no-op ASGI app, and a bare
+   histogram observation, in nanoseconds per call.
+2. End to end: the API serves cached tracking lookups with metrics off,
+   with metrics on, and with metrics on plus the profiler sampling every
+   5 ms. Each configuration gets its own server. The servers take turns
+   for several rounds, and the best round of each is kept. Server CPU time
+   per request is reported next to client-side throughput and latency,
+   since client and server share the machine.
+
+Results are printed as JSON.
+
+    python benchmarks/metrics_overhead.py --requests 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from common import BACKEND_DIR, PARCEL, admin_headers, free_port, start_server, wait_ready
+
+sys.path.insert(0, BACKEND_DIR)
+
+from metrics import MetricsMiddleware, MetricsRegistry  # noqa: E402
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def in_process(calls: int) -> dict:
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "", ("method", "route", "status"))
+    duration = registry.histogram("duration_seconds", "", ("method", "route"))
+    in_flight = registry.gauge("in_flight", "")
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+
+    async def send(message):
+        pass
+
+    class Route:
+        path = "/api/track/{tracking_id}"
+
+    wrapped = MetricsMiddleware(app, requests, duration, in_flight)
+    scope = {"type": "http", "method": "GET", "path": "/api/track/SWIFT-1", "route": Route()}
+
+    async def loop(handler) -> float:
+        started = time.perf_counter()
+        for _ in range(calls):
+            await handler(scope, None, send)
+        return time.perf_counter() - started
+
+    bare = asyncio.run(loop(app))
+    instrumented = asyncio.run(loop(wrapped))
+    observe = duration.labels("GET", "/x").observe
+    started = time.perf_counter()
+    for _ in range(calls):
+        observe(0.003)
+    observe_s = time.perf_counter() - started
+    return {
+        "middleware_ns_per_request": round((instrumented - bare) / calls * 1e9),
+        "histogram_observe_ns": round(observe_s / calls * 1e9),
+    }
+
+
+async def drive(client: httpx.AsyncClient, path: str, count: int, concurrency: int) -> dict:
+    latencies = []
+    queue = iter(range(count))
+
+    async def worker():
+        for _ in queue:
+            sent = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - sent) * 1000)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests_per_second": round(count / elapsed),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+    }
+
+
+async def end_to_end(args) -> dict:
+    configs = {
+        "metrics_off": {"METRICS_ENABLED": "false"},
+        "metrics_on": {"METRICS_ENABLED": "true"},
+        "metrics_and_profiler": {"METRICS_ENABLED": "true"},
+    }
+    servers, clients, paths = {}, {}, {}
+    try:
+        for name, env in configs.items():
+            port = free_port()
+            servers[name] = start_server(port, ENABLE_SIMULATION="false", **env)
+            clients[name] = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60)
+        for name, client in clients.items():
+            await wait_ready(client)
+            tracking_id = (await client.post("/api/schedule", json=PARCEL)).json()["trackingId"]
+            paths[name] = f"/api/track/{tracking_id}"
+            await drive(client, paths[name], 500, args.concurrency)  # warm up
+        headers = await admin_headers(clients["metrics_and_profiler"])
+
+        best = {}
+        for _ in range(args.rounds):
+            for name, client in clients.items():
+                if name == "metrics_and_profiler":
+                    response = await client.post("/api/admin/profiler/start", params={"interval_ms": 5, "duration": 600}, headers=headers)
+                    response.raise_for_status()
+                pid = servers[name].pid
+                cpu = cpu_seconds(pid)
+                result = await drive(client, paths[name], args.requests, args.concurrency)
+                result["server_cpu_us_per_request"] = round((cpu_seconds(pid) - cpu) / args.requests * 1e6, 1)
+                if name == "metrics_and_profiler":
+                    samples = (await client.post("/api/admin/profiler/stop", headers=headers)).json()["samples"]
+                    result["profiler_samples"] = samples
+                if name not in best or result["requests_per_second"] > best[name]["requests_per_second"]:
+                    best[name] = result
+        scrape = await clients["metrics_on"].get("/api/metrics")
+        best["metrics_on"]["scrape_bytes"] = len(scrape.content)
+    finally:
+        for client in clients.values():
+            await client.aclose()
+        for server in servers.values():
+            server.terminate()
+            server.wait()
+
+    off = best["metrics_off"]
+    for name in ("metrics_on", "metrics_and_profiler"):
+        best[name]["throughput_change_pct"] = round((best[name]["requests_per_second"] / off["requests_per_second"] - 1) * 100, 1)
+        best[name]["cpu_change_pct"] = round((best[name]["server_cpu_us_per_request"] / off["server_cpu_us_per_request"] - 1) * 100, 1)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=200000, help="in-process middleware calls")
+    args = parser.parse_args()
+    print(json.dumps({"in_process": in_process(args.calls), "end_to_end": asyncio.run(end_to_end(args))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
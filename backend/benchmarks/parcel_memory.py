@@ -0,0 +1,164 @@
+"""Memory held per parcel by the in-memory store, as dicts vs compact records.
+
+Each representation is measured in a fresh child process: N synthetic
+parcels shaped like the ones build_parcel creates (decoded from JSON, as
+they would arrive from a request or the database) are stored either as
+plain dicts or as `ParcelRecord`s, and the growth in resident memory is
+reported together with encode/decode cost. Results are printed as JSON.
+
+    python benchmarks/parcel_memory.py --parcels 1000000
+
+Plain dicts take several GB at 1M parcels; `--dict-parcels` measures
+them at a smaller count and projects the rest linearly.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from common import BACKEND_DIR, rss_mb
+
+sys.path.insert(0, BACKEND_DIR)
+
+from records import ParcelRecord  # noqa: E402
+
+FIRST = ["Ann", "Bob", "Carla", "Dmitri", "Elena", "Farah", "George", "Hiro", "Ines", "Jamal"]
+LAST = ["Lee", "Smith", "Garcia", "Nguyen", "Okafor", "Rossi", "Kim", "Patel", "Novak", "Silva"]
+CITIES = [
+    ("San Francisco, CA", 37.7749, -122.4194), ("Los Angeles, CA", 34.0522, -118.2437),
+    ("Seattle, WA", 47.6062, -122.3321), ("Denver, CO", 39.7392, -104.9903),
+    ("Chicago, IL", 41.8781, -87.6298), ("Austin, TX", 30.2672, -97.7431),
+]
+STATUSES = ["pending", "picked-up", "in-transit", "at-hub", "out-for-delivery", "delivered"]
+WEIGHTS = ["<1kg", "1-5kg", "5-10kg", "10-20kg", "20kg+"]
+
+
+def person(rng: random.Random, i: int, city: str) -> dict:
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    return {
+        "name": f"{first} {last}",
+        "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+        "phone": f"+1 555 {rng.randint(1000000, 9999999)}",
+        "address": f"{rng.randint(1, 9999)} Market St, {city}",
+    }
+
+
+def make_parcel(rng: random.Random, i: int) -> str:
+    """One parcel as JSON, so every string in it is a fresh object when decoded"""
+    (origin, olat, olng), (destination, dlat, dlng) = rng.sample(CITIES, 2)
+    created = datetime(2026, 1, 1) + timedelta(seconds=rng.randrange(300 * 86400), microseconds=rng.randrange(10 ** 6))
+    stages = rng.randint(1, len(STATUSES))
+    history = [{
+        "status": "Package scheduled",
+        "timestamp": created.isoformat(),
+        "location": origin.split(",")[0],
+        "notes": "Package scheduled for pickup",
+    }]
+    for n, stage in enumerate(STATUSES[1:stages], 1):
+        history.append({
+            "status": stage,
+            "timestamp": (created + timedelta(hours=6 * n, microseconds=rng.randrange(10 ** 6))).isoformat(),
+            "location": rng.choice(CITIES)[0].split(",")[0],
+            "notes": f"Status updated to {stage}",
+        })
+    hops = rng.randint(0, 4)
+    route = [{"lat": olat, "lng": olng, "label": origin.split(",")[0]}]
+    for n in range(1, hops + 1):
+        share = n / (hops + 1)
+        route.append({
+            "lat": round(olat + (dlat - olat) * share, 4),
+            "lng": round(olng + (dlng - olng) * share, 4),
+            "label": f"Hub {rng.randint(1, 55)}",
+        })
+    route.append({"lat": dlat, "lng": dlng, "label": destination.split(",")[0]})
+    parcel = {
+        "id": f"SWIFT-{i:06d}{rng.randrange(16 ** 4):04X}",
+        "sender": person(rng, i, origin),
+        "receiver": person(rng, i + 1, destination),
+        "parcelDetails": {
+            "description": "Books and documents",
+            "weight": rng.choice(WEIGHTS),
+            "dimensions": {"length": 30.0, "width": 20.0, "height": float(rng.randint(5, 40))},
+            "value": float(rng.randint(1, 1000)),
+            "instructions": "",
+            "photo": None,
+        },
+        "status": STATUSES[stages - 1],
+        "mode": "auto",
+        "history": history,
+        "route": route,
+        "currentPosition": dict(route[min(stages // 2, len(route) - 1)]),
+        "eta": (created + timedelta(days=2)).isoformat(),
+        "createdAt": created.isoformat(),
+        "estimatedCost": round(rng.uniform(15, 120), 2),
+        "progress": 0,
+        "updatedAt": history[-1]["timestamp"],
+    }
+    return json.dumps(parcel)
+
+
+def measure(mode: str, count: int) -> dict:
+    """Store `count` parcels in this process and report the memory they hold"""
+    rng = random.Random(42)
+    store = {}
+    gc.collect()
+    baseline = rss_mb(os.getpid())
+    encode_s = 0.0
+    for i in range(count):
+        parcel = json.loads(make_parcel(rng, i))
+        if mode == "compact":
+            started = time.perf_counter()
+            store[parcel["id"]] = ParcelRecord.from_dict(parcel)
+            encode_s += time.perf_counter() - started
+        else:
+            store[parcel["id"]] = parcel
+    gc.collect()
+    held = rss_mb(os.getpid()) - baseline
+
+    result = {"parcels": count, "rss_mb": round(held, 1), "bytes_per_parcel": round(held * 1024 * 1024 / count)}
+    if mode == "compact":
+        records = list(store.values())[:20000]
+        started = time.perf_counter()
+        for record in records:
+            record.to_dict()
+        result["encode_us"] = round(encode_s / count * 1e6, 2)
+        result["decode_us"] = round((time.perf_counter() - started) / len(records) * 1e6, 2)
+    return result
+
+
+def run_child(mode: str, count: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--parcels", str(count)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=1000000)
+    parser.add_argument("--dict-parcels", type=int, default=250000)
+    parser.add_argument("--child", choices=["dict", "compact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure(args.child, args.parcels)))
+        return
+
+    dicts = run_child("dict", min(args.dict_parcels, args.parcels))
+    compact = run_child("compact", args.parcels)
+    projected_mb = dicts["bytes_per_parcel"] * args.parcels / 1024 / 1024
+    print(json.dumps({
+        "parcels": args.parcels,
+        "dict": {**dicts, "projected_rss_mb": round(projected_mb, 1)},
+        "compact": compact,
+        "reduction": round(dicts["bytes_per_parcel"] / compact["bytes_per_parcel"], 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
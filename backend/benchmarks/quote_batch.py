@@ -0,0 +1,97 @@
+"""Throughput of the pricing engine and of /api/quote/batch.
+
+Prices N random cart items in one vectorized call, compares that with
+pricing them one at a time, then posts the same items to the quote
+endpoint of a live server. Results are printed as JSON.
+
+    python benchmarks/quote_batch.py --items 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+from common import BACKEND_DIR, free_port, start_server, wait_ready
+
+sys.path.insert(0, BACKEND_DIR)
+
+from pricing import PricingEngine, volume_cm3  # noqa: E402
+
+WEIGHTS = ["<1kg", "1-5kg", "5-10kg", "10-20kg", "20kg+"]
+CITIES = ["San Francisco, CA", "Los Angeles, CA", "Seattle, WA", "Denver, CO", "Chicago, IL", "Austin, TX", "New York, NY"]
+
+
+def make_items(count: int) -> list:
+    random.seed(42)
+    return [
+        {
+            "weight": random.choice(WEIGHTS),
+            "dimensions": {"length": random.uniform(5, 60), "width": random.uniform(5, 40), "height": random.uniform(2, 30)},
+            "value": random.uniform(0, 1000),
+            "origin": random.choice(CITIES),
+            "destination": random.choice(CITIES),
+            "distanceKm": random.uniform(0, 4500),
+        }
+        for _ in range(count)
+    ]
+
+
+def bench_engine(items: list) -> dict:
+    engine = PricingEngine.from_file(os.path.join(BACKEND_DIR, "data", "rate_card.json"))
+    weights = [item["weight"] for item in items]
+    volumes = [volume_cm3(item["dimensions"]) for item in items]
+    values = [item["value"] for item in items]
+    distances = [item["distanceKm"] for item in items]
+
+    started = time.perf_counter()
+    engine.quotes(weights, volumes, values, distances)
+    batch_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for item in items:
+        engine.quote(item["weight"], item["dimensions"], item["value"], item["distanceKm"])
+    single_ms = (time.perf_counter() - started) * 1000
+    return {
+        "engine_batch_ms": round(batch_ms, 2),
+        "engine_one_by_one_ms": round(single_ms, 2),
+        "engine_items_per_second": round(len(items) / (batch_ms / 1000)),
+    }
+
+
+async def bench_endpoint(items: list) -> dict:
+    port = free_port()
+    server = start_server(port, ENABLE_SIMULATION="false", GEOCODER_CACHE_PATH="")
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            await wait_ready(client)
+            results = {}
+            for name, batch in (
+                ("endpoint_distance_ms", items),
+                ("endpoint_addresses_ms", [{k: v for k, v in item.items() if k != "distanceKm"} for item in items]),
+            ):
+                started = time.perf_counter()
+                response = await client.post("/api/quote/batch", json={"items": batch})
+                response.raise_for_status()
+                results[name] = round((time.perf_counter() - started) * 1000, 1)
+            return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+    items = make_items(args.items)
+    results = {"items": args.items, **bench_engine(items), **asyncio.run(bench_endpoint(items))}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Cold and warm route lookups on the hub graph.
+
+Loads the bundled graph (or --hubs/--roads), then routes random hub pairs
+and random coordinates twice: first cold (the path cache is cleared before
+every lookup, so A* always runs) and again with the cache warm. Results
+are printed as JSON.
+
+    python benchmarks/route_lookup.py --lookups 20000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from routing import load_routing_engine  # noqa: E402
+
+
+def timed(lookups, reset=None) -> dict:
+    samples = []
+    for lookup in lookups:
+        if reset:
+            reset()
+        started = time.perf_counter()
+        lookup()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "lookups": len(samples),
+        "us_median": round(statistics.median(samples), 2),
+        "us_p99": round(samples[int(len(samples) * 0.99)], 2),
+        "per_second": round(len(samples) / (sum(samples) / 1e6)),
+    }
+
+
+def run(args) -> dict:
+    random.seed(42)
+    started = time.perf_counter()
+    engine = load_routing_engine(args.hubs, args.roads, cache_size=args.cache_size)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    hubs = list(engine.hubs.values())
+    pairs = [tuple(random.sample(hubs, 2)) for _ in range(args.lookups)]
+    points = [
+        ((random.uniform(26, 48), random.uniform(-123, -71)), (random.uniform(26, 48), random.uniform(-123, -71)))
+        for _ in range(args.lookups)
+    ]
+
+    results = {"hubs": len(hubs), "load_ms": round(load_ms, 1)}
+    clear = engine.shortest_path.cache_clear
+    by_hub = [lambda a=a, b=b: engine.route_between_hubs(a, b) for a, b in pairs]
+    by_point = [lambda o=o, d=d: engine.route_between_points(o, d) for o, d in points]
+    results["hubs_cold"] = timed(by_hub, reset=clear)
+    results["hubs_warm"] = timed(by_hub)
+    results["points_cold"] = timed(by_point, reset=clear)
+    results["points_warm"] = timed(by_point)
+    results["cache"] = engine.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hubs", default=os.path.join(BACKEND_DIR, "data", "hubs.csv"))
+    parser.add_argument("--roads", default=os.path.join(BACKEND_DIR, "data", "roads.csv"))
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
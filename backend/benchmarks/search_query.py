@@ -0,0 +1,97 @@
+"""Query latency of the admin search index.
+
+Indexes N synthetic parcels (plus some contact messages) in-process, then
+times a mix of rare, common, multi-token and tracking-ID-prefix queries,
+and incremental updates. Results are printed as JSON.
+
+    python benchmarks/search_query.py --parcels 1000000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import SearchIndex  # noqa: E402
+
+FIRST = ["ann", "bob", "carla", "dmitri", "elena", "farah", "george", "hiro", "ines", "jamal", "kofi", "lena"]
+LAST = ["lee", "smith", "garcia", "nguyen", "okafor", "rossi", "kim", "patel", "novak", "silva", "jones", "wu"]
+CITIES = ["San Francisco, CA", "Los Angeles, CA", "Seattle, WA", "Denver, CO", "Chicago, IL", "Austin, TX"]
+ITEMS = ["books", "laptop", "shoes", "documents", "camera", "toys", "ceramic vase", "guitar strings"]
+
+
+def person(rng: random.Random, i: int) -> dict:
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    return {
+        "name": f"{first.title()} {last.title()}",
+        "email": f"{first}.{last}{i}@example.com",
+        "phone": f"+1 555 {rng.randint(1000000, 9999999)}",
+        "address": f"{rng.randint(1, 9999)} Market St, {rng.choice(CITIES)}",
+    }
+
+
+def make_parcel(rng: random.Random, i: int) -> dict:
+    return {
+        "id": f"SWIFT-{i:08d}{rng.randrange(16 ** 4):04X}",
+        "sender": person(rng, i),
+        "receiver": person(rng, i + 1),
+        "parcelDetails": {"description": f"{rng.choice(ITEMS)} and {rng.choice(ITEMS)}"},
+    }
+
+
+def timed(fn, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"ms_median": round(statistics.median(samples), 3), "ms_p99": round(samples[int(len(samples) * 0.99)], 3)}
+
+
+def run(args) -> dict:
+    rng = random.Random(42)
+    index = SearchIndex()
+    parcels = [make_parcel(rng, i) for i in range(args.parcels)]
+    started = time.perf_counter()
+    index.add_parcels(parcels)
+    for i in range(args.parcels // 100):
+        index.add_contact({"id": f"msg-{i}", **person(rng, i), "message": f"Where is my {rng.choice(ITEMS)}?"})
+    build_s = time.perf_counter() - started
+
+    sample = parcels[args.parcels // 2]
+    queries = {
+        "rare_email": sample["sender"]["email"],
+        "name": "ann lee",
+        "common_city": "san francisco",
+        "name_and_item": "garcia laptop",
+        "id_prefix": sample["id"][:10],
+    }
+    results = {"parcels": args.parcels, "build_seconds": round(build_s, 1), **index.stats()}
+    for name, query in queries.items():
+        total, _ = index.search(query, limit=20)
+        results[name] = {"query": query, "total": total, **timed(lambda q=query: index.search(q, limit=20), args.runs)}
+
+    def update():
+        parcel = rng.choice(parcels)
+        parcel["parcelDetails"] = {"description": rng.choice(ITEMS)}
+        index.add_parcel(parcel)
+
+    results["update"] = timed(update, args.runs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark one simulation tick over many in-transit parcels.
+
+Seeds in-memory storage with N auto-mode parcels on random multi-stop
+routes, then times packing the routes and the ticks that follow
+(vectorized advance plus the batched position write).
+
+    python benchmarks/simulation_tick.py --parcels 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulation import MovementSimulator  # noqa: E402
+from storage import MemoryStorage  # noqa: E402
+
+
+def make_parcel(i: int, stops: int) -> dict:
+    lat, lng = random.uniform(30, 48), random.uniform(-122, -75)
+    route = []
+    for s in range(stops):
+        route.append({"lat": lat, "lng": lng, "label": f"Stop {s}"})
+        lat += random.uniform(-1, 1)
+        lng += random.uniform(-1, 1)
+    return {
+        "id": f"SWIFT-BENCH{i:07d}",
+        "status": "in-transit",
+        "mode": "auto",
+        "route": route,
+        "currentPosition": route[0],
+        "createdAt": f"2026-01-01T00:00:{i % 60:02d}",
+        "progress": random.uniform(0, 90),
+    }
+
+
+async def run(args) -> dict:
+    random.seed(42)
+    storage = MemoryStorage()
+    simulator = MovementSimulator(storage, interval=10, time_scale=60)
+    for i in range(args.parcels):
+        parcel = make_parcel(i, random.randint(2, args.max_stops))
+        await storage.save_parcel(parcel)
+        simulator.track(parcel)
+
+    started = time.perf_counter()
+    simulator._pack()
+    pack_ms = (time.perf_counter() - started) * 1000
+
+    advance_ms, tick_ms = [], []
+    for _ in range(args.ticks):
+        started = time.perf_counter()
+        simulator.advance(0.0)
+        advance_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        await simulator.tick()
+        tick_ms.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "parcels": args.parcels,
+        "route_points": int(len(simulator._lat)),
+        "pack_ms": round(pack_ms, 1),
+        "advance_ms_median": round(statistics.median(advance_ms), 1),
+        "tick_ms_median": round(statistics.median(tick_ms), 1),
+        "tick_ms_max": round(max(tick_ms), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=100000)
+    parser.add_argument("--max-stops", type=int, default=8)
+    parser.add_argument("--ticks", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
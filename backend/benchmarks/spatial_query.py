@@ -0,0 +1,156 @@
+"""Radius and bounding-box queries over the parcel spatial index.
+
+Indexes `--parcels` synthetic positions, most of them along the lanes
+between the benchmark cities and the rest scattered around the cities,
+and reports build time and the growth in resident memory, then the
+latency of:
+
+- nearby:  radius queries of 10, 50 and 200 km around random cities and
+           lane points, with and without a status filter
+- bbox:    a city viewport (about 1 x 1.5 degrees) and a regional one
+           (10 x 20 degrees)
+- move:    one simulation tick moving `--moves` parcels a short way
+
+For reference, the same radius queries are answered by a full NumPy scan
+over every position, and the totals are checked against it. Results are
+printed as JSON.
+
+    python benchmarks/spatial_query.py --parcels 1000000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from common import BACKEND_DIR, rss_mb
+from parcel_memory import CITIES, STATUSES
+
+sys.path.insert(0, BACKEND_DIR)
+
+from geo import SpatialIndex  # noqa: E402
+from routing import EARTH_RADIUS_KM  # noqa: E402
+
+
+def make_position(rng: random.Random) -> Dict:
+    (_, olat, olng), (_, dlat, dlng) = rng.sample(CITIES, 2)
+    if rng.random() < 0.4:
+        # Around a city: pending pickups and local deliveries
+        return {"lat": olat + rng.gauss(0, 0.15), "lng": olng + rng.gauss(0, 0.15)}
+    share = rng.random()
+    return {
+        "lat": olat + (dlat - olat) * share + rng.gauss(0, 0.02),
+        "lng": olng + (dlng - olng) * share + rng.gauss(0, 0.02),
+    }
+
+
+def timed(fn: Callable, repeat: int) -> Dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+    }
+
+
+def scan_count(lats: np.ndarray, lngs: np.ndarray, lat: float, lng: float, radius_km: float) -> int:
+    """Parcels within the radius by checking every position"""
+    lat0, lng0 = math.radians(lat), math.radians(lng)
+    a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lngs - lng0) / 2) ** 2
+    return int(np.count_nonzero(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)) <= radius_km))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parcels", type=int, default=1000000)
+    parser.add_argument("--cell-degrees", type=float, default=0.1)
+    parser.add_argument("--moves", type=int, default=100000, help="parcels moved by the simulated tick")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    parcels = [
+        {"id": f"SWIFT-{i:08d}", "status": rng.choice(STATUSES), "currentPosition": make_position(rng)}
+        for i in range(args.parcels)
+    ]
+    rss_before = rss_mb(os.getpid())
+    started = time.perf_counter()
+    index = SpatialIndex(args.cell_degrees)
+    index.add_parcels(parcels)
+    build_seconds = time.perf_counter() - started
+    index_mb = rss_mb(os.getpid()) - rss_before
+
+    lats = np.radians([parcel["currentPosition"]["lat"] for parcel in parcels])
+    lngs = np.radians([parcel["currentPosition"]["lng"] for parcel in parcels])
+    centers: List[Dict] = [make_position(rng) for _ in range(args.queries)]
+    nearby = {}
+    for radius in (10, 50, 200):
+        queue = iter(centers * 2)
+        hits = [index.nearby(center["lat"], center["lng"], radius, limit=100)[0] for center in centers[:20]]
+        checked = [scan_count(lats, lngs, center["lat"], center["lng"], radius) for center in centers[:20]]
+        if hits != checked:
+            raise AssertionError(f"index and full scan disagree at {radius} km")
+
+        def query(statuses=None, radius=radius):
+            center = next(queue)
+            index.nearby(center["lat"], center["lng"], radius, statuses=statuses, limit=100)
+
+        nearby[f"{radius}km"] = {
+            "mean_matches": round(statistics.mean(hits)),
+            "index": timed(query, args.queries),
+            "index_in_transit": timed(lambda: query(["in-transit"]), args.queries),
+            "full_scan": timed(
+                lambda: scan_count(lats, lngs, centers[0]["lat"], centers[0]["lng"], radius),
+                max(5, args.queries // 20),
+            ),
+        }
+
+    bbox = {}
+    for name, (height, width) in {"city": (1.0, 1.5), "region": (10.0, 20.0)}.items():
+        queue = iter(centers)
+
+        def viewport(height=height, width=width):
+            center = next(queue)
+            index.within(
+                center["lat"] - height / 2, center["lng"] - width / 2,
+                center["lat"] + height / 2, center["lng"] + width / 2,
+                limit=500,
+            )
+
+        bbox[name] = timed(viewport, args.queries)
+
+    moved = rng.sample(parcels, min(args.moves, len(parcels)))
+    ids = [parcel["id"] for parcel in moved]
+    positions = [
+        {"lat": parcel["currentPosition"]["lat"] + 0.01, "lng": parcel["currentPosition"]["lng"] + 0.01}
+        for parcel in moved
+    ]
+    started = time.perf_counter()
+    index.move(ids, positions)
+    move_seconds = time.perf_counter() - started
+
+    print(json.dumps({
+        "parcels": args.parcels,
+        "cell_degrees": args.cell_degrees,
+        "build_seconds": round(build_seconds, 2),
+        "index_mb": round(index_mb, 1),
+        "nearby": nearby,
+        "bbox": bbox,
+        "move": {"parcels": len(ids), "seconds": round(move_seconds, 3)},
+        "index": index.stats(),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
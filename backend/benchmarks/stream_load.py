@@ -0,0 +1,137 @@
+"""Load test for live tracking streams.
+
+Starts the API under uvicorn (or targets --url), opens N WebSocket
+subscribers spread over a few parcels, holds them, pushes status updates
+through the admin API and measures how long each update takes to reach
+every subscriber. Results are printed as JSON.
+
+    python benchmarks/stream_load.py --subscribers 10000
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+
+import httpx
+import websockets
+
+from common import PARCEL, admin_headers, free_port, rss_mb, start_server, wait_ready
+
+STATUSES = ["picked-up", "in-transit", "at-hub", "out-for-delivery"]
+
+
+class Subscriber:
+    def __init__(self):
+        self.ws = None
+        self.received = asyncio.Queue()
+
+    async def run(self, url: str, ready: asyncio.Event, connected: list) -> None:
+        async with websockets.connect(url, max_queue=64, open_timeout=60, ping_interval=None) as ws:
+            self.ws = ws
+            json.loads(await ws.recv())  # snapshot
+            connected.append(self)
+            ready.set()
+            async for raw in ws:
+                message = json.loads(raw)
+                if message["type"] == "update":
+                    self.received.put_nowait((time.perf_counter(), message["status"]))
+
+
+async def run(args) -> dict:
+    server = None
+    base_url = args.url
+    if not base_url:
+        port = free_port()
+        server = start_server(port, STREAM_MAX_SUBSCRIBERS="1000000")
+        base_url = f"http://127.0.0.1:{port}"
+    ws_base = base_url.replace("http", "ws", 1)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        try:
+            await wait_ready(client)
+            headers = await admin_headers(client)
+            tracking_ids = [
+                (await client.post("/api/schedule", json=PARCEL)).json()["trackingId"]
+                for _ in range(args.parcels)
+            ]
+
+            baseline_rss = rss_mb(server.pid) if server else None
+            subscribers = {tid: [] for tid in tracking_ids}
+            tasks = []
+            connect_started = time.perf_counter()
+            semaphore = asyncio.Semaphore(args.connect_concurrency)
+
+            async def connect(tid):
+                async with semaphore:
+                    ready = asyncio.Event()
+                    sub = Subscriber()
+                    tasks.append(asyncio.create_task(sub.run(f"{ws_base}/api/track/{tid}/stream", ready, subscribers[tid])))
+                    await asyncio.wait_for(ready.wait(), 60)
+
+            await asyncio.gather(*(connect(tracking_ids[i % len(tracking_ids)]) for i in range(args.subscribers)))
+            connect_seconds = time.perf_counter() - connect_started
+            connected = sum(len(subs) for subs in subscribers.values())
+
+            await asyncio.sleep(args.hold)
+            held_rss = rss_mb(server.pid) if server else None
+
+            latencies = []
+            for i in range(args.updates):
+                tid = tracking_ids[i % len(tracking_ids)]
+                new_status = STATUSES[i % len(STATUSES)]
+                sent = time.perf_counter()
+                response = await client.patch(f"/api/admin/parcel/{tid}", json={"status": new_status}, headers=headers)
+                response.raise_for_status()
+                for sub in subscribers[tid]:
+                    received, status = await asyncio.wait_for(sub.received.get(), 30)
+                    assert status == new_status
+                    latencies.append((received - sent) * 1000)
+
+            health = (await client.get("/api/health")).json()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    latencies.sort()
+    return {
+        "subscribers": connected,
+        "parcels": len(tracking_ids),
+        "connect_seconds": round(connect_seconds, 2),
+        "server_rss_mb": {"baseline": baseline_rss, "holding": held_rss},
+        "rss_kb_per_subscriber": round((held_rss - baseline_rss) * 1024 / connected, 2) if server else None,
+        "fan_out_latency_ms": {
+            "p50": round(statistics.median(latencies), 2),
+            "p99": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+            "max": round(latencies[-1], 2),
+        },
+        "hub": health.get("tracking_streams"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--subscribers", type=int, default=10000)
+    parser.add_argument("--parcels", type=int, default=100)
+    parser.add_argument("--updates", type=int, default=20)
+    parser.add_argument("--hold", type=float, default=5.0, help="seconds to hold idle connections before updating")
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    # Each subscriber needs a file descriptor on this side of the connection
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if args.subscribers + 100 > hard:
+        parser.error(f"--subscribers {args.subscribers} exceeds the open file limit ({hard})")
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
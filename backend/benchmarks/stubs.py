@@ -0,0 +1,260 @@
+"""Local stand-ins for Supabase (PostgREST) and an SMTP server.
+
+The PostgREST stand-in answers the requests `PostgRESTStorage` makes --
+eq/in lookups, keyset-paginated ordered listings, merge upserts, inserts
+that skip taken ids, PATCHes by id, deletes, exact counts and the history
+and route rows written by parcel updates -- from an in-process
+`MemoryStorage`, optionally after a fixed delay that stands in for the
+network round trip to Supabase. The SMTP sink accepts and counts messages
+without delivering them. Both run in one process:
+
+    python benchmarks/stubs.py --postgrest-port 54321 --smtp-port 2525 --latency-ms 5
+
+`GET /__stats` on the PostgREST port reports requests served and messages
+received.
+"""
+import argparse
+import asyncio
+import re
+import sys
+from typing import Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from common import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from storage import MemoryStorage  # noqa: E402
+
+KEYSET = re.compile(r'(\w+)\.(gt|lt)\."([^"]*)",and\(\w+\.eq\."[^"]*",id\.(?:gt|lt)\."([^"]*)"\)')
+MODIFIED = re.compile(r'updatedAt\.gt\."([^"]*)"')
+QUOTED_IDS = re.compile(r'"([^"]*)"')
+# NOT NULL columns of `parcels`; an upsert row must carry them even when it
+# only updates an existing parcel, since Postgres checks the row it would insert
+REQUIRED_COLUMNS = ("id", "sender", "receiver", "parcelDetails", "status", "createdAt")
+
+
+class PostgRESTStub:
+    """The subset of PostgREST used by PostgRESTStorage, over MemoryStorage"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.store = MemoryStorage()
+        self.requests = 0
+        self.emails = 0
+        self.routes = 0
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/rest/v1/parcels", self.parcels, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+            Route("/rest/v1/parcel_history", self.parcel_history, methods=["POST"]),
+            Route("/rest/v1/parcel_routes", self.parcel_routes, methods=["POST"]),
+            Route("/rest/v1/contact_messages", self.contacts, methods=["GET", "HEAD", "POST", "PATCH"]),
+            Route("/__stats", self.stats, methods=["GET"]),
+        ])
+
+    async def _delay(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _count(total: int) -> Response:
+        return Response(headers={"Content-Range": f"*/{total}"})
+
+    @staticmethod
+    def _keyset(params) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+        """The (sort key, id) to continue after and the modified-since bound, if any"""
+        tree = params.get("or") or params.get("and") or ""
+        keyset = KEYSET.search(tree)
+        modified = MODIFIED.search(tree)
+        return (
+            (keyset.group(3), keyset.group(4)) if keyset else None,
+            modified.group(1) if modified else None,
+        )
+
+    async def parcels(self, request: Request) -> Response:
+        await self._delay()
+        params = request.query_params
+        if request.method == "HEAD":
+            return self._count(await self.store.count_parcels())
+        if request.method == "POST":
+            rows = await request.json()
+            rows = rows if isinstance(rows, list) else [rows]
+            for row in rows:
+                missing = [column for column in REQUIRED_COLUMNS if row.get(column) is None]
+                if missing:
+                    return JSONResponse({
+                        "code": "23502",
+                        "message": f'null value in column "{missing[0]}" of relation "parcels" violates not-null constraint',
+                    }, status_code=400)
+            existing = await self.store.get_parcels([row["id"] for row in rows])
+            if "ignore-duplicates" in request.headers.get("prefer", ""):
+                # Rows whose id is taken are skipped and left out of the response
+                rows = [row for row in rows if row["id"] not in existing]
+                await self.store.save_parcels(rows)
+            else:
+                # merge-duplicates: columns missing from a row keep their stored value
+                await self.store.save_parcels([{**existing.get(row["id"], {}), **row} for row in rows])
+            if "return=representation" in request.headers.get("prefer", ""):
+                return JSONResponse([{"id": row["id"]} for row in rows], status_code=201)
+            return Response(status_code=201)
+
+        id_filter = params.get("id", "")
+        if request.method == "PATCH":
+            ids = [id_filter[3:]] if id_filter.startswith("eq.") else QUOTED_IDS.findall(id_filter)
+            changes = await request.json()
+            # Only rows that exist are updated
+            found = await self.store.get_parcels(ids)
+            await self.store.save_parcels([{**parcel, **changes} for parcel in found.values()])
+            return Response(status_code=204)
+        if request.method == "DELETE":
+            parcel_id = id_filter[3:]
+            deleted = await self.store.delete_parcel(parcel_id)
+            return JSONResponse([{"id": parcel_id}] if deleted else [])
+        if id_filter.startswith("eq."):
+            parcel = await self.store.get_parcel(id_filter[3:])
+            return JSONResponse([parcel] if parcel else [])
+        if id_filter.startswith("in."):
+            found = await self.store.get_parcels(QUOTED_IDS.findall(id_filter))
+            return JSONResponse(list(found.values()))
+        if "order" not in params:
+            return JSONResponse(await self.store.list_parcels())
+
+        created_from = created_to = None
+        for condition in params.getlist("createdAt"):
+            op, _, value = condition.partition(".")
+            if op == "gte":
+                created_from = value
+            elif op == "lt":
+                created_to = value
+        after, modified_since = self._keyset(params)
+        page = await self.store.query_parcels(
+            status=params["status"][3:] if "status" in params else None,
+            mode=params["mode"][3:] if "mode" in params else None,
+            created_from=created_from,
+            created_to=created_to,
+            after=after,
+            descending=params["order"].startswith("createdAt.desc"),
+            limit=int(params.get("limit", 50)),
+            modified_since=modified_since,
+        )
+        return JSONResponse(page)
+
+    async def parcel_history(self, request: Request) -> Response:
+        """History rows are folded straight into the stored parcels, so reads need no embedding"""
+        await self._delay()
+        rows = sorted(await request.json(), key=lambda row: (row["parcel_id"], row["seq"]))
+        parcels = await self.store.get_parcels(list({row["parcel_id"] for row in rows}))
+        for row in rows:
+            parcel = parcels.get(row["parcel_id"])
+            if parcel is not None:
+                history = parcel.setdefault("history", [])
+                if row["seq"] < len(history):
+                    history[row["seq"]] = row["entry"]
+                else:
+                    history.append(row["entry"])
+        await self.store.save_parcels(list(parcels.values()))
+        return Response(status_code=201)
+
+    async def parcel_routes(self, request: Request) -> Response:
+        await self._delay()
+        self.routes += len(await request.json())
+        return Response(status_code=201)
+
+    async def contacts(self, request: Request) -> Response:
+        await self._delay()
+        params = request.query_params
+        statuses = dict(condition.split(".", 1) for condition in params.getlist("status"))
+        if request.method == "HEAD":
+            return self._count(await self.store.count_contacts(statuses.get("eq")))
+        if request.method == "POST":
+            await self.store.add_contact(await request.json())
+            return Response(status_code=201)
+        id_filter = params.get("id", "")
+        if request.method == "PATCH":
+            timestamp = params.get("timestamp", "")
+            changed = await self.store.set_contact_status(
+                (await request.json())["status"],
+                ids=QUOTED_IDS.findall(id_filter) if id_filter.startswith("in.") else None,
+                status=statuses.get("eq"),
+                before=timestamp[3:] if timestamp.startswith("lt.") else None,
+            )
+            # Only the number of returned rows is used
+            return JSONResponse([{}] * changed)
+        if id_filter.startswith("in."):
+            found = await self.store.get_contacts(QUOTED_IDS.findall(id_filter))
+            return JSONResponse(list(found.values()))
+        if "order" not in params:
+            return JSONResponse(await self.store.list_contacts())
+        since = params.get("timestamp", "")[3:] or None
+        after, _ = self._keyset(params)
+        return JSONResponse(await self.store.query_contacts(
+            since=since,
+            after=after,
+            limit=int(params.get("limit", 50)),
+            status=statuses.get("eq"),
+            descending=params["order"].startswith("timestamp.desc"),
+        ))
+
+    async def stats(self, request: Request) -> Response:
+        return JSONResponse({
+            "requests": self.requests,
+            "parcels": await self.store.count_parcels(),
+            "emails": self.emails,
+            "replaced_routes": self.routes,
+        })
+
+    async def smtp_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Minimal SMTP dialogue: accept every message, deliver none"""
+        writer.write(b"220 stub ESMTP\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line[:4].upper()
+                if command == b"EHLO":
+                    writer.write(b"250-stub\r\n250 SIZE 10485760\r\n")
+                elif command == b"DATA":
+                    writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                    await writer.drain()
+                    await reader.readuntil(b"\r\n.\r\n")
+                    self.emails += 1
+                    writer.write(b"250 OK queued\r\n")
+                elif command == b"QUIT":
+                    writer.write(b"221 Bye\r\n")
+                    break
+                else:
+                    writer.write(b"250 OK\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(postgrest_port: int, smtp_port: int, latency: float) -> None:
+    stub = PostgRESTStub(latency)
+    smtp = await asyncio.start_server(stub.smtp_session, "127.0.0.1", smtp_port)
+    config = uvicorn.Config(stub.app(), host="127.0.0.1", port=postgrest_port, log_level="warning", backlog=4096)
+    async with smtp:
+        await uvicorn.Server(config).serve()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--postgrest-port", type=int, required=True)
+    parser.add_argument("--smtp-port", type=int, required=True)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(serve(args.postgrest_port, args.smtp_port, args.latency_ms / 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Bytes written per parcel status update as the parcel's history grows.
+
+For each history length in `--history`, a parcel from the synthetic
+generator is padded to that many history entries and saved, then given
+`--updates` status updates, each of which appends one history entry. Every
+update is written two ways: as a full rewrite of the record
+(`save_parcels`, what updates used to do) and as a patch
+(`update_parcels`, what they do now). Bytes are counted per backend:
+
+- log:       bytes appended to the write-ahead log (patches only; the log
+             never rewrote whole records, `record_bytes` is what it would)
+- sqlite:    growth of the SQLite WAL file (whole pages), with checkpoints off
+- postgrest: request body bytes sent to the PostgREST stand-in
+
+Results are printed as JSON; the delta columns should stay flat while the
+full-rewrite columns grow with the history.
+
+    python benchmarks/update_write_bytes.py --history 1,10,100,1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+from typing import Dict, List
+
+import httpx
+import orjson
+
+from common import BACKEND_DIR
+from parcel_memory import make_parcel
+from stubs import PostgRESTStub
+
+sys.path.insert(0, BACKEND_DIR)
+
+from changes import parcel_patch, snapshot  # noqa: E402
+from storage import LoggedMemoryStorage, PostgRESTStorage, SQLiteStorage, Storage  # noqa: E402
+
+
+def padded_parcel(rng: random.Random, i: int, entries: int) -> Dict:
+    parcel = json.loads(make_parcel(rng, i))
+    first = parcel["history"][0]
+    parcel["history"] = [dict(first, notes=f"{first['notes']} #{n}") for n in range(entries)]
+    return parcel
+
+
+def status_update(parcel: Dict, n: int) -> None:
+    timestamp = f"2026-06-01T00:{n // 60:02d}:{n % 60:02d}"
+    parcel["status"] = "in-transit" if n % 2 else "at-hub"
+    parcel["history"].append({
+        "status": parcel["status"],
+        "timestamp": timestamp,
+        "location": "Hub 12",
+        "notes": f"Status updated to {parcel['status']}",
+    })
+    parcel["updatedAt"] = timestamp
+
+
+async def written_per_update(store: Storage, measure, parcel: Dict, updates: int, delta: bool) -> float:
+    await store.save_parcels([parcel])
+    total = 0
+    for n in range(updates):
+        current = await store.get_parcel(parcel["id"])
+        before = snapshot(current)
+        status_update(current, n)
+        start = measure()
+        if delta:
+            await store.update_parcels([current], [parcel_patch(before, current)])
+        else:
+            await store.save_parcels([current])
+        total += measure() - start
+    return round(total / updates)
+
+
+async def run(lengths: List[int], updates: int) -> List[Dict]:
+    rng = random.Random(1)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        log = LoggedMemoryStorage(os.path.join(directory, "log"), commit_delay=0)
+        sqlite = SQLiteStorage(os.path.join(directory, "swiftify.db"))
+        stub = PostgRESTStub()
+        postgrest = PostgRESTStorage("http://stub", "key")
+        sent = [0]
+
+        async def count_body(request: httpx.Request) -> None:
+            sent[0] += len(request.content)
+
+        postgrest._client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=stub.app()),
+            base_url=postgrest.base_url,
+            event_hooks={"request": [count_body]},
+        )
+        for store in (log, sqlite):
+            await store.start()
+        # Let the WAL grow so its size counts every page written
+        sqlite._db.execute("PRAGMA wal_autocheckpoint=0")
+
+        def wal_size() -> int:
+            return sqlite.stats()["wal_bytes"]
+
+        def log_size() -> int:
+            return log.journal.stats()["bytes_written"]
+
+        for i, entries in enumerate(lengths):
+            parcel = padded_parcel(rng, i, entries)
+            results.append({
+                "history_entries": entries,
+                "record_bytes": len(orjson.dumps(parcel)),
+                "log": {"delta": await written_per_update(log, log_size, parcel, updates, True)},
+                "sqlite": {
+                    "full": await written_per_update(sqlite, wal_size, dict(parcel, id=parcel["id"] + "F"), updates, False),
+                    "delta": await written_per_update(sqlite, wal_size, parcel, updates, True),
+                },
+                "postgrest": {
+                    "full": await written_per_update(postgrest, lambda: sent[0], dict(parcel, id=parcel["id"] + "F"), updates, False),
+                    "delta": await written_per_update(postgrest, lambda: sent[0], parcel, updates, True),
+                },
+            })
+        for store in (log, sqlite, postgrest):
+            await store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="1,10,100,1000", help="comma-separated history lengths")
+    parser.add_argument("--updates", type=int, default=20, help="status updates per history length")
+    args = parser.parse_args()
+    lengths = [int(n) for n in args.history.split(",")]
+    print(json.dumps({
+        "updates": args.updates,
+        "bytes_per_update": asyncio.run(run(lengths, args.updates)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Throughput against the number of uvicorn worker processes.
+
+For each worker count, the API runs under `uvicorn --workers N` on a fresh
+SQLite store (STORAGE_BACKEND=sqlite) and is seeded with parcels through
+the bulk order endpoint. Several client processes then drive a mix of
+tracking lookups of random seeded parcels and admin status updates
+(`--write-share`) for a fixed time. Each worker count reports throughput,
+p50/p99 latency and server CPU time over all of its processes.
+
+Before the load, two checks show that the workers share state: orders
+created through one connection are looked up at once on fresh connections,
+which land on arbitrary workers (`not_found` should be 0). Then parcels whose
+tracking response every worker has cached are updated, and fresh
+connections poll until all of them see the new status (`propagation_ms`,
+bounded by the change feed's poll interval).
+
+    python benchmarks/worker_scaling.py --workers 1,2,4 --seconds 10
+
+Scaling is bounded by the CPU cores of the machine, which the output
+reports; the client processes share those cores with the server.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from common import PARCEL, admin_headers, free_port, start_server, wait_ready
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+STATUSES = ["picked-up", "in-transit", "at-hub", "out-for-delivery"]
+
+
+def process_tree(pid: int) -> List[int]:
+    pids = [pid]
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def cpu_seconds(pids: List[int]) -> float:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            total += int(fields[11]) + int(fields[12])
+        except OSError:
+            pass
+    return total / CLOCK_TICKS
+
+
+def fresh_client(base_url: str) -> httpx.AsyncClient:
+    """A client that opens a new connection per request, so requests spread over the workers"""
+    return httpx.AsyncClient(base_url=base_url, timeout=30, limits=httpx.Limits(max_keepalive_connections=0))
+
+
+async def seed(client: httpx.AsyncClient, headers: Dict, parcels: int) -> List[str]:
+    body = "".join(json.dumps(PARCEL) + "\n" for _ in range(parcels))
+    response = await client.post("/api/admin/orders/bulk?format=ndjson", content=body, headers=headers)
+    response.raise_for_status()
+    return [result["trackingId"] for result in map(json.loads, response.text.splitlines()) if "trackingId" in result]
+
+
+async def check_consistency(base_url: str, headers: Dict, ids: List[str], workers: int, rounds: int) -> Dict:
+    not_found = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client, fresh_client(base_url) as fresh:
+        for _ in range(rounds):
+            tracking_id = (await client.post("/api/admin/orders", json=PARCEL, headers=headers)).json()["trackingId"]
+            for _ in range(workers * 2):
+                if (await fresh.get(f"/api/track/{tracking_id}")).status_code == 404:
+                    not_found += 1
+
+        propagation = []
+        for tracking_id, new_status in zip(ids, STATUSES * rounds):
+            # Every worker caches the current response first
+            for _ in range(workers * 4):
+                (await fresh.get(f"/api/track/{tracking_id}")).raise_for_status()
+            response = await client.patch(f"/api/admin/parcel/{tracking_id}", json={"status": new_status}, headers=headers)
+            response.raise_for_status()
+            updated = time.perf_counter()
+            seen = 0
+            while seen < workers * 4:
+                if time.perf_counter() - updated > 60:
+                    raise RuntimeError(f"update of {tracking_id} not visible on every worker after 60s")
+                current = (await fresh.get(f"/api/track/{tracking_id}")).json()["status"]
+                seen = seen + 1 if current == new_status else 0
+            propagation.append((time.perf_counter() - updated) * 1000)
+            if len(propagation) >= rounds:
+                break
+    propagation.sort()
+    return {
+        "not_found": not_found,
+        "propagation_ms_p50": round(statistics.median(propagation), 1),
+        "propagation_ms_max": round(propagation[-1], 1),
+    }
+
+
+def drive(base_url: str, token: str, ids: List[str], seconds: float, concurrency: int, write_share: float, seed_value: int) -> Dict:
+    """One client process: `concurrency` connections issuing the request mix until the deadline"""
+    async def run() -> Dict:
+        rng = random.Random(seed_value)
+        latencies: List[float] = []
+        errors = 0
+        headers = {"Authorization": f"Bearer {token}"}
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+            deadline = time.perf_counter() + seconds
+
+            async def worker():
+                nonlocal errors
+                while time.perf_counter() < deadline:
+                    tracking_id = rng.choice(ids)
+                    sent = time.perf_counter()
+                    if rng.random() < write_share:
+                        response = await client.patch(
+                            f"/api/admin/parcel/{tracking_id}", json={"status": rng.choice(STATUSES)}, headers=headers
+                        )
+                    else:
+                        response = await client.get(f"/api/track/{tracking_id}")
+                    latencies.append((time.perf_counter() - sent) * 1000)
+                    if response.status_code != 200:
+                        errors += 1
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return {"latencies": latencies, "errors": errors}
+
+    return asyncio.run(run())
+
+
+async def measure(workers: int, args) -> Dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as directory:
+        server = start_server(
+            port,
+            workers=workers,
+            STORAGE_BACKEND="sqlite",
+            STORAGE_SQLITE_PATH=os.path.join(directory, "swiftify.db"),
+            ENABLE_SIMULATION="false",
+            GEOCODER_CACHE_PATH="",
+        )
+        try:
+            async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+                await wait_ready(client)
+                headers = await admin_headers(client)
+                ids = await seed(client, headers, args.parcels)
+            consistency = await check_consistency(base_url, headers, ids, workers, args.checks)
+
+            pids = process_tree(server.pid)
+            cpu = cpu_seconds(pids)
+            token = headers["Authorization"].split()[1]
+            loop = asyncio.get_running_loop()
+            with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+                started = time.perf_counter()
+                results = await loop.run_in_executor(None, pool.starmap, drive, [
+                    (base_url, token, ids, args.seconds, args.concurrency, args.write_share, args.seed + i)
+                    for i in range(args.clients)
+                ])
+                elapsed = time.perf_counter() - started
+            cpu = cpu_seconds(pids) - cpu
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    return {
+        "workers": workers,
+        "requests_per_second": round(len(latencies) / elapsed),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "errors": sum(result["errors"] for result in results),
+        "server_cpu_seconds": round(cpu, 2),
+        "consistency": consistency,
+    }
+
+
+async def run(args) -> Dict:
+    results = [await measure(int(workers), args) for workers in args.workers.split(",")]
+    base = results[0]["requests_per_second"]
+    for result in results:
+        result["speedup"] = round(result["requests_per_second"] / base, 2)
+    return {"cpu_count": os.cpu_count(), "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--parcels", type=int, default=5000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--write-share", type=float, default=0.05, help="share of requests that are status updates")
+    parser.add_argument("--checks", type=int, default=20, help="orders and updates used for the consistency checks")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Cross-process change feed for workers that share a SQLite file.
+
+Each worker process keeps its own tracking cache, search index, dashboard
+totals and live-stream subscribers. When one worker writes, it appends a
+small event (topic plus JSON payload) to the `events` table of the shared
+database; every other worker polls for rows past the last sequence number
+it has seen and applies them to its own state. Events published during one
+pass of the event loop are written in a single transaction.
+
+Delivery is best effort: an event that cannot be written is dropped and
+the affected cache entries age out with their TTL. Events older than
+`retention` seconds are pruned.
+
+`Lease` is an exclusive lock file, so one process out of several can own a
+singleton job such as the movement simulation and another can take over
+when it exits.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from storage import open_sqlite
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process, so the lease is always free
+    fcntl = None
+
+EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin INTEGER NOT NULL,
+    at REAL NOT NULL,
+    topic TEXT NOT NULL,
+    payload BLOB NOT NULL
+);
+"""
+
+Handler = Callable[[List[Tuple[str, Any]]], Awaitable[None]]
+
+
+class ChangeFeed:
+    """Events published by one process and applied by all the others"""
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention: float = 300.0, timeout: float = 5.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.timeout = timeout
+        self.origin = os.getpid()
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="changefeed")
+        self._last_seq = 0
+        self._pending: List[Tuple[str, bytes]] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.lag_ms = 0.0
+
+    async def _run(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _open(self) -> int:
+        self._db = open_sqlite(self.path, self.timeout)
+        self._db.executescript(EVENTS_SCHEMA)
+        return self._db.execute("SELECT coalesce(max(seq), 0) FROM events").fetchone()[0]
+
+    async def open(self) -> None:
+        """Connect and mark the current end of the feed; later events will be applied"""
+        self._last_seq = await self._run(self._open)
+
+    async def start(self, handler: Handler) -> None:
+        """Poll for other processes' events and pass each batch to `handler`"""
+        if self._db is None:
+            await self.open()
+        self._task = asyncio.create_task(self._poll(handler))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+        self._executor.shutdown()
+
+    def publish(self, topic: str, payload: Any) -> None:
+        """Queue an event for the other processes; written at the end of this loop pass"""
+        self._pending.append((topic, orjson.dumps(payload)))
+        if self._flushing is None and self._db is not None:
+            self._flushing = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending:
+                events, self._pending = self._pending, []
+                try:
+                    await self._run(self._append, events)
+                    self.published += len(events)
+                except sqlite3.Error as e:
+                    self.dropped += len(events)
+                    print(f"Change feed write failed: {e}")
+        finally:
+            self._flushing = None
+
+    def _append(self, events: List[Tuple[str, bytes]]) -> None:
+        now = time.time()
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT INTO events (origin, at, topic, payload) VALUES (?, ?, ?, ?)",
+                [(self.origin, now, topic, payload) for topic, payload in events],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _read(self, after: int) -> List[Tuple]:
+        return self._db.execute(
+            "SELECT seq, origin, at, topic, payload FROM events WHERE seq > ? ORDER BY seq LIMIT 5000",
+            (after,),
+        ).fetchall()
+
+    def _prune(self) -> None:
+        self._db.execute("DELETE FROM events WHERE at < ?", (time.time() - self.retention,))
+
+    async def _poll(self, handler: Handler) -> None:
+        next_prune = time.monotonic() + self.retention / 10
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await self._run(self._read, self._last_seq)
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + self.retention / 10
+                    await self._run(self._prune)
+            except sqlite3.Error as e:
+                print(f"Change feed read failed: {e}")
+                continue
+            if not rows:
+                continue
+            self._last_seq = rows[-1][0]
+            events = [(topic, orjson.loads(payload)) for _, origin, _, topic, payload in rows if origin != self.origin]
+            if not events:
+                continue
+            self.received += len(events)
+            self.lag_ms = round((time.time() - rows[-1][2]) * 1000, 1)
+            try:
+                await handler(events)
+            except Exception as e:
+                print(f"Change feed handler failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "origin": self.origin,
+            "last_seq": self._last_seq,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+            "lag_ms": self.lag_ms,
+        }
+
+
+class Lease:
+    """Exclusive ownership of a job among the processes that share a lock file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # The lock goes away with the process, so a crashed owner frees it
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
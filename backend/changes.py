@@ -0,0 +1,60 @@
+"""Change tracking for parcel updates.
+
+An update to a stored parcel is persisted as a patch instead of the whole
+record: the scalar fields that changed (`set`), fields that were removed
+(`unset`), and the history entries appended since the parcel was loaded
+(`history`, starting at position `historyFrom`). A parcel's history only
+grows, so the cost of writing an update stays the same however long it
+gets. A new route is part of `set`, and the route it replaces goes into
+`replaced` so that backends can keep earlier versions.
+
+    before = snapshot(parcel)
+    parcel["status"] = "in-transit"
+    parcel["history"].append(entry)
+    patch = parcel_patch(before, parcel)
+    # {"id": ..., "set": {"status": "in-transit"}, "history": [entry], "historyFrom": 3}
+"""
+from typing import Dict, Optional
+
+
+def snapshot(parcel: Dict) -> Dict:
+    """The parcel as loaded, to diff against once it has been changed in place"""
+    before = dict(parcel)
+    if type(before.get("history")) is list:
+        # Entries are appended, never edited, so a copy of the list is enough
+        before["history"] = list(before["history"])
+    return before
+
+
+def parcel_patch(before: Dict, after: Dict) -> Optional[Dict]:
+    """The patch that turns `before` into `after`; None if nothing changed"""
+    patch: Dict = {"id": after["id"]}
+    changed = {}
+    for key, value in after.items():
+        if key == "history" and type(value) is list and type(before.get(key)) is list:
+            prior = before[key]
+            if value[:len(prior)] == prior:
+                if len(value) > len(prior):
+                    patch["history"] = value[len(prior):]
+                    patch["historyFrom"] = len(prior)
+                continue
+        if key not in before or before[key] != value:
+            changed[key] = value
+    if changed:
+        patch["set"] = changed
+        if "route" in changed and before.get("route") is not None:
+            patch["replaced"] = {"version": before.get("routeVersion") or 1, "route": before["route"]}
+    unset = [key for key in before if key not in after]
+    if unset:
+        patch["unset"] = unset
+    return patch if len(patch) > 1 else None
+
+
+def apply_patch(parcel: Dict, patch: Dict) -> Dict:
+    """Apply a patch to a parcel in place"""
+    parcel.update(patch.get("set", {}))
+    for key in patch.get("unset", ()):
+        parcel.pop(key, None)
+    if "history" in patch:
+        parcel.setdefault("history", []).extend(patch["history"])
+    return parcel
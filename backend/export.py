@@ -0,0 +1,90 @@
+"""Streaming exports of parcels and contact messages.
+
+An export is a pipeline of async generators: storage pages (see
+`Storage.iter_parcels`) are encoded one page at a time into NDJSON or CSV
+bytes and optionally gzip-compressed on the way out, so memory stays at
+one page no matter how many records are exported. NDJSON lines are the
+stored records as-is, encoded with orjson; CSV rows flatten a parcel into
+the bulk-upload columns plus its status fields, so an export can be fed
+back into `/api/admin/orders/bulk`.
+"""
+import csv
+import io
+import zlib
+from typing import AsyncIterator, Dict, List
+
+import orjson
+
+from ingest import CSV_COLUMNS
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+PARCEL_COLUMNS = (
+    ["id", "status", "mode", "createdAt", "updatedAt", "eta", "estimatedCost", "progress"]
+    + list(CSV_COLUMNS)
+)
+CONTACT_COLUMNS = ["id", "timestamp", "status", "name", "email", "message"]
+
+GZIP_LEVEL = 6
+
+
+def _lookup(record: Dict, path: tuple):
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def parcel_row(parcel: Dict) -> List:
+    """A parcel flattened into PARCEL_COLUMNS"""
+    row = [parcel.get(column) for column in PARCEL_COLUMNS[:8]]
+    row.extend(_lookup(parcel, path) for path in CSV_COLUMNS.values())
+    return row
+
+
+def contact_row(message: Dict) -> List:
+    return [message.get(column) for column in CONTACT_COLUMNS]
+
+
+async def encode_ndjson(pages: AsyncIterator[List[Dict]]) -> AsyncIterator[bytes]:
+    option = orjson.OPT_APPEND_NEWLINE
+    async for page in pages:
+        yield b"".join([orjson.dumps(record, option=option) for record in page])
+
+
+async def encode_csv(pages: AsyncIterator[List[Dict]], columns: List[str], to_row) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for page in pages:
+        writer.writerows(map(to_row, page))
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty export
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = GZIP_LEVEL) -> AsyncIterator[bytes]:
+    """Compress a byte stream into one gzip member as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_parcels(pages: AsyncIterator[List[Dict]], fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        return encode_csv(pages, PARCEL_COLUMNS, parcel_row)
+    return encode_ndjson(pages)
+
+
+def export_contacts(pages: AsyncIterator[List[Dict]], fmt: str) -> AsyncIterator[bytes]:
+    if fmt == "csv":
+        return encode_csv(pages, CONTACT_COLUMNS, contact_row)
+    return encode_ndjson(pages)
@@ -0,0 +1,239 @@
+"""In-memory spatial index over parcels' current positions.
+
+Positions are bucketed into a grid of `cell_degrees` latitude/longitude
+cells. Every parcel has a slot in flat arrays (latitude, longitude, status
+code, cell, place in the cell) and every cell keeps the slots inside it in
+an `array('I')`. Moving a parcel to another cell or removing it swaps it
+with the last slot of its old cell, so updates cost the same whatever the
+cell size. A query gathers the slots of the cells overlapping its bounding
+box and filters them exactly with vectorized NumPy distances, so its cost
+depends on the parcels near the query, not on how many there are.
+"""
+import math
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from routing import EARTH_RADIUS_KM
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def parcel_position(parcel: Dict) -> Optional[Tuple[float, float]]:
+    """(lat, lng) of a parcel's current position, or None if it has no valid one"""
+    position = parcel.get("currentPosition")
+    if not isinstance(position, dict):
+        return None
+    lat, lng = position.get("lat"), position.get("lng")
+    if type(lat) not in (int, float) or type(lng) not in (int, float):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return float(lat), float(lng)
+
+
+class SpatialIndex:
+    """Grid index answering radius and bounding-box queries over parcel positions"""
+
+    def __init__(self, cell_degrees: float = 0.1):
+        self.cell_degrees = cell_degrees
+        self._columns = math.ceil(360 / cell_degrees)
+        self._lat = array("d")
+        self._lng = array("d")
+        self._code = array("H")
+        self._cell = array("q")
+        self._place = array("I")
+        self._ids: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._cells: Dict[int, array] = {}
+        self._codes: Dict[Optional[str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _row(self, lat: float) -> int:
+        return int((lat + 90) // self.cell_degrees)
+
+    def _column(self, lng: float) -> int:
+        return min(int((lng + 180) // self.cell_degrees), self._columns - 1)
+
+    def _status_code(self, status: Optional[str]) -> int:
+        code = self._codes.get(status)
+        if code is None:
+            code = self._codes[status] = len(self._codes)
+        return code
+
+    def _enter(self, slot: int, key: int) -> None:
+        members = self._cells.get(key)
+        if members is None:
+            members = self._cells[key] = array("I")
+        self._cell[slot] = key
+        self._place[slot] = len(members)
+        members.append(slot)
+
+    def _leave(self, slot: int) -> None:
+        key = self._cell[slot]
+        members = self._cells[key]
+        last = members.pop()
+        if last != slot:
+            place = self._place[slot]
+            members[place] = last
+            self._place[last] = place
+        if not members:
+            del self._cells[key]
+
+    def _put(self, parcel_id: str, lat: float, lng: float, code: int) -> None:
+        key = self._row(lat) * self._columns + self._column(lng)
+        slot = self._slots.get(parcel_id)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self._ids[slot] = parcel_id
+            else:
+                slot = len(self._ids)
+                self._ids.append(parcel_id)
+                for values in (self._lat, self._lng, self._code, self._cell, self._place):
+                    values.append(0)
+            self._slots[parcel_id] = slot
+            self._enter(slot, key)
+        elif self._cell[slot] != key:
+            self._leave(slot)
+            self._enter(slot, key)
+        self._lat[slot] = lat
+        self._lng[slot] = lng
+        self._code[slot] = code
+
+    def add_parcel(self, parcel: Dict) -> None:
+        """Index a new or changed parcel; parcels without a position are dropped"""
+        position = parcel_position(parcel)
+        if position is None:
+            self.remove(parcel["id"])
+        else:
+            self._put(parcel["id"], *position, self._status_code(parcel.get("status")))
+
+    def add_parcels(self, parcels: Iterable[Dict]) -> None:
+        for parcel in parcels:
+            self.add_parcel(parcel)
+
+    def move(self, parcel_ids: List[str], positions: List[Dict]) -> None:
+        """New positions for indexed parcels, e.g. from a simulation tick; others are ignored"""
+        for parcel_id, position in zip(parcel_ids, positions):
+            slot = self._slots.get(parcel_id)
+            if slot is not None:
+                self._put(parcel_id, float(position["lat"]), float(position["lng"]), self._code[slot])
+
+    def remove(self, parcel_id: str) -> None:
+        slot = self._slots.pop(parcel_id, None)
+        if slot is not None:
+            self._leave(slot)
+            self._ids[slot] = None
+            self._free.append(slot)
+
+    def _candidates(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Slots in the cells overlapping a box; `west > east` wraps around the antimeridian"""
+        first_row, last_row = self._row(max(south, -90.0)), self._row(min(north, 90.0))
+        first_column, last_column = self._column(west), self._column(east)
+        if west <= east:
+            columns = list(range(first_column, last_column + 1))
+        elif last_column >= first_column:
+            # Wraps around into the cell it started in
+            columns = list(range(self._columns))
+        else:
+            columns = list(range(first_column, self._columns)) + list(range(0, last_column + 1))
+        rows = last_row - first_row + 1
+        if rows * len(columns) <= len(self._cells):
+            parts = [
+                self._cells[key]
+                for row in range(first_row, last_row + 1)
+                for key in (row * self._columns + column for column in columns)
+                if key in self._cells
+            ]
+        else:
+            # A box covering more cells than are occupied: walk the occupied ones
+            wanted = set(columns)
+            parts = [
+                members for key, members in self._cells.items()
+                if first_row <= key // self._columns <= last_row and key % self._columns in wanted
+            ]
+        if not parts:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate([np.frombuffer(members, dtype=np.uint32) for members in parts])
+
+    def _with_status(self, slots: np.ndarray, statuses: Optional[Iterable[str]]) -> np.ndarray:
+        if statuses is None:
+            return slots
+        codes = [self._codes[status] for status in statuses if status in self._codes]
+        return slots[np.isin(np.frombuffer(self._code, dtype=np.uint16)[slots], codes)]
+
+    def _distances(self, slots: np.ndarray, lat: float, lng: float) -> np.ndarray:
+        lats = np.radians(np.frombuffer(self._lat)[slots])
+        lngs = np.radians(np.frombuffer(self._lng)[slots])
+        lat0, lng0 = math.radians(lat), math.radians(lng)
+        a = np.sin((lats - lat0) / 2) ** 2 + math.cos(lat0) * np.cos(lats) * np.sin((lngs - lng0) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    def _nearest(self, slots: np.ndarray, distances: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        if len(slots) > limit:
+            keep = np.argpartition(distances, limit - 1)[:limit]
+            slots, distances = slots[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return [(self._ids[slot], round(float(distance), 3)) for slot, distance in zip(slots[order], distances[order])]
+
+    def nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        statuses: Optional[Iterable[str]] = None,
+        limit: int = 100,
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """Parcels within `radius_km` of a point: the total and the nearest `limit` (id, km)"""
+        span = radius_km / KM_PER_DEGREE
+        south, north = lat - span, lat + span
+        widest = math.cos(math.radians(min(90.0, max(abs(south), abs(north)))))
+        if north >= 90 or south <= -90 or span >= 180 * widest:
+            west, east = -180.0, 180.0
+        else:
+            west, east = lng - span / widest, lng + span / widest
+            # A box crossing the antimeridian wraps around to the other side
+            if west < -180:
+                west += 360
+            if east > 180:
+                east -= 360
+        slots = self._with_status(self._candidates(south, west, north, east), statuses)
+        distances = self._distances(slots, lat, lng)
+        inside = distances <= radius_km
+        slots, distances = slots[inside], distances[inside]
+        return len(slots), self._nearest(slots, distances, limit)
+
+    def within(
+        self,
+        south: float,
+        west: float,
+        north: float,
+        east: float,
+        statuses: Optional[Iterable[str]] = None,
+        limit: int = 100,
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """Parcels inside a box: the total and the `limit` closest to its center (id, km from center)"""
+        slots = self._with_status(self._candidates(south, west, north, east), statuses)
+        lats = np.frombuffer(self._lat)[slots]
+        lngs = np.frombuffer(self._lng)[slots]
+        inside = (lats >= south) & (lats <= north)
+        if west <= east:
+            inside &= (lngs >= west) & (lngs <= east)
+        else:
+            inside &= (lngs >= west) | (lngs <= east)
+        slots = slots[inside]
+        center_lng = (west + ((east - west) % 360) / 2 + 180) % 360 - 180
+        distances = self._distances(slots, (south + north) / 2, center_lng)
+        return len(slots), self._nearest(slots, distances, limit)
+
+    def stats(self) -> Dict:
+        return {
+            "parcels": len(self._slots),
+            "cells": len(self._cells),
+            "cell_degrees": self.cell_degrees,
+        }
@@ -0,0 +1,267 @@
+"""Offline address geocoding against a local gazetteer.
+
+Places (city, region, postcode, coordinates) are loaded from a CSV file and
+indexed three ways: by postcode, by normalized city-name tokens, and by
+character trigrams for misspelled names. Results are kept in a bounded LRU
+cache. Resolved addresses are also appended to a JSONL file whose first
+line holds a checksum of the gazetteer, so they survive restarts and are
+dropped when the places change. Misses stay in memory only, for
+`miss_ttl` seconds, so a place added later is picked up.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from routing import normalize
+
+US_STATES = {
+    "alabama": "al", "alaska": "ak", "arizona": "az", "arkansas": "ar", "california": "ca",
+    "colorado": "co", "connecticut": "ct", "delaware": "de", "district of columbia": "dc",
+    "florida": "fl", "georgia": "ga", "hawaii": "hi", "idaho": "id", "illinois": "il",
+    "indiana": "in", "iowa": "ia", "kansas": "ks", "kentucky": "ky", "louisiana": "la",
+    "maine": "me", "maryland": "md", "massachusetts": "ma", "michigan": "mi", "minnesota": "mn",
+    "mississippi": "ms", "missouri": "mo", "montana": "mt", "nebraska": "ne", "nevada": "nv",
+    "new hampshire": "nh", "new jersey": "nj", "new mexico": "nm", "new york": "ny",
+    "north carolina": "nc", "north dakota": "nd", "ohio": "oh", "oklahoma": "ok", "oregon": "or",
+    "pennsylvania": "pa", "rhode island": "ri", "south carolina": "sc", "south dakota": "sd",
+    "tennessee": "tn", "texas": "tx", "utah": "ut", "vermont": "vt", "virginia": "va",
+    "washington": "wa", "west virginia": "wv", "wisconsin": "wi", "wyoming": "wy",
+}
+POSTCODE = re.compile(r"^\d{5}$")
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Place(NamedTuple):
+    name: str
+    region: str
+    postcode: str
+    lat: float
+    lng: float
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.region}" if self.region else self.name
+
+
+class Geocoder:
+    """Gazetteer lookups with a trigram index for fuzzy names and a persistent result cache"""
+
+    def __init__(
+        self,
+        places: Iterable[Place],
+        cache_path: Optional[str] = None,
+        min_score: float = 0.6,
+        cache_size: int = 100000,
+        miss_ttl: float = 300.0,
+    ):
+        self.places: List[Place] = list(places)
+        self.min_score = min_score
+        self.cache_size = cache_size
+        self.miss_ttl = miss_ttl
+        self.checksum = hashlib.sha256(
+            "\n".join(json.dumps(place) for place in self.places).encode()
+        ).hexdigest()
+        self._postcodes: Dict[str, Place] = {}
+        self._names: Dict[str, List[tuple]] = defaultdict(list)
+        self._trigrams: Dict[str, List[int]] = defaultdict(list)
+        self._place_trigrams: List[int] = []
+        for i, place in enumerate(self.places):
+            if place.postcode:
+                self._postcodes.setdefault(place.postcode, place)
+            tokens = tuple(normalize(place.name))
+            if tokens:
+                self._names[tokens[0]].append((tokens, place))
+            grams = trigrams(" ".join(tokens))
+            self._place_trigrams.append(len(grams))
+            for gram in grams:
+                self._trigrams[gram].append(i)
+
+        # Normalized address -> (result, expiry); misses have a None result and an expiry
+        self._cache: "OrderedDict[str, Tuple[Optional[Dict], Optional[float]]]" = OrderedDict()
+        self.cache_path = cache_path
+        self._cache_file = None
+        if cache_path and os.path.exists(cache_path):
+            self._load_cache(cache_path)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_csv(cls, path: str, **kwargs) -> "Geocoder":
+        """Load places from a CSV with name,region,postcode,lat,lng columns"""
+        with open(path, newline="") as f:
+            places = [
+                Place(row["name"], row.get("region") or "", row.get("postcode") or "", float(row["lat"]), float(row["lng"]))
+                for row in csv.DictReader(f)
+            ]
+        return cls(places, **kwargs)
+
+    def _load_cache(self, path: str) -> None:
+        entries = 0
+        with open(path) as f:
+            try:
+                current = json.loads(f.readline()).get("gazetteer") == self.checksum
+            except (ValueError, AttributeError):
+                current = False
+            if not current:
+                print(f"Geocode cache {path} is for another gazetteer, starting afresh")
+                self._rewrite_cache()
+                return
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if entry["result"] is not None:
+                        self._store(entry["key"], entry["result"], None)
+                        entries += 1
+                except (ValueError, KeyError, TypeError):
+                    continue  # torn write from an unclean shutdown
+        if entries > 2 * self.cache_size:
+            # Mostly evicted entries; keep the file to what is cached
+            self._rewrite_cache()
+
+    def _rewrite_cache(self) -> None:
+        """Replace the cache file with the header and the cached results"""
+        temporary = f"{self.cache_path}.tmp"
+        try:
+            with open(temporary, "w") as f:
+                f.write(json.dumps({"gazetteer": self.checksum}) + "\n")
+                for key, (result, _) in self._cache.items():
+                    if result is not None:
+                        f.write(json.dumps({"key": key, "result": result}) + "\n")
+            os.replace(temporary, self.cache_path)
+        except OSError as e:
+            print(f"Geocode cache write failed: {e}")
+
+    def _store(self, key: str, result: Optional[Dict], expires: Optional[float]) -> None:
+        self._cache[key] = (result, expires)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _remember(self, key: str, result: Optional[Dict]) -> None:
+        if result is None:
+            self._store(key, None, time.monotonic() + self.miss_ttl)
+            return
+        self._store(key, result, None)
+        if not self.cache_path:
+            return
+        try:
+            if self._cache_file is None:
+                self._cache_file = open(self.cache_path, "a")
+                if self._cache_file.tell() == 0:
+                    self._cache_file.write(json.dumps({"gazetteer": self.checksum}) + "\n")
+            self._cache_file.write(json.dumps({"key": key, "result": result}) + "\n")
+            self._cache_file.flush()
+        except OSError as e:
+            print(f"Geocode cache write failed: {e}")
+
+    def close(self) -> None:
+        if self._cache_file is not None:
+            self._cache_file.close()
+            self._cache_file = None
+
+    def geocode(self, address: str) -> Optional[Dict]:
+        """Coordinates and label for an address, or None if no place matches"""
+        tokens = normalize(address)
+        key = " ".join(tokens)
+        cached = self._cache.get(key)
+        if cached is not None and (cached[1] is None or cached[1] > time.monotonic()):
+            self.hits += 1
+            result = cached[0]
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            result = self._resolve(address, tokens)
+            self._remember(key, result)
+        return dict(result) if result is not None else None
+
+    def geocode_many(self, addresses: List[str]) -> List[Optional[Dict]]:
+        """Geocode a batch, resolving each distinct address once"""
+        resolved: Dict[str, Optional[Dict]] = {}
+        results = []
+        for address in addresses:
+            if address not in resolved:
+                resolved[address] = self.geocode(address)
+            result = resolved[address]
+            results.append(dict(result) if result is not None else None)
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "places": len(self.places),
+            "cached": len(self._cache),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _resolve(self, address: str, tokens: List[str]) -> Optional[Dict]:
+        regions = self._regions(tokens)
+
+        # A known postcode is the most precise match
+        for token in reversed(tokens):
+            if POSTCODE.match(token) and token in self._postcodes:
+                return self._result(self._postcodes[token], "postcode", 1.0)
+
+        # Exact city name anywhere in the address; prefer the region given and later mentions
+        matches = []
+        for i, token in enumerate(tokens):
+            for name, place in self._names.get(token, ()):
+                if tuple(tokens[i:i + len(name)]) == name:
+                    matches.append((place.region.lower() in regions, len(name), i, place))
+        if matches:
+            place = max(matches, key=lambda match: match[:3])[3]
+            return self._result(place, "city", 1.0)
+
+        # Misspelled city: best trigram match over each comma-separated part
+        best, best_score = None, 0.0
+        for part in address.split(","):
+            words = [word for word in normalize(part) if not word.isdigit() and word not in regions]
+            if not words:
+                continue
+            place, score = self._fuzzy(" ".join(words), regions)
+            if place is not None and score > best_score:
+                best, best_score = place, score
+        if best is not None and best_score >= self.min_score:
+            return self._result(best, "fuzzy", round(best_score, 3))
+        return None
+
+    def _regions(self, tokens: List[str]) -> set:
+        """Region codes mentioned in an address, e.g. "ca" or "new york" -> "ny\""""
+        regions = {token for token in tokens if len(token) == 2 and token.isalpha()}
+        text = f" {' '.join(tokens)} "
+        for name, code in US_STATES.items():
+            if f" {name} " in text:
+                regions.add(code)
+        return regions
+
+    def _fuzzy(self, text: str, regions: set) -> tuple:
+        grams = trigrams(text)
+        shared = Counter(i for gram in grams for i in self._trigrams.get(gram, ()))
+        best, best_score = None, 0.0
+        for i, common in shared.items():
+            score = 2.0 * common / (len(grams) + self._place_trigrams[i])
+            if self.places[i].region.lower() in regions:
+                score += 0.1
+            if score > best_score:
+                best, best_score = self.places[i], score
+        return best, min(best_score, 1.0)
+
+    @staticmethod
+    def _result(place: Place, precision: str, score: float) -> Dict:
+        return {
+            "lat": place.lat,
+            "lng": place.lng,
+            "label": place.label,
+            "postcode": place.postcode if precision == "postcode" else None,
+            "precision": precision,
+            "score": score,
+        }
@@ -0,0 +1,133 @@
+"""Time-ordered, collision-free tracking IDs.
+
+A tracking ID packs 62 bits Snowflake-style:
+
+    | 40 bits: ms since EPOCH | 10 bits: shard | 12 bits: sequence |
+
+and renders them as 12 zero-padded base36 characters after "SWIFT-". The
+timestamp is the high part and the rendering has a fixed width, so IDs
+compare in creation order as plain strings. A range of creation times
+maps to a range of IDs (`id_bounds`), and the issuing shard can be read
+back from any ID in O(1) (`shard_of`). Each shard issues up to 4096 IDs
+per millisecond and never repeats one. Only a clock step backwards could
+make it repeat, and the generator keeps its own clock monotonic to guard
+against that. Distinct shards never collide, so every worker process or
+node needs its own shard number: worker processes on one host lease one
+each (`from_env`), and each node starts its range at `TRACKING_SHARD_ID`.
+
+IDs issued before this scheme (6 timestamp digits plus 6 random hex
+characters) still look up as usual, but carry no meaningful time or shard.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+PREFIX = "SWIFT-"
+EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z; 40 bits of ms last until 2059
+TIMESTAMP_BITS = 40
+SHARD_BITS = 10
+SEQUENCE_BITS = 12
+MAX_SHARD = (1 << SHARD_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WIDTH = 12
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _base36(value: int) -> str:
+    chars = []
+    for _ in range(WIDTH):
+        value, digit = divmod(value, 36)
+        chars.append(DIGITS[digit])
+    return "".join(reversed(chars))
+
+
+def _compose(ms: int, shard: int, sequence: int) -> int:
+    return ((ms - EPOCH_MS) << (SHARD_BITS + SEQUENCE_BITS)) | (shard << SEQUENCE_BITS) | sequence
+
+
+def decode(tracking_id: str) -> Tuple[int, int, int]:
+    """(unix ms, shard, sequence) of a tracking ID; ValueError if it is not one"""
+    if not tracking_id.startswith(PREFIX) or len(tracking_id) != len(PREFIX) + WIDTH:
+        raise ValueError(f"Not a tracking ID: {tracking_id!r}")
+    value = int(tracking_id[len(PREFIX):], 36)
+    return (
+        (value >> (SHARD_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        (value >> SEQUENCE_BITS) & MAX_SHARD,
+        value & MAX_SEQUENCE,
+    )
+
+
+def shard_of(tracking_id: str) -> int:
+    """The shard that issued an ID, e.g. to route a lookup to its owner"""
+    return decode(tracking_id)[1]
+
+
+def created_at(tracking_id: str) -> datetime:
+    return datetime.fromtimestamp(decode(tracking_id)[0] / 1000, tz=timezone.utc)
+
+
+def id_bounds(start: datetime, end: datetime) -> Tuple[str, str]:
+    """IDs issued in [start, end) by any shard are >= the first and < the second"""
+    def ms(moment: datetime) -> int:
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp() * 1000)
+
+    return PREFIX + _base36(_compose(ms(start), 0, 0)), PREFIX + _base36(_compose(ms(end), 0, 0))
+
+
+class TrackingIdGenerator:
+    """Issues IDs for one shard; thread-safe"""
+
+    def __init__(self, shard: int = 0, clock: Callable[[], float] = time.time):
+        if not 0 <= shard <= MAX_SHARD:
+            raise ValueError(f"Shard must be between 0 and {MAX_SHARD}")
+        self.shard = shard
+        self.clock = clock
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.borrowed_ms = 0
+
+    @classmethod
+    def from_env(cls, lease: Optional[Callable[[int], bool]] = None) -> "TrackingIdGenerator":
+        """A generator for TRACKING_SHARD_ID, or for the first shard from there that `lease` grants
+
+        `lease(shard)` claims a shard for this process among the workers of a
+        host and says whether it got it. Without one there is no way to tell
+        workers apart, so running several (WEB_CONCURRENCY) is refused.
+        """
+        first = int(os.getenv("TRACKING_SHARD_ID", "0"))
+        if lease is not None:
+            for shard in range(first, MAX_SHARD + 1):
+                if lease(shard):
+                    return cls(shard)
+            raise RuntimeError(f"No free tracking ID shard between {first} and {MAX_SHARD}")
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            raise RuntimeError(
+                "Several workers would share one tracking ID shard; "
+                "use SQLite storage or set CHANGE_FEED_PATH so that each leases its own"
+            )
+        return cls(first)
+
+    def next_id(self) -> str:
+        with self._lock:
+            now = int(self.clock() * 1000)
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            elif self._sequence < MAX_SEQUENCE:
+                # Same millisecond, or the clock went back: stay on the last one
+                self._sequence += 1
+            else:
+                # Sequence exhausted: move on to the next millisecond early
+                self._last_ms += 1
+                self._sequence = 0
+                self.borrowed_ms += 1
+            self.issued += 1
+            return PREFIX + _base36(_compose(self._last_ms, self.shard, self._sequence))
+
+    def stats(self) -> Dict:
+        return {"shard": self.shard, "issued": self.issued, "borrowed_ms": self.borrowed_ms}
@@ -0,0 +1,393 @@
+"""Bounded contact-message inbox for the in-memory storage.
+
+The newest messages (at least `hot_size` of them) stay in memory, with
+(timestamp, id) keys sorted overall and per status (new/read/archived),
+so a filtered page is a bisect and a slice. Once `segment_size` more have
+arrived, the oldest `segment_size` are written to an immutable segment
+file and dropped from memory. A segment is one zlib-compressed JSON array
+of messages, behind a small header that records its key range and its
+count per status. Only these headers stay in memory, a few hundred bytes
+per segment, so memory does not grow with message volume.
+
+Queries walk the hot window and then only the segments whose key range
+and status counts can contribute to the page, usually one or two. A
+status change to archived messages rewrites their segment in place
+(write to a temporary file, then rename). Looking a message up by id
+outside the hot window reads segments newest first until it is found.
+"""
+import os
+import re
+import tempfile
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+from journal import FRAME, _sync_directory, frame, read_frames
+
+STATUSES = ("new", "read", "archived")
+SEGMENT_MAGIC = b"SWIFTINBOX1\n"
+SEGMENT_NAME = re.compile(r"^contacts-(\d+)\.seg$")
+
+Key = Tuple[str, str]
+
+
+def message_key(message: Dict) -> Key:
+    return message.get("timestamp") or "", message["id"]
+
+
+def message_status(message: Dict) -> str:
+    return message.get("status") or "new"
+
+
+class Segment:
+    """Summary of one segment file; the messages themselves stay on disk"""
+
+    __slots__ = ("number", "path", "first", "last", "counts", "size")
+
+    def __init__(self, number: int, path: str, first: Key, last: Key, counts: Dict[str, int], size: int):
+        self.number = number
+        self.path = path
+        self.first = first
+        self.last = last
+        self.counts = counts
+        self.size = size
+
+
+class ContactInbox:
+    """Contact messages: a hot window in memory, older ones in segment files
+
+    Without a directory, segments go to a temporary one that is removed on
+    close. With `durable`, segment writes are fsynced before they count.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        hot_size: int = 5000,
+        segment_size: int = 1000,
+        durable: bool = False,
+        cached_segments: int = 2,
+    ):
+        self.directory = directory
+        self.hot_size = hot_size
+        self.segment_size = segment_size
+        self.durable = durable
+        self.cached_segments = cached_segments
+        self._temporary: Optional[tempfile.TemporaryDirectory] = None
+        self._hot: Dict[str, Dict] = {}
+        self._keys: List[Key] = []
+        self._by_status: Dict[str, List[Key]] = {}
+        self._segments: List[Segment] = []
+        self._next_segment = 1
+        # Highest key in any segment; newer messages cannot be in one yet
+        self._cold_last: Optional[Key] = None
+        self._counts: Dict[str, int] = {}
+        self._cache: "OrderedDict[int, List[Dict]]" = OrderedDict()
+        self.spilled = 0
+        self.segment_reads = 0
+        self.segment_writes = 0
+
+    def __len__(self) -> int:
+        return sum(self._counts.values())
+
+    def open(self) -> None:
+        """Pick up the segments already in the directory"""
+        if self.directory is None:
+            self._temporary = tempfile.TemporaryDirectory(prefix="swiftify-inbox-")
+            self.directory = self._temporary.name
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+                continue
+            match = SEGMENT_NAME.match(name)
+            if match:
+                segment = self._read_header(int(match.group(1)), path)
+                self._segments.append(segment)
+                self._cold_last = max(self._cold_last or segment.last, segment.last)
+                for status, count in segment.counts.items():
+                    self._counts[status] = self._counts.get(status, 0) + count
+                self._next_segment = max(self._next_segment, segment.number + 1)
+        self._segments.sort(key=lambda segment: segment.first)
+
+    def close(self) -> None:
+        if self._temporary is not None:
+            self._temporary.cleanup()
+            self._temporary = None
+            self.directory = None
+
+    # Segment files
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"contacts-{number:08d}.seg")
+
+    def _read_header(self, number: int, path: str) -> Segment:
+        with open(path, "rb") as f:
+            head = f.read(len(SEGMENT_MAGIC) + FRAME.size)
+            if head[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC or len(head) < len(SEGMENT_MAGIC) + FRAME.size:
+                raise ValueError(f"{path} is not an inbox segment")
+            length, _ = FRAME.unpack_from(head, len(SEGMENT_MAGIC))
+            payload = next(read_frames(head[len(SEGMENT_MAGIC):] + f.read(length)), None)
+            size = os.fstat(f.fileno()).st_size
+        if payload is None:
+            raise ValueError(f"Inbox segment {path} has a corrupt header")
+        header = orjson.loads(payload)
+        return Segment(number, path, tuple(header["first"]), tuple(header["last"]), header["counts"], size)
+
+    def _load(self, segment: Segment) -> List[Dict]:
+        """Messages of a segment in key order, through a small cache of recently read ones"""
+        messages = self._cache.get(segment.number)
+        if messages is not None:
+            self._cache.move_to_end(segment.number)
+            return messages
+        with open(segment.path, "rb") as f:
+            data = f.read()
+        payloads = list(read_frames(data, len(SEGMENT_MAGIC)))
+        if len(payloads) != 2:
+            raise ValueError(f"Inbox segment {segment.path} is truncated")
+        messages = orjson.loads(zlib.decompress(payloads[1]))
+        self.segment_reads += 1
+        self._remember(segment.number, messages)
+        return messages
+
+    def _remember(self, number: int, messages: List[Dict]) -> None:
+        self._cache[number] = messages
+        self._cache.move_to_end(number)
+        while len(self._cache) > self.cached_segments:
+            self._cache.popitem(last=False)
+
+    def _write(self, number: int, messages: List[Dict]) -> Segment:
+        """Write a segment atomically; replaces any earlier version of it"""
+        counts: Dict[str, int] = {}
+        for message in messages:
+            status = message_status(message)
+            counts[status] = counts.get(status, 0) + 1
+        first, last = message_key(messages[0]), message_key(messages[-1])
+        header = orjson.dumps({"first": first, "last": last, "counts": counts})
+        body = zlib.compress(orjson.dumps(messages), 6)
+        path = self._segment_path(number)
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(SEGMENT_MAGIC + frame(header) + frame(body))
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+            size = f.tell()
+        os.replace(temporary, path)
+        if self.durable:
+            _sync_directory(self.directory)
+        self.segment_writes += 1
+        self._remember(number, messages)
+        return Segment(number, path, first, last, counts, size)
+
+    def _spill(self) -> None:
+        """Move the oldest `segment_size` hot messages into a new segment"""
+        if self.directory is None:
+            self.open()
+        keys = self._keys[:self.segment_size]
+        messages = [self._hot[message_id] for _, message_id in keys]
+        segment = self._write(self._next_segment, messages)
+        self._next_segment += 1
+        insort(self._segments, segment, key=lambda segment: segment.first)
+        self._cold_last = max(self._cold_last or segment.last, segment.last)
+        del self._keys[:len(keys)]
+        for message in messages:
+            del self._hot[message["id"]]
+        # The spilled keys of each status are the oldest ones of that status
+        for status, count in segment.counts.items():
+            del self._by_status[status][:count]
+        self.spilled += len(messages)
+
+    # Reads
+
+    def _covering(self, key: Key) -> Iterator[Segment]:
+        for segment in self._segments:
+            if segment.first <= key <= segment.last:
+                yield segment
+
+    def contains(self, message: Dict) -> bool:
+        if message["id"] in self._hot:
+            return True
+        key = message_key(message)
+        return any(
+            any(stored["id"] == message["id"] for stored in self._load(segment))
+            for segment in self._covering(key)
+        )
+
+    def get(self, message_ids: Iterable[str]) -> Dict[str, Dict]:
+        found = {message_id: self._hot[message_id] for message_id in message_ids if message_id in self._hot}
+        missing = {message_id for message_id in message_ids if message_id not in found}
+        for segment in reversed(self._segments):
+            if not missing:
+                break
+            for message in self._load(segment):
+                if message["id"] in missing:
+                    found[message["id"]] = message
+                    missing.discard(message["id"])
+        return found
+
+    def hot(self) -> List[Dict]:
+        """Messages held in memory, in key order"""
+        return [self._hot[message_id] for _, message_id in self._keys]
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Every message, archived ones first; not in key order if timestamps went backwards"""
+        for segment in list(self._segments):
+            yield from self._load(segment)
+        yield from self.hot()
+
+    def count(self, status: Optional[str] = None) -> int:
+        return self._counts.get(status, 0) if status is not None else len(self)
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        after: Optional[Key] = None,
+        descending: bool = False,
+        limit: int = 50,
+    ) -> List[Dict]:
+        """Up to `limit` messages in (timestamp, id) order, sent after `since` and past `after`"""
+        # (since, "\uffff") sorts after every message sent at exactly `since`
+        lower: Optional[Key] = (since, "\uffff") if since else None
+        upper: Optional[Key] = None
+        if after:
+            after = tuple(after)
+            if descending:
+                upper = after
+            else:
+                lower = max(lower, after) if lower else after
+
+        keys = self._by_status.get(status, []) if status is not None else self._keys
+        lo = bisect_right(keys, lower) if lower else 0
+        hi = bisect_left(keys, upper) if upper else len(keys)
+        page = keys[max(lo, hi - limit):hi][::-1] if descending else keys[lo:min(hi, lo + limit)]
+        found = [(key, self._hot[key[1]]) for key in page]
+
+        # Segments in the order they can contribute; stop once none of the rest can beat the page
+        segments = sorted(self._segments, key=lambda segment: segment.last, reverse=True) if descending else self._segments
+        for segment in segments:
+            if status is not None and not segment.counts.get(status):
+                continue
+            if (lower is not None and segment.last <= lower) or (upper is not None and segment.first >= upper):
+                continue
+            if len(found) >= limit:
+                edge = found[limit - 1][0]
+                if (segment.last < edge) if descending else (segment.first > edge):
+                    break
+            matches = []
+            for message in self._load(segment):
+                key = message_key(message)
+                if (lower is None or key > lower) and (upper is None or key < upper) and (
+                    status is None or message_status(message) == status
+                ):
+                    matches.append((key, message))
+            if descending:
+                matches.reverse()
+            found.extend(matches[:limit])
+            found.sort(key=itemgetter(0), reverse=descending)
+            del found[limit:]
+        return [message for _, message in found]
+
+    # Writes
+
+    def add(self, message: Dict) -> bool:
+        """Hold a new message; False if it is already held, e.g. when a log is replayed"""
+        key = message_key(message)
+        if message["id"] in self._hot or (self._cold_last is not None and key <= self._cold_last and self.contains(message)):
+            return False
+        status = message_status(message)
+        self._hot[message["id"]] = message
+        insort(self._keys, key)
+        insort(self._by_status.setdefault(status, []), key)
+        self._counts[status] = self._counts.get(status, 0) + 1
+        if self.hot_size and len(self._hot) >= self.hot_size + self.segment_size:
+            self._spill()
+        return True
+
+    def set_status(
+        self,
+        new_status: str,
+        ids: Optional[Iterable[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> List[str]:
+        """Move the messages that match all given filters to `new_status`; returns the ids that changed
+
+        `ids` limits the change to those messages, `status` to messages
+        currently in that status, `before` to messages sent before that time.
+        """
+        wanted = set(ids) if ids is not None else None
+
+        def matches(message: Dict) -> bool:
+            current = message_status(message)
+            return current != new_status and (status is None or current == status) and (
+                before is None or (message.get("timestamp") or "") < before
+            )
+
+        if wanted is not None:
+            hot = [self._hot[message_id] for message_id in wanted if message_id in self._hot]
+        else:
+            keys = self._by_status.get(status, []) if status is not None else self._keys
+            hot = [self._hot[message_id] for _, message_id in keys[:bisect_left(keys, (before, "")) if before else None]]
+        changed = []
+        for message in hot:
+            if wanted is not None:
+                wanted.discard(message["id"])
+            if matches(message):
+                self._move(message_key(message), message_status(message), new_status)
+                message["status"] = new_status
+                changed.append(message["id"])
+
+        for i in range(len(self._segments) - 1, -1, -1):
+            if wanted is not None and not wanted:
+                break
+            segment = self._segments[i]
+            if wanted is None and (
+                (status is not None and not segment.counts.get(status))
+                or (before is not None and segment.first[0] >= before)
+            ):
+                continue
+            messages = self._load(segment)
+            hits = []
+            for message in messages:
+                if wanted is not None:
+                    if message["id"] not in wanted:
+                        continue
+                    wanted.discard(message["id"])
+                if matches(message):
+                    hits.append(message)
+            if not hits:
+                continue
+            for message in hits:
+                current = message_status(message)
+                self._counts[current] -= 1
+                self._counts[new_status] = self._counts.get(new_status, 0) + 1
+                message["status"] = new_status
+                changed.append(message["id"])
+            self._segments[i] = self._write(segment.number, messages)
+        return changed
+
+    def _move(self, key: Key, old: str, new: str) -> None:
+        keys = self._by_status[old]
+        del keys[bisect_left(keys, key)]
+        insort(self._by_status.setdefault(new, []), key)
+        self._counts[old] -= 1
+        self._counts[new] = self._counts.get(new, 0) + 1
+
+    def stats(self) -> Dict:
+        return {
+            "messages": len(self),
+            "hot": len(self._hot),
+            "segments": len(self._segments),
+            "segment_bytes": sum(segment.size for segment in self._segments),
+            "spilled": self.spilled,
+            "segment_reads": self.segment_reads,
+            "segment_writes": self.segment_writes,
+            **{status: self._counts.get(status, 0) for status in STATUSES},
+        }
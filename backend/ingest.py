@@ -0,0 +1,131 @@
+"""Incremental parsers for bulk order uploads.
+
+Both parsers consume the request body chunk by chunk and yield one row at a
+time, so an upload is never held in memory as a whole. Rows are yielded
+as `(row_number, data, error)` with exactly one of `data`/`error` set.
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+MAX_ROW_BYTES = 64 * 1024
+
+# Flat CSV columns and where they go in a ScheduleRequest
+CSV_COLUMNS = {
+    "sender_name": ("sender", "name"),
+    "sender_email": ("sender", "email"),
+    "sender_phone": ("sender", "phone"),
+    "sender_address": ("sender", "address"),
+    "receiver_name": ("receiver", "name"),
+    "receiver_email": ("receiver", "email"),
+    "receiver_phone": ("receiver", "phone"),
+    "receiver_address": ("receiver", "address"),
+    "description": ("parcelDetails", "description"),
+    "weight": ("parcelDetails", "weight"),
+    "value": ("parcelDetails", "value"),
+    "instructions": ("parcelDetails", "instructions"),
+    "length": ("parcelDetails", "dimensions", "length"),
+    "width": ("parcelDetails", "dimensions", "width"),
+    "height": ("parcelDetails", "dimensions", "height"),
+}
+
+Row = Tuple[int, Optional[Dict], Optional[str]]
+
+
+class RowTooLarge(ValueError):
+    """Raised when a single row exceeds MAX_ROW_BYTES"""
+
+
+def _over_limit(text: str) -> bool:
+    """Whether text takes more than MAX_ROW_BYTES once encoded"""
+    # A character encodes to one to four bytes, so most lines need no encoding to tell
+    if len(text) > MAX_ROW_BYTES:
+        return True
+    if len(text) * 4 <= MAX_ROW_BYTES:
+        return False
+    return len(text.encode("utf-8")) > MAX_ROW_BYTES
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into decoded lines without buffering more than one line"""
+    # utf-8-sig drops the byte order mark that Excel writes before the header
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if _over_limit(line):
+                raise RowTooLarge(f"row longer than {MAX_ROW_BYTES} bytes")
+            yield line.rstrip("\r")
+        if _over_limit(pending):
+            raise RowTooLarge(f"row longer than {MAX_ROW_BYTES} bytes")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    row = 0
+    async for line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row, None, "Each line must be a JSON object"
+            continue
+        yield row, data, None
+
+
+def csv_record_to_order(record: Dict[str, str]) -> Dict:
+    """Nest a flat CSV record into the ScheduleRequest shape"""
+    order: Dict = {"parcelDetails": {"dimensions": {}}}
+    for column, value in record.items():
+        path = CSV_COLUMNS.get(column)
+        if path is None or value is None or value == "":
+            continue
+        target = order
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = value
+    return order
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    header = None
+    row = 0
+    record_lines = []
+    record_bytes = 0
+    open_quote = False
+    async for line in iter_lines(chunks):
+        record_lines.append(line)
+        record_bytes += len(line.encode("utf-8")) + 1
+        if record_bytes > MAX_ROW_BYTES:
+            raise RowTooLarge(f"row longer than {MAX_ROW_BYTES} bytes")
+        # A quoted field may contain newlines; wait until the quotes balance
+        if line.count('"') % 2:
+            open_quote = not open_quote
+        if open_quote:
+            continue
+        text = "\n".join(record_lines)
+        record_lines = []
+        record_bytes = 0
+        if not text.strip():
+            continue
+        fields = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in fields]
+            continue
+        row += 1
+        if len(fields) != len(header):
+            yield row, None, f"Expected {len(header)} columns, got {len(fields)}"
+            continue
+        yield row, csv_record_to_order(dict(zip(header, fields))), None
+    if record_lines:
+        yield row + 1, None, "Unterminated quoted field"
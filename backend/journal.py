@@ -0,0 +1,289 @@
+"""Write-ahead log and snapshots for the in-memory storage.
+
+Writes are appended as small JSON events to numbered segment files
+(`wal-00000001.log`, ...). Each event is framed with its length and a
+CRC32, so a torn write at the end of a segment is detected and ignored.
+After a failed write the log moves on to a new segment, so a torn frame
+is always the last one in its file and never hides later events.
+A background task writes whatever events queued up since its last pass
+in one call and fsyncs once, so concurrent writers share one disk flush
+(group commit) and each writer is acknowledged once its events are durable.
+
+A snapshot (`snapshot-N.snap`) holds the full state as of the start of
+segment N, as pickled chunks of compact parcel rows, contact messages and
+replaced routes, and is read back
+through a memory map. Recovery loads the newest snapshot and replays the
+segments from N onwards; older files are removed once a newer snapshot
+is safely on disk.
+"""
+import asyncio
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+FRAME = struct.Struct("<II")  # payload length, CRC32 of the payload
+SNAPSHOT_MAGIC = b"SWIFTSNAP1\n"
+SNAPSHOT_CHUNK = 500
+SEGMENT_NAME = re.compile(r"^wal-(\d+)\.log$")
+SNAPSHOT_NAME = re.compile(r"^snapshot-(\d+)\.snap$")
+
+_sync = getattr(os, "fdatasync", os.fsync)
+
+
+def frame(payload: bytes) -> bytes:
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_frames(buffer, offset: int = 0) -> Iterator[bytes]:
+    """Payloads of the intact frames in buffer from offset on"""
+    end = len(buffer)
+    while offset + FRAME.size <= end:
+        length, crc = FRAME.unpack_from(buffer, offset)
+        start = offset + FRAME.size
+        payload = buffer[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield payload
+        offset = start + length
+
+
+def _write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _sync_directory(directory: str) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _numbered(directory: str, pattern: re.Pattern) -> List[Tuple[int, str]]:
+    found = []
+    for name in os.listdir(directory):
+        match = pattern.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def read_segment(path: str) -> Iterator[Dict]:
+    """Events in a log segment, up to the first torn or corrupt frame"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for payload in read_frames(mapped):
+                yield json.loads(payload)
+
+
+def write_snapshot(path: str, rows: List[tuple], contacts: List[Dict], routes: List[tuple] = ()) -> int:
+    """Write a snapshot atomically; returns its size in bytes"""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        for kind, items in (("parcels", rows), ("contacts", contacts), ("routes", routes)):
+            for i in range(0, len(items), SNAPSHOT_CHUNK):
+                f.write(frame(pickle.dumps((kind, items[i:i + SNAPSHOT_CHUNK]), protocol=pickle.HIGHEST_PROTOCOL)))
+        f.write(frame(pickle.dumps(("end", len(rows), len(contacts), len(routes)))))
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(temporary, path)
+    _sync_directory(os.path.dirname(path))
+    return size
+
+
+def read_snapshot(path: str) -> Iterator[Tuple[str, list]]:
+    """(kind, items) chunks of a snapshot; raises ValueError if it is incomplete"""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if mapped[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        for payload in read_frames(mapped, len(SNAPSHOT_MAGIC)):
+            chunk = pickle.loads(payload)
+            if chunk[0] == "end":
+                return
+            yield chunk
+    raise ValueError(f"Snapshot {path} is truncated")
+
+
+class Journal:
+    """Segmented append-only event log with group-commit fsync"""
+
+    def __init__(self, directory: str, commit_delay: float = 0.002):
+        self.directory = directory
+        self.commit_delay = commit_delay
+        self.segment = 0
+        self.segment_bytes = 0
+        self._fd: Optional[int] = None
+        # Set when a write failed and the current segment may end in a torn frame
+        self._torn = False
+        # Framed events, or a future to resolve with the number of the segment switched to
+        self._queue: List[Union[bytes, asyncio.Future]] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.events = 0
+        self.commits = 0
+        self.bytes_written = 0
+        self.failures = 0
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"wal-{number:08d}.log")
+
+    def snapshot_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"snapshot-{number:08d}.snap")
+
+    def recover(self) -> Tuple[Optional[str], List[str]]:
+        """The newest snapshot (if any) and the segments to replay after it"""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshots = _numbered(self.directory, SNAPSHOT_NAME)
+        segments = []
+        for number, path in _numbered(self.directory, SEGMENT_NAME):
+            # Segments left empty by earlier runs hold nothing to replay
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+            else:
+                segments.append((number, path))
+        base, snapshot = snapshots[-1] if snapshots else (1, None)
+        self.segment = max([base - 1] + [number for number, _ in segments])
+        return snapshot, [path for number, path in segments if number >= base]
+
+    def open(self) -> None:
+        """Start appending to a fresh segment after the recovered ones"""
+        self._switch()
+        self._task = asyncio.create_task(self._run())
+
+    def append(self, events: List[Dict[str, Any]]) -> asyncio.Future:
+        """Queue events; the returned future resolves once they are on disk"""
+        for event in events:
+            data = frame(json.dumps(event, separators=(",", ":")).encode())
+            self._queue.append(data)
+            self.segment_bytes += len(data)
+        self.events += len(events)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._wakeup.set()
+        return future
+
+    def rotate(self) -> asyncio.Future:
+        """Direct later events to a new segment; the future resolves to its number"""
+        future = asyncio.get_running_loop().create_future()
+        self.segment_bytes = 0
+        self._queue.append(future)
+        self._wakeup.set()
+        return future
+
+    def prune(self, before: int) -> None:
+        """Remove segments and snapshots made obsolete by snapshot `before`"""
+        for pattern in (SEGMENT_NAME, SNAPSHOT_NAME):
+            for number, path in _numbered(self.directory, pattern):
+                if number < before:
+                    os.remove(path)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            if self.commit_delay:
+                # Let concurrent writers join this commit
+                await asyncio.sleep(self.commit_delay)
+            self._wakeup.clear()
+            queue, waiters = self._queue, self._waiters
+            self._queue, self._waiters = [], []
+            opened: List[Tuple[asyncio.Future, int]] = []
+            try:
+                await loop.run_in_executor(None, self._write, queue, opened)
+                error = None
+            except OSError as e:
+                print(f"Journal write failed: {e}")
+                self.failures += 1
+                error = e
+            for future, number in opened:
+                future.set_result(number)
+            for item in queue:
+                if type(item) is not bytes and not item.done():
+                    item.set_exception(error)
+            for waiter in waiters:
+                if not waiter.done():
+                    if error is None:
+                        waiter.set_result(None)
+                    else:
+                        waiter.set_exception(error)
+
+    def _switch(self) -> None:
+        """Append to the next segment from now on"""
+        number = self.segment + 1
+        fd = os.open(self._segment_path(number), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = fd
+        self.segment = number
+        _sync_directory(self.directory)
+
+    def _write(self, queue: List[Union[bytes, asyncio.Future]], opened: List[Tuple[asyncio.Future, int]]) -> None:
+        """Write and fsync the queued frames, switching segments at each marker"""
+        if self._torn:
+            self._switch()
+            self._torn = False
+        pending: List[bytes] = []
+        start = os.fstat(self._fd).st_size
+        try:
+            for item in queue:
+                if type(item) is bytes:
+                    pending.append(item)
+                    continue
+                self._flush(pending)
+                pending = []
+                self._switch()
+                start = 0
+                opened.append((item, self.segment))
+            self._flush(pending)
+        except OSError:
+            # Drop what this write left of its frames, and in case that fails
+            # too, append nothing more after them
+            self._torn = True
+            try:
+                os.ftruncate(self._fd, start)
+                self._switch()
+                self._torn = False
+            except OSError:
+                pass
+            raise
+
+    def _flush(self, pending: List[bytes]) -> None:
+        if pending:
+            data = b"".join(pending)
+            _write_all(self._fd, data)
+            self.bytes_written += len(data)
+        _sync(self._fd)
+        self.commits += 1
+
+    async def flush(self) -> None:
+        await self.append([])
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        self._task = None
+        os.close(self._fd)
+        self._fd = None
+
+    def stats(self) -> Dict:
+        return {
+            "segment": self.segment,
+            "segment_bytes": self.segment_bytes,
+            "events": self.events,
+            "commits": self.commits,
+            "bytes_written": self.bytes_written,
+        }
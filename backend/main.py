@@ -1,31 +1,150 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, EmailStr, Field, ValidationError
+from pydantic.networks import validate_email
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Dict, Any
 import uuid
+import base64
 import hashlib
+import hmac
+import math
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 import os
 from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
 import asyncio
 import json
-from supabase import create_client, Client
+import time
+from contextlib import asynccontextmanager
+from notifications import NotificationDispatcher
+from storage import SQLiteStorage, Storage, StorageError, create_storage
+from changes import parcel_patch, snapshot
+from changefeed import ChangeFeed, Lease
+from cache import TTLCache
+from pubsub import CLOSED, EVICTED, TrackingHub
+from simulation import MovementSimulator
+from ingest import RowTooLarge, iter_csv_rows, iter_ndjson_rows
+from routing import ROAD_FACTOR, RoutingEngine, haversine_km, load_routing_engine, route_length_km
+from geocoder import Geocoder
+from pricing import PricingEngine, volume_cm3
+from search import SearchIndex
+from stats import DashboardStats
+from geo import SpatialIndex
+from export import FORMATS, export_contacts, export_parcels, gzip_stream
+from metrics import MetricsMiddleware, MetricsRegistry
+from profiler import SamplingProfiler
+from ids import TrackingIdGenerator
+from ratelimit import AdmissionController, AdmissionMiddleware, LoginGuard, RateLimiter, RateRule, client_ip, parse_rate
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers on startup and drain them on shutdown"""
+    # Data files are read in a thread while storage opens
+    engines = asyncio.create_task(asyncio.to_thread(load_engines))
+    await storage.start()
+    await load_settings()
+    await engines
+    if change_feed is not None:
+        await change_feed.start(apply_shared_changes)
+    await tracking_hub.start()
+    if ENABLE_EMAIL:
+        await notifier.start()
+    # Requests are served from here on; derived state and the simulation load
+    # in the background and /api/ready turns 200 once the rebuild is done
+    tasks = [asyncio.create_task(warm_up())]
+    if ENABLE_SIMULATION:
+        tasks.append(asyncio.create_task(run_simulation()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await simulator.stop()
+    if simulation_lease is not None:
+        simulation_lease.release()
+    await tracking_hub.stop()
+    await notifier.stop()
+    if change_feed is not None:
+        await change_feed.stop()
+    await storage.close()
+    profiler.stop()
+    if geocoder is not None:
+        geocoder.close()
+
 app = FastAPI(
     title="Swiftify Logistics API",
     description="Backend API for Swiftify logistics and parcel tracking platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Prometheus metrics served at /api/metrics; METRICS_TOKEN requires it as a bearer token
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+metrics = MetricsRegistry()
+http_requests = metrics.counter("http_requests_total", "HTTP requests by method, route and status", ("method", "route", "status"))
+http_duration = metrics.histogram("http_request_duration_seconds", "HTTP request latency by method and route", ("method", "route"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being served")
+db_duration = metrics.histogram("database_call_duration_seconds", "Storage helper latency by helper and collection", ("function", "collection"))
+email_duration = metrics.histogram("email_batch_duration_seconds", "SMTP time per batch of outgoing emails")
+route_duration = metrics.histogram("route_creation_duration_seconds", "Time to build a parcel route")
+storage_records = metrics.gauge("storage_records", "Records held by the storage backend", ("collection",))
+profiler = SamplingProfiler()
+
+if METRICS_ENABLED:
+    # Innermost, so it sees the matched route and only admitted requests
+    app.add_middleware(MetricsMiddleware, requests=http_requests, duration=http_duration, in_flight=http_in_flight)
+
+# Per-client rate limits for public endpoints, then a cap on concurrent requests
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_RULES = [
+    ("track", "GET", "/api/track/", os.getenv("RATE_LIMIT_TRACK", "120/minute")),
+    ("schedule", "POST", "/api/schedule", os.getenv("RATE_LIMIT_SCHEDULE", "10/minute")),
+    ("contact", "POST", "/api/contact", os.getenv("RATE_LIMIT_CONTACT", "5/minute")),
+    ("notifications", "POST", "/api/notifications/", os.getenv("RATE_LIMIT_NOTIFICATIONS", "10/minute")),
+    ("geocode", "GET", "/api/geocode", os.getenv("RATE_LIMIT_GEOCODE", "60/minute")),
+    ("quote_batch", "POST", "/api/quote/batch", os.getenv("RATE_LIMIT_QUOTE_BATCH", "10/minute")),
+]
+rate_limiter = RateLimiter(maxsize=int(os.getenv("RATE_LIMIT_CLIENTS", "100000")))
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "64")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "256")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "2"))
+)
+login_guard = LoginGuard(
+    max_failures=int(os.getenv("LOGIN_MAX_FAILURES", "5")),
+    window=float(os.getenv("LOGIN_FAILURE_WINDOW", "300")),
+    lockout=float(os.getenv("LOGIN_LOCKOUT", "900"))
+)
+
+def rate_rules() -> List[RateRule]:
+    rules = []
+    for name, method, path, spec in RATE_RULES:
+        limit = parse_rate(spec)
+        if limit is not None:
+            rules.append(RateRule(name, method, path, *limit))
+    return rules
+
+def admission_exempt(path: str) -> bool:
+    """Long-lived streams, health checks and metrics scrapes do not hold a concurrency slot"""
+    return path in ("/api/health", "/api/ready", "/api/metrics") or path.endswith("/stream") or path.startswith("/api/admin/export/")
+
+if RATE_LIMIT_ENABLED:
+    # Added before CORS so that rejections still carry CORS headers
+    app.add_middleware(
+        AdmissionMiddleware,
+        limiter=rate_limiter,
+        admission=admission if admission.max_concurrent > 0 else None,
+        rules=rate_rules(),
+        exempt=admission_exempt
+    )
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -40,34 +159,183 @@ security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "SwiftifyLogistics2025!@#$%^&*()_+SecureAdminKey789XYZ")
 # Read admin key from environment with proper fallback
 ADMIN_KEY = os.getenv("ADMIN_KEY", "SwiftifyAdmin2025!ComplexSecureKey#$%789XYZLogistics").strip().strip('"')
-print(f"DEBUG: Using ADMIN_KEY: '{ADMIN_KEY[:10]}...'")
 
 # Optional services configuration
 ENABLE_EMAIL = os.getenv("ENABLE_EMAIL_NOTIFICATIONS", "false").lower() == "true"
 ENABLE_SMS = os.getenv("ENABLE_SMS_NOTIFICATIONS", "false").lower() == "true"
 ENABLE_GOOGLE_MAPS = os.getenv("ENABLE_GOOGLE_MAPS", "false").lower() == "true"
+ENABLE_SIMULATION = os.getenv("ENABLE_SIMULATION", "true").lower() == "true"
+
+# Rows per storage write for bulk order uploads and batch updates
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BATCH_UPDATE_LIMIT = int(os.getenv("BATCH_UPDATE_LIMIT", "5000"))
+GEOCODE_BATCH_LIMIT = int(os.getenv("GEOCODE_BATCH_LIMIT", "5000"))
+QUOTE_BATCH_LIMIT = int(os.getenv("QUOTE_BATCH_LIMIT", "10000"))
+# Records read from storage per step of a streaming export
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Outgoing email is queued and sent by background workers
+notifier = NotificationDispatcher.from_env(observe_batch=email_duration.observe)
+
+# Parcel and contact storage: Supabase (PostgREST) when configured, in-memory otherwise
+storage: Storage = create_storage()
+print(f"Using {storage.name} storage")
+
+# Several worker processes (uvicorn --workers, WEB_CONCURRENCY) share storage through
+# SQLite or Supabase and keep each other's caches, indexes and streams in step through
+# a change feed in a local SQLite file; one of them at a time runs the simulation
+CHANGE_FEED_PATH = os.getenv("CHANGE_FEED_PATH") or (storage.path if isinstance(storage, SQLiteStorage) else None)
+change_feed: Optional[ChangeFeed] = None
+simulation_lease: Optional[Lease] = None
+if CHANGE_FEED_PATH:
+    change_feed = ChangeFeed(
+        CHANGE_FEED_PATH,
+        poll_interval=float(os.getenv("CHANGE_FEED_POLL_MS", "50")) / 1000,
+        retention=float(os.getenv("CHANGE_FEED_RETENTION", "300"))
+    )
+    simulation_lease = Lease(CHANGE_FEED_PATH + ".simulation.lock")
+elif int(os.getenv("WEB_CONCURRENCY", "1")) > 1 and not storage.persistent:
+    print(f"WARNING: {storage.name} storage is private to each worker; use STORAGE_BACKEND=sqlite to run several")
+
+# Tracking IDs: time-ordered, unique per shard. Workers sharing a change feed each
+# lease a shard through a lock file beside it, from TRACKING_SHARD_ID up
+tracking_shard_leases: List[Lease] = []
+
+def lease_tracking_shard(shard: int) -> bool:
+    lease = Lease(f"{CHANGE_FEED_PATH}.shard-{shard}.lock")
+    if not lease.try_acquire():
+        return False
+    tracking_shard_leases.append(lease)
+    return True
+
+tracking_ids = TrackingIdGenerator.from_env(lease_tracking_shard if CHANGE_FEED_PATH else None)
+print(f"Issuing tracking IDs for shard {tracking_ids.shard}")
+# Attempts at storing a new parcel whose ID turns out to be taken
+TRACKING_ID_ATTEMPTS = 3
+
+def share(topic: str, payload: Any) -> None:
+    """Pass a change on to the other worker processes, if there are any"""
+    if change_feed is not None:
+        change_feed.publish(topic, payload)
+
+# Serialized /api/track responses, invalidated whenever a parcel is written
+tracking_cache = TTLCache(
+    maxsize=int(os.getenv("TRACKING_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("TRACKING_CACHE_TTL", "30"))
+)
+
+# Admin search over parcels and the most recent contact messages, kept in step with every write
+SEARCH_MAX_CONTACTS = int(os.getenv("SEARCH_MAX_CONTACTS", "5000"))
+search_index = SearchIndex(max_contacts=SEARCH_MAX_CONTACTS)
+
+# Dashboard counts, revenue and stage timings, updated on every parcel write
+dashboard_stats = DashboardStats()
+
+# Current parcel positions on a grid, for nearby and map viewport queries
+GEO_CELL_DEGREES = float(os.getenv("GEO_CELL_DEGREES", "0.1"))
+spatial_index = SpatialIndex(GEO_CELL_DEGREES)
+
+# Live tracking subscribers (WebSocket and SSE), one topic per parcel
+tracking_hub = TrackingHub(
+    queue_size=int(os.getenv("STREAM_QUEUE_SIZE", "32")),
+    heartbeat_interval=float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15")),
+    max_subscribers=int(os.getenv("STREAM_MAX_SUBSCRIBERS", "20000"))
+)
+
+async def publish_simulated_moves(ids: List[str], positions: List[Dict], progress: List[float], updated_at: str) -> None:
+    """Invalidate and push the positions written by a simulation tick, here and in other workers"""
+    apply_moves(ids, positions, progress, updated_at)
+    share("positions", {"ids": ids, "positions": positions, "progress": progress, "updatedAt": updated_at})
 
-# Supabase configuration (optional)
-supabase_url = os.getenv("SUPABASE_URL")
-supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase: Optional[Client] = None
+def apply_moves(ids: List[str], positions: List[Dict], progress: List[float], updated_at: str) -> None:
+    spatial_index.move(ids, positions)
+    if rebuild_backlog is not None:
+        # Parcels the rebuild has already scanned would keep their old position
+        rebuild_backlog["spatial"].move(ids, positions)
+    for tracking_id, position, pct in zip(ids, positions, progress):
+        tracking_cache.invalidate(tracking_id)
+        if tracking_hub.has_subscribers(tracking_id):
+            tracking_hub.publish(tracking_id, {
+                "type": "update",
+                "id": tracking_id,
+                "currentPosition": position,
+                "progress": pct,
+                "updatedAt": updated_at
+            })
 
-if supabase_url and supabase_key:
+async def run_simulation() -> None:
+    """Load and start the simulation; with shared storage, once this worker holds the lease"""
+    if simulation_lease is not None:
+        while not simulation_lease.try_acquire():
+            await asyncio.sleep(simulator.interval)
+        print(f"Simulation lease acquired by worker {os.getpid()}")
+    await simulator.load()
+    await simulator.start()
+
+ROUTING_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Offline hub/road graph used to route new parcels
+routing_engine: Optional[RoutingEngine] = None
+# Local gazetteer for address -> coordinates, with results persisted across restarts
+geocoder: Optional[Geocoder] = None
+# Rate card compiled into lookup tables; shared by order creation and quotes
+pricing: PricingEngine
+# Moves in-transit parcels in auto mode along their routes
+simulator: MovementSimulator
+
+def load_engines() -> None:
+    """Build the routing, geocoding, pricing and simulation engines.
+
+    Runs in the lifespan rather than at import, so importing this module
+    reads no data files; nothing is served before it has finished.
+    """
+    global routing_engine, geocoder, pricing, simulator
     try:
-        supabase = create_client(supabase_url, supabase_key)
-        print("Supabase connected successfully")
-    except Exception as e:
-        print(f"Supabase connection failed: {e}")
-        supabase = None
+        routing_engine = load_routing_engine(
+            os.getenv("ROUTING_GRAPH", os.path.join(ROUTING_DATA_DIR, "hubs.csv")),
+            os.getenv("ROUTING_ROADS", os.path.join(ROUTING_DATA_DIR, "roads.csv")),
+            cache_size=int(os.getenv("ROUTING_CACHE_SIZE", "4096"))
+        )
+        print(f"Routing graph loaded: {len(routing_engine.hubs)} hubs")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Routing graph unavailable, using default route: {e}")
+        routing_engine = None
 
-# In-memory storage (replace with database in production)
-parcels_db: Dict[str, Dict] = {}
-contact_messages: List[Dict] = []
+    try:
+        geocoder = Geocoder.from_csv(
+            os.getenv("GEOCODER_PLACES", os.path.join(ROUTING_DATA_DIR, "places.csv")),
+            cache_path=os.getenv("GEOCODER_CACHE_PATH", os.path.join(ROUTING_DATA_DIR, "geocode_cache.jsonl")) or None,
+            cache_size=int(os.getenv("GEOCODER_CACHE_SIZE", "100000")),
+            miss_ttl=float(os.getenv("GEOCODER_MISS_TTL", "300"))
+        )
+        print(f"Gazetteer loaded: {len(geocoder.places)} places")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Gazetteer unavailable, geocoding disabled: {e}")
+        geocoder = None
+
+    pricing = PricingEngine.from_file(os.getenv("PRICING_RATE_CARD", os.path.join(ROUTING_DATA_DIR, "rate_card.json")))
+    simulator = MovementSimulator(
+        storage,
+        interval=float(os.getenv("SIMULATION_INTERVAL", "10")),
+        speed_kmh=float(os.getenv("SIMULATION_SPEED_KMH", "80")),
+        time_scale=float(os.getenv("SIMULATION_TIME_SCALE", "60")),
+        on_tick=publish_simulated_moves
+    )
 
 # Pydantic models
+@lru_cache(maxsize=65536)
+def _validate_email_cached(value: str) -> str:
+    return validate_email(value)[1]
+
+class CachedEmailStr(EmailStr):
+    """EmailStr with memoized validation; bulk uploads repeat the same addresses a lot"""
+    @classmethod
+    def _validate(cls, input_value: str, /) -> str:
+        return _validate_email_cached(input_value)
+
 class Address(BaseModel):
     name: str
-    email: EmailStr
+    email: CachedEmailStr
     phone: str
     address: str
 
@@ -95,6 +363,9 @@ class RoutePoint(BaseModel):
     lng: float
     label: Optional[str] = None
 
+class RouteUpdateRequest(BaseModel):
+    route: List[RoutePoint] = Field(..., min_length=2)
+
 class TrackingResponse(BaseModel):
     id: str
     sender: Address
@@ -115,52 +386,54 @@ class AdminLoginRequest(BaseModel):
 
 class ContactRequest(BaseModel):
     name: str
-    email: EmailStr
+    email: CachedEmailStr
     message: str
 
+CONTACT_STATUSES = ("new", "read", "archived")
+CONTACT_STATUS_PATTERN = "^(new|read|archived)$"
+
+class ContactStatusUpdate(BaseModel):
+    status: str = Field(..., pattern=CONTACT_STATUS_PATTERN)
+    ids: Optional[List[str]] = Field(None, max_length=1000)
+    currentStatus: Optional[str] = Field(None, pattern=CONTACT_STATUS_PATTERN)
+    before: Optional[str] = None
+
 class ParcelUpdateRequest(BaseModel):
     status: Optional[str] = None
     mode: Optional[str] = None
     notes: Optional[str] = None
     currentPosition: Optional[RoutePoint] = None
 
+class ParcelBatchUpdateItem(ParcelUpdateRequest):
+    trackingId: str
+
+class ParcelBatchUpdateRequest(BaseModel):
+    updates: List[ParcelBatchUpdateItem]
+
+class GeocodeBatchRequest(BaseModel):
+    addresses: List[str]
+
+class QuoteItem(BaseModel):
+    weight: str
+    dimensions: Dict[str, float] = {}
+    value: float = 0
+    origin: Optional[str] = None
+    destination: Optional[str] = None
+    distanceKm: Optional[float] = None
+
+class QuoteBatchRequest(BaseModel):
+    items: List[QuoteItem]
+
 # Helper functions
 def generate_tracking_id() -> str:
-    """Generate a unique tracking ID"""
-    timestamp = str(int(datetime.utcnow().timestamp()))[-6:]
-    random_part = str(uuid.uuid4()).replace('-', '')[:6].upper()
-    return f"SWIFT-{timestamp}{random_part}"
+    """Generate a unique, time-ordered tracking ID"""
+    return tracking_ids.next_id()
 
 def send_email_notification(to_email: str, subject: str, body: str) -> bool:
-    """Send email notification if SMTP is configured"""
+    """Queue an email notification if SMTP is configured"""
     if not ENABLE_EMAIL:
         return False
-        
-    try:
-        smtp_host = os.getenv("SMTP_HOST")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_password = os.getenv("SMTP_PASSWORD")
-        
-        if not all([smtp_host, smtp_user, smtp_password]):
-            return False
-            
-        msg = MIMEMultipart()
-        msg['From'] = smtp_user
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'html'))
-        
-        server = smtplib.SMTP(smtp_host, smtp_port)
-        server.starttls()
-        server.login(smtp_user, smtp_password)
-        server.send_message(msg)
-        server.quit()
-        
-        return True
-    except Exception as e:
-        print(f"Email notification failed: {e}")
-        return False
+    return notifier.enqueue(to_email, subject, body)
 
 def send_sms_notification(to_phone: str, message: str) -> bool:
     """Send SMS notification via Twilio if configured"""
@@ -183,52 +456,355 @@ def send_sms_notification(to_phone: str, message: str) -> bool:
         print(f"SMS notification failed: {e}")
         return False
 
+async def insert_new_parcels(parcels: List[Dict]) -> None:
+    """Store newly built parcels, never replacing a stored one
+
+    A taken ID means two processes issued from the same shard; the parcel
+    gets a fresh ID and is stored again.
+    """
+    pending = parcels
+    for _ in range(TRACKING_ID_ATTEMPTS):
+        taken = set(await storage.insert_parcels(pending))
+        if not taken:
+            return
+        print(f"Tracking IDs already taken, reissuing: {sorted(taken)}; is TRACKING_SHARD_ID shared?")
+        pending = [parcel for parcel in pending if parcel["id"] in taken]
+        for parcel in pending:
+            parcel["id"] = generate_tracking_id()
+    raise StorageError(f"{len(pending)} parcels found their tracking IDs taken {TRACKING_ID_ATTEMPTS} times")
+
 async def save_to_database(collection: str, data: Dict) -> bool:
-    """Save data to Supabase if available, otherwise use in-memory storage"""
-    try:
-        if supabase:
-            result = supabase.table(collection).insert(data).execute()
-            return True
-        else:
-            # Fallback to in-memory storage
+    """Save a new parcel or contact message to the configured storage"""
+    with db_duration.labels("save_to_database", collection).time():
+        try:
             if collection == "parcels":
-                parcels_db[data["id"]] = data
+                await insert_new_parcels([data])
+                search_index.add_parcel(data)
+                spatial_index.add_parcel(data)
+                dashboard_stats.record(data)
+                note_written([data["id"]])
+                share("parcels", [data["id"]])
             elif collection == "contact_messages":
-                contact_messages.append(data)
+                await storage.add_contact(data)
+                search_index.add_contact(data)
+                note_written(contacts=[data])
+                share("contact", data)
+            else:
+                return False
             return True
-    except Exception as e:
-        print(f"Database save failed: {e}")
-        # Always fallback to in-memory
-        if collection == "parcels":
-            parcels_db[data["id"]] = data
-        elif collection == "contact_messages":
-            contact_messages.append(data)
-        return True
+        except StorageError as e:
+            print(f"Database save failed: {e}")
+            return False
 
-async def get_from_database(collection: str, id: str = None) -> Optional[Dict]:
-    """Get data from Supabase if available, otherwise use in-memory storage"""
+async def save_parcels_to_database(parcels: List[Dict]) -> bool:
+    """Save a batch of new parcels in chunked multi-row writes"""
+    with db_duration.labels("save_parcels_to_database", "parcels").time():
+        try:
+            await insert_new_parcels(parcels)
+            search_index.add_parcels(parcels)
+            spatial_index.add_parcels(parcels)
+            dashboard_stats.record_many(parcels)
+            note_written([parcel["id"] for parcel in parcels])
+            share("parcels", [parcel["id"] for parcel in parcels])
+            return True
+        except StorageError as e:
+            print(f"Database save failed: {e}")
+            return False
+
+async def save_parcel_updates(parcels: List[Dict], befores: Dict[str, Dict]) -> bool:
+    """Save changes to stored parcels, writing only what changed since each was read"""
+    with db_duration.labels("save_parcel_updates", "parcels").time():
+        changed, patches = [], []
+        for parcel in parcels:
+            patch = parcel_patch(befores[parcel["id"]], parcel)
+            if patch is not None:
+                changed.append(parcel)
+                patches.append(patch)
+        try:
+            await storage.update_parcels(changed, patches)
+            search_index.add_parcels(changed)
+            spatial_index.add_parcels(changed)
+            dashboard_stats.record_many(changed)
+            note_written([parcel["id"] for parcel in changed])
+            share("parcels", [parcel["id"] for parcel in changed])
+            return True
+        except StorageError as e:
+            print(f"Database save failed: {e}")
+            return False
+
+async def scan_storage(
+    index: Optional[SearchIndex],
+    stats: Optional[DashboardStats],
+    spatial: Optional[SpatialIndex] = None,
+    page_size: int = 1000
+) -> None:
+    """Feed every stored parcel (and the most recent contact messages) into fresh derived state"""
+    async for page in storage.iter_parcels(page_size):
+        if index is not None:
+            index.add_parcels(page)
+        if spatial is not None:
+            spatial.add_parcels(page)
+        if stats is not None:
+            stats.record_many(page)
+    if index is not None:
+        recent = await storage.query_contacts(descending=True, limit=SEARCH_MAX_CONTACTS)
+        for message in reversed(recent):
+            index.add_contact(message)
+    if stats is not None:
+        stats.rebuilt_at = datetime.utcnow().isoformat()
+
+# Parcels and contact messages written while the derived state is being rebuilt
+rebuild_backlog: Optional[Dict[str, Any]] = None
+
+# Set once the startup rebuild has finished; search and dashboard totals are incomplete before
+ready = False
+warm_up_seconds: Optional[float] = None
+
+def note_written(parcel_ids: List[str] = (), contacts: List[Dict] = ()) -> None:
+    """Remember writes that a running rebuild may have scanned past"""
+    if rebuild_backlog is not None:
+        rebuild_backlog["parcels"].update(parcel_ids)
+        rebuild_backlog["contacts"].extend(contacts)
+
+async def rebuild_derived_state() -> None:
+    """Rebuild the search index and dashboard aggregates in one pass, e.g. on startup
+
+    Requests are served during the scan. Parcels written meanwhile are read
+    again at the end, so the new state has their latest version.
+    """
+    global search_index, dashboard_stats, spatial_index, rebuild_backlog
+    index, stats = SearchIndex(max_contacts=SEARCH_MAX_CONTACTS), DashboardStats()
+    spatial = SpatialIndex(GEO_CELL_DEGREES)
+    rebuild_backlog = {"parcels": set(), "contacts": [], "spatial": spatial}
     try:
-        if supabase and id:
-            result = supabase.table(collection).select("*").eq("id", id).execute()
-            return result.data[0] if result.data else None
-        elif supabase:
-            result = supabase.table(collection).select("*").execute()
-            return result.data
-        else:
-            # Fallback to in-memory storage
+        await scan_storage(index, stats, spatial)
+        while rebuild_backlog["parcels"]:
+            ids = list(rebuild_backlog["parcels"])
+            rebuild_backlog["parcels"].clear()
+            parcels = await storage.get_parcels(ids)
+            for tracking_id in ids:
+                if tracking_id in parcels:
+                    index.add_parcel(parcels[tracking_id])
+                    spatial.add_parcel(parcels[tracking_id])
+                    stats.record(parcels[tracking_id])
+                else:
+                    index.remove("parcel", tracking_id)
+                    spatial.remove(tracking_id)
+                    stats.remove(tracking_id)
+        for message in rebuild_backlog["contacts"]:
+            index.add_contact(message)
+    except StorageError as e:
+        print(f"Rebuild from storage failed: {e}")
+        return
+    finally:
+        rebuild_backlog = None
+    search_index, dashboard_stats, spatial_index = index, stats, spatial
+
+async def warm_up() -> None:
+    """Startup work that runs while requests are already being served"""
+    global ready, warm_up_seconds
+    started = time.perf_counter()
+    await rebuild_derived_state()
+    warm_up_seconds = round(time.perf_counter() - started, 3)
+    ready = True
+    print(f"Ready: derived state rebuilt in {warm_up_seconds}s")
+
+def require_ready() -> None:
+    if not ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Starting up",
+            headers={"Retry-After": "5"}
+        )
+
+async def get_from_database(collection: str, id: str = None) -> Optional[Any]:
+    """Get one parcel by id, or all records of a collection, from the configured storage"""
+    with db_duration.labels("get_from_database", collection).time():
+        try:
             if collection == "parcels":
-                return parcels_db.get(id) if id else list(parcels_db.values())
+                return await storage.get_parcel(id) if id else await storage.list_parcels()
             elif collection == "contact_messages":
-                return contact_messages
+                return await storage.list_contacts()
             return None
-    except Exception as e:
+        except StorageError as e:
+            print(f"Database get failed: {e}")
+            return None
+
+def build_parcel(request: ScheduleRequest) -> Dict:
+    """Create a new pending parcel record for a validated schedule request"""
+    tracking_id = generate_tracking_id()
+    origin = geocode(request.sender.address)
+    destination = geocode(request.receiver.address)
+    route = create_route(request.sender.address, request.receiver.address, origin, destination)
+    details = request.parcelDetails
+    quote = pricing.quote(
+        details.weight,
+        details.dimensions,
+        details.value,
+        route_length_km(route) if origin and destination else 0.0
+    )
+    now = datetime.utcnow()
+    return {
+        "id": tracking_id,
+        "sender": request.sender.dict(),
+        "receiver": request.receiver.dict(),
+        "parcelDetails": request.parcelDetails.dict(),
+        "status": "pending",
+        "mode": "auto",
+        "history": [
+            {
+                "status": "Package scheduled",
+                "timestamp": now.isoformat(),
+                "location": origin["label"] if origin else request.sender.address.split(",")[0],
+                "notes": "Package scheduled for pickup"
+            }
+        ],
+        "route": route,
+        "currentPosition": dict(route[0]) if route else None,
+        "eta": (now + timedelta(days=2)).isoformat(),
+        "createdAt": now.isoformat(),
+        "estimatedCost": quote["total"],
+        "progress": 0
+    }
+
+# Progress shown for each parcel status
+STATUS_PROGRESS = {
+    "pending": 0,
+    "picked-up": 20,
+    "in-transit": 60,
+    "at-hub": 80,
+    "out-for-delivery": 90,
+    "delivered": 100
+}
+
+def apply_parcel_update(parcel: Dict, updates: ParcelUpdateRequest, now: str) -> Dict:
+    """Apply an admin update to a parcel in place; returns the delta for live subscribers"""
+    delta = {"type": "update", "id": parcel["id"], "updatedAt": now}
+    if updates.currentPosition:
+        parcel["currentPosition"] = updates.currentPosition.dict()
+        delta["currentPosition"] = parcel["currentPosition"]
+    
+    if updates.status:
+        parcel["status"] = updates.status
+        # Add to history
+        parcel["history"].append({
+            "status": updates.status,
+            "timestamp": now,
+            "location": parcel["currentPosition"]["label"] if parcel.get("currentPosition") else "Unknown",
+            "notes": updates.notes or f"Status updated to {updates.status}"
+        })
+        parcel["progress"] = STATUS_PROGRESS.get(updates.status, parcel["progress"])
+        delta.update(status=parcel["status"], progress=parcel["progress"], historyEntry=parcel["history"][-1])
+    
+    if updates.mode:
+        parcel["mode"] = updates.mode
+        delta["mode"] = parcel["mode"]
+    
+    parcel["updatedAt"] = now
+    return delta
+
+def publish_parcel_update(parcel: Dict, delta: Dict) -> None:
+    """Propagate a saved parcel update to the cache, simulator and live subscribers"""
+    tracking_cache.invalidate(parcel["id"])
+    simulator.track(parcel)
+    notify_subscribers(parcel["id"], delta)
+
+def notify_subscribers(tracking_id: str, message: Dict) -> None:
+    """Push a message to the parcel's live subscribers in every worker"""
+    tracking_hub.publish(tracking_id, message)
+    share("stream", {"id": tracking_id, "message": message})
+
+def forget_parcel(tracking_id: str) -> None:
+    """Drop a deleted parcel from the cache, simulator, derived state and live streams"""
+    tracking_cache.invalidate(tracking_id)
+    tracking_hub.publish(tracking_id, {"type": "deleted", "id": tracking_id})
+    tracking_hub.close_topic(tracking_id)
+    simulator.forget(tracking_id)
+    search_index.remove("parcel", tracking_id)
+    spatial_index.remove(tracking_id)
+    dashboard_stats.remove(tracking_id)
+    note_written([tracking_id])
+
+async def apply_shared_changes(events: List[tuple]) -> None:
+    """Bring this worker's caches, derived state and streams up to date with other workers' writes"""
+    saved = {tracking_id for topic, payload in events if topic == "parcels" for tracking_id in payload}
+    try:
+        parcels = await storage.get_parcels(list(saved)) if saved else {}
+    except StorageError as e:
         print(f"Database get failed: {e}")
-        # Always fallback to in-memory
-        if collection == "parcels":
-            return parcels_db.get(id) if id else list(parcels_db.values())
-        elif collection == "contact_messages":
-            return contact_messages
-        return None
+        parcels = {}
+    for topic, payload in events:
+        if topic == "parcels":
+            changed = [parcels[tracking_id] for tracking_id in payload if tracking_id in parcels]
+            for tracking_id in payload:
+                tracking_cache.invalidate(tracking_id)
+            search_index.add_parcels(changed)
+            spatial_index.add_parcels(changed)
+            dashboard_stats.record_many(changed)
+            note_written(payload)
+            for parcel in changed:
+                simulator.track(parcel)
+        elif topic == "stream":
+            tracking_hub.publish(payload["id"], payload["message"])
+        elif topic == "positions":
+            apply_moves(payload["ids"], payload["positions"], payload["progress"], payload["updatedAt"])
+        elif topic == "deleted":
+            forget_parcel(payload)
+        elif topic == "contact":
+            search_index.add_contact(payload)
+            note_written(contacts=[payload])
+        elif topic == "settings":
+            settings_store.update(payload)
+
+def build_tracking_entry(parcel: Dict) -> Dict[str, Any]:
+    """Serialize a parcel once, with the validators used for conditional GETs"""
+    body = json.dumps(parcel, ensure_ascii=False, separators=(",", ":")).encode()
+    modified = datetime.fromisoformat(parcel.get("updatedAt") or parcel["createdAt"])
+    return {
+        "body": body,
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "last_modified": format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+    }
+
+async def get_tracking_entry(tracking_id: str) -> Optional[Dict[str, Any]]:
+    """Serialized tracking response for a parcel, read through the cache"""
+    entry = tracking_cache.get(tracking_id)
+    if entry is None:
+        # A write landing during the read invalidates the key, and the entry is then not cached
+        generation = tracking_cache.generation(tracking_id)
+        parcel = await get_from_database("parcels", tracking_id)
+        if not parcel:
+            return None
+        entry = build_tracking_entry(parcel)
+        tracking_cache.set(tracking_id, entry, generation)
+    return entry
+
+def snapshot_message(entry: Dict[str, Any]) -> str:
+    """First message of a live tracking stream: the full parcel"""
+    return '{"type":"snapshot","parcel":' + entry["body"].decode() + "}"
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags
+
+def encode_cursor(record: Dict, field: str = "createdAt") -> str:
+    """Encode the (field, id) keyset position of a record as an opaque cursor"""
+    raw = json.dumps([record.get(field) or "", record["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, parcel_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(created_at), str(parcel_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
 
 def create_jwt_token(data: dict) -> str:
     """Create JWT token"""
@@ -253,35 +829,56 @@ def verify_jwt_token(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Invalid token"
         )
 
-def create_demo_route(sender_address: str, receiver_address: str) -> List[RoutePoint]:
-    """Create a demo route between two addresses"""
-    # In a real implementation, you'd use Google Maps API or similar
-    demo_routes = {
-        "san_francisco_to_los_angeles": [
-            RoutePoint(lat=37.7749, lng=-122.4194, label="San Francisco, CA"),
-            RoutePoint(lat=37.3382, lng=-121.8863, label="San Jose, CA"),
-            RoutePoint(lat=36.7783, lng=-119.4179, label="Fresno, CA"),
-            RoutePoint(lat=35.3733, lng=-119.0187, label="Bakersfield, CA"),
-            RoutePoint(lat=34.0522, lng=-118.2437, label="Los Angeles, CA")
-        ],
-        "seattle_to_portland": [
-            RoutePoint(lat=47.6062, lng=-122.3321, label="Seattle, WA"),
-            RoutePoint(lat=46.7296, lng=-122.4886, label="Centralia, WA"),
-            RoutePoint(lat=45.5152, lng=-122.6784, label="Portland, OR")
-        ],
-        "default": [
-            RoutePoint(lat=37.7749, lng=-122.4194, label="Origin"),
-            RoutePoint(lat=34.0522, lng=-118.2437, label="Destination")
-        ]
-    }
-    
-    # Simple logic to determine route based on addresses
-    if "san francisco" in sender_address.lower() and "los angeles" in receiver_address.lower():
-        return demo_routes["san_francisco_to_los_angeles"]
-    elif "seattle" in sender_address.lower() and "portland" in receiver_address.lower():
-        return demo_routes["seattle_to_portland"]
-    else:
-        return demo_routes["default"]
+# Used when an address cannot be matched to a hub
+DEFAULT_ROUTE = (
+    {"lat": 37.7749, "lng": -122.4194, "label": "Origin"},
+    {"lat": 34.0522, "lng": -118.2437, "label": "Destination"}
+)
+
+def geocode(address: str) -> Optional[Dict]:
+    """Resolve an address with the local gazetteer, if one is loaded"""
+    return geocoder.geocode(address) if geocoder is not None else None
+
+def create_route(
+    sender_address: str,
+    receiver_address: str,
+    origin: Optional[Dict] = None,
+    destination: Optional[Dict] = None
+) -> List[Dict]:
+    """Route between two addresses over the hub graph, from geocoded coordinates when available"""
+    with route_duration.time():
+        route = None
+        if routing_engine is not None:
+            if origin and destination:
+                route = routing_engine.route_between_points(
+                    (origin["lat"], origin["lng"]),
+                    (destination["lat"], destination["lng"]),
+                    origin["label"],
+                    destination["label"]
+                )
+            else:
+                route = routing_engine.route_between_addresses(sender_address, receiver_address)
+        if route is None:
+            route = [dict(point) for point in DEFAULT_ROUTE]
+        return route
+
+@lru_cache(maxsize=16384)
+def lane_distance_km(origin_lat: float, origin_lng: float, destination_lat: float, destination_lng: float) -> float:
+    """Routed distance between two geocoded points"""
+    route = None
+    if routing_engine is not None:
+        route = routing_engine.route_between_points((origin_lat, origin_lng), (destination_lat, destination_lng))
+    if route is None:
+        return haversine_km(origin_lat, origin_lng, destination_lat, destination_lng) * ROAD_FACTOR
+    return route_length_km(route)
+
+def address_distance_km(origin_address: str, destination_address: str) -> Optional[float]:
+    """Routed distance between two addresses, or None if either cannot be geocoded"""
+    origin = geocode(origin_address)
+    destination = geocode(destination_address)
+    if origin is None or destination is None:
+        return None
+    return lane_distance_km(origin["lat"], origin["lng"], destination["lat"], destination["lng"])
 
 # API Routes
 
@@ -298,50 +895,13 @@ async def root():
 async def schedule_delivery(request: ScheduleRequest):
     """Schedule a new delivery"""
     try:
-        tracking_id = generate_tracking_id()
-        
-        # Create route
-        route = create_demo_route(request.sender.address, request.receiver.address)
+        parcel = build_parcel(request)
+        estimated_cost = parcel["estimatedCost"]
         
-        # Calculate estimated cost (demo logic)
-        base_cost = 15.0
-        weight_multiplier = {
-            "<1kg": 1.0,
-            "1-5kg": 1.2,
-            "5-10kg": 1.5,
-            "10-20kg": 2.0,
-            "20kg+": 2.5
-        }
-        estimated_cost = base_cost * weight_multiplier.get(request.parcelDetails.weight, 1.0)
-        
-        # Create parcel record
-        parcel = {
-            "id": tracking_id,
-            "sender": request.sender.dict(),
-            "receiver": request.receiver.dict(),
-            "parcelDetails": request.parcelDetails.dict(),
-            "status": "pending",
-            "mode": "auto",
-            "history": [
-                {
-                    "status": "Package scheduled",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "location": request.sender.address.split(",")[0],
-                    "notes": "Package scheduled for pickup"
-                }
-            ],
-            "route": [point.dict() for point in route],
-            "currentPosition": route[0].dict() if route else None,
-            "eta": (datetime.utcnow() + timedelta(days=2)).isoformat(),
-            "createdAt": datetime.utcnow().isoformat(),
-            "estimatedCost": round(estimated_cost, 2),
-            "progress": 0
-        }
-        
-        parcels_db[tracking_id] = parcel
-        
-        # Save to database
-        await save_to_database("parcels", parcel)
+        # Save to database; the ID is final once saved
+        if not await save_to_database("parcels", parcel):
+            raise StorageError("parcel could not be saved")
+        tracking_id = parcel["id"]
         
         # Send confirmation email if enabled
         if ENABLE_EMAIL:
@@ -366,8 +926,6 @@ async def schedule_delivery(request: ScheduleRequest):
 
 # New admin-only endpoints
 
-from fastapi import Request
-
 @app.post("/api/admin/orders")
 async def admin_create_order(request: Request, payload: dict = Depends(verify_jwt_token)):
     """Admin creates a new order"""
@@ -375,70 +933,138 @@ async def admin_create_order(request: Request, payload: dict = Depends(verify_jw
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     data = await request.json()
     try:
-        schedule_request = ScheduleRequest(**data)
-        tracking_id = generate_tracking_id()
-        route = create_demo_route(schedule_request.sender.address, schedule_request.receiver.address)
-        base_cost = 15.0
-        weight_multiplier = {
-            "<1kg": 1.0,
-            "1-5kg": 1.2,
-            "5-10kg": 1.5,
-            "10-20kg": 2.0,
-            "20kg+": 2.5
-        }
-        estimated_cost = base_cost * weight_multiplier.get(schedule_request.parcelDetails.weight, 1.0)
-        parcel = {
-            "id": tracking_id,
-            "sender": schedule_request.sender.dict(),
-            "receiver": schedule_request.receiver.dict(),
-            "parcelDetails": schedule_request.parcelDetails.dict(),
-            "status": "pending",
-            "mode": "auto",
-            "history": [
-                {
-                    "status": "Package scheduled",
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "location": schedule_request.sender.address.split(",")[0],
-                    "notes": "Package scheduled for pickup"
-                }
-            ],
-            "route": [point.dict() for point in route],
-            "currentPosition": route[0].dict() if route else None,
-            "eta": (datetime.utcnow() + timedelta(days=2)).isoformat(),
-            "createdAt": datetime.utcnow().isoformat(),
-            "estimatedCost": round(estimated_cost, 2),
-            "progress": 0
-        }
-        parcels_db[tracking_id] = parcel
-        await save_to_database("parcels", parcel)
-        return {"trackingId": tracking_id}
+        parcel = build_parcel(ScheduleRequest(**data))
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid data: {str(e)}")
+    if not await save_to_database("parcels", parcel):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to save order")
+    return {"trackingId": parcel["id"]}
+
+class UploadStreamingResponse(StreamingResponse):
+    """A streamed response whose generator is still reading the request body
+
+    StreamingResponse watches for a disconnect by reading from the request
+    channel, which would take body chunks away from the generator. Here the
+    generator's own reads notice a disconnect instead.
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+@app.post("/api/admin/orders/bulk")
+async def admin_bulk_create_orders(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Admin creates many orders from an NDJSON or CSV upload
+
+    The body is parsed and validated as it arrives and valid rows are saved in
+    chunks of BULK_CHUNK_SIZE. The response is NDJSON with one result per
+    input row (`trackingId` or `error`), streamed as each chunk is saved, and
+    a summary line at the end. CSV uploads use the flat columns listed in
+    `ingest.CSV_COLUMNS`.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    rows = iter_csv_rows(request.stream()) if format == "csv" else iter_ndjson_rows(request.stream())
+    # Read the first row before answering, so that an oversized one is still a 413
+    try:
+        first = await rows.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except RowTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    
+    async def results() -> AsyncIterator[bytes]:
+        summary = {"rows": 0, "created": 0, "failed": 0}
+        pending: List[tuple] = []
+        
+        async def flush() -> bytes:
+            parcels = [parcel for _, parcel, _ in pending if parcel is not None]
+            saved = await save_parcels_to_database(parcels) if parcels else True
+            lines = []
+            for row, parcel, error in pending:
+                if parcel is not None and saved:
+                    lines.append({"row": row, "trackingId": parcel["id"]})
+                    summary["created"] += 1
+                else:
+                    lines.append({"row": row, "error": error or "Failed to save order"})
+                    summary["failed"] += 1
+            pending.clear()
+            return "".join(json.dumps(line) + "\n" for line in lines).encode()
+        
+        async def remaining() -> AsyncIterator[tuple]:
+            if first is not None:
+                yield first
+                async for item in rows:
+                    yield item
+        
+        try:
+            async for row, data, error in remaining():
+                summary["rows"] += 1
+                parcel = None
+                if error is None:
+                    try:
+                        parcel = build_parcel(ScheduleRequest(**data))
+                    except ValidationError as e:
+                        error = "; ".join(
+                            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in e.errors()
+                        )
+                    except Exception as e:
+                        # One bad row (geocoding, pricing, ...) must not lose the rest of the upload
+                        print(f"Bulk order row {row} failed: {e}")
+                        error = "Failed to create order"
+                pending.append((row, parcel, error))
+                if len(pending) >= BULK_CHUNK_SIZE:
+                    yield await flush()
+        except RowTooLarge as e:
+            # The response has started; report it in the stream and stop reading
+            if pending:
+                yield await flush()
+            yield (json.dumps({"error": str(e), "summary": summary}) + "\n").encode()
+            return
+        if pending:
+            yield await flush()
+        yield (json.dumps({"summary": summary}) + "\n").encode()
+    
+    return UploadStreamingResponse(results(), media_type="application/x-ndjson")
 
 @app.delete("/api/admin/parcel/{tracking_id}")
 async def admin_delete_parcel(tracking_id: str, payload: dict = Depends(verify_jwt_token)):
     """Admin deletes a parcel"""
     if not payload.get("admin"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
-    if tracking_id in parcels_db:
-        del parcels_db[tracking_id]
-        # Also delete from supabase if applicable
-        if supabase:
-            try:
-                supabase.table("parcels").delete().eq("id", tracking_id).execute()
-            except Exception as e:
-                print(f"Failed to delete parcel from database: {e}")
-        return {"detail": "Parcel deleted"}
-    else:
+    try:
+        deleted = await storage.delete_parcel(tracking_id)
+    except StorageError as e:
+        print(f"Failed to delete parcel from database: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to delete parcel")
+    forget_parcel(tracking_id)
+    share("deleted", tracking_id)
+    if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parcel not found")
+    return {"detail": "Parcel deleted"}
 
-# Settings storage (in-memory for now)
+# Admin settings, saved to storage where the backend supports it and shared between workers
 settings_store = {
     "location_address": "",
     "live_chat_code": "",
     "phone_number": ""
 }
 
+async def load_settings() -> None:
+    try:
+        saved = await storage.load_settings()
+    except StorageError as e:
+        print(f"Settings load failed: {e}")
+        return
+    if saved:
+        settings_store.update(saved)
+
 @app.get("/api/admin/settings")
 async def get_settings(payload: dict = Depends(verify_jwt_token)):
     if not payload.get("admin"):
@@ -452,6 +1078,12 @@ async def update_settings(data: dict, payload: dict = Depends(verify_jwt_token))
     for key in ["location_address", "live_chat_code", "phone_number"]:
         if key in data:
             settings_store[key] = data[key]
+    try:
+        await storage.save_settings(settings_store)
+    except StorageError as e:
+        print(f"Settings save failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to save settings")
+    share("settings", settings_store)
     return settings_store
 
 @app.post("/api/admin/email")
@@ -467,64 +1099,257 @@ async def send_custom_email(data: dict, payload: dict = Depends(verify_jwt_token
     return {"success": success}
 
 @app.patch("/api/admin/parcel/{tracking_id}/route")
-async def update_delivery_route(tracking_id: str, data: dict, payload: dict = Depends(verify_jwt_token)):
+async def update_delivery_route(tracking_id: str, data: RouteUpdateRequest, payload: dict = Depends(verify_jwt_token)):
     if not payload.get("admin"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     parcel = await get_from_database("parcels", tracking_id)
     if not parcel:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Parcel not found")
-    # Expect data to contain route list
-    route = data.get("route")
-    if not route or not isinstance(route, list):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid route data")
+    route = [point.dict(exclude_none=True) for point in data.route]
+    before = snapshot(parcel)
     parcel["route"] = route
-    await save_to_database("parcels", parcel)
+    parcel["routeVersion"] = parcel.get("routeVersion", 1) + 1
+    parcel["updatedAt"] = datetime.utcnow().isoformat()
+    if not await save_parcel_updates([parcel], {tracking_id: before}):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to update route")
+    tracking_cache.invalidate(tracking_id)
+    simulator.track(parcel)
+    notify_subscribers(tracking_id, {
+        "type": "route",
+        "id": tracking_id,
+        "route": route,
+        "updatedAt": parcel["updatedAt"]
+    })
     return parcel
 
 @app.get("/api/track/{tracking_id}")
-async def track_parcel(tracking_id: str):
+async def track_parcel(tracking_id: str, request: Request):
     """Track a parcel by ID"""
-    parcel = await get_from_database("parcels", tracking_id)
-    if not parcel:
+    entry = await get_tracking_entry(tracking_id)
+    if entry is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tracking ID not found"
         )
     
-    return parcel
+    headers = {
+        "ETag": entry["etag"],
+        "Last-Modified": entry["last_modified"],
+        "Cache-Control": "no-cache"
+    }
+    if etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
+@app.websocket("/api/track/{tracking_id}/stream")
+async def track_parcel_websocket(websocket: WebSocket, tracking_id: str):
+    """Live tracking over WebSocket: a snapshot, then deltas and heartbeats"""
+    await websocket.accept()
+    # Subscribe before reading the snapshot so no update can fall in between
+    subscription = tracking_hub.subscribe(tracking_id)
+    if subscription is None:
+        await websocket.close(code=1013, reason="Too many subscribers")
+        return
+    try:
+        entry = await get_tracking_entry(tracking_id)
+        if entry is None:
+            await websocket.close(code=4404, reason="Tracking ID not found")
+            return
+        await websocket.send_text(snapshot_message(entry))
+        while True:
+            message = await subscription.get()
+            if message is CLOSED:
+                await websocket.close()
+                return
+            if message is EVICTED:
+                await websocket.close(code=1013, reason="Consumer too slow")
+                return
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        tracking_hub.unsubscribe(subscription)
+
+@app.get("/api/track/{tracking_id}/stream")
+async def track_parcel_stream(tracking_id: str):
+    """Live tracking over Server-Sent Events, for clients without WebSocket"""
+    subscription = tracking_hub.subscribe(tracking_id)
+    if subscription is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many subscribers",
+            headers={"Retry-After": "30"}
+        )
+    entry = await get_tracking_entry(tracking_id)
+    if entry is None:
+        tracking_hub.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Tracking ID not found"
+        )
+    
+    async def events():
+        try:
+            yield f"data: {snapshot_message(entry)}\n\n"
+            while True:
+                message = await subscription.get()
+                if message is CLOSED or message is EVICTED:
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            tracking_hub.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/admin/login")
-async def admin_login(request: AdminLoginRequest):
+async def admin_login(request: AdminLoginRequest, http_request: Request):
     """Admin login"""
+    client = client_ip(http_request.scope)
+    locked_for = login_guard.retry_after(client)
+    if locked_for:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(math.ceil(locked_for))}
+        )
+
     key = request.key.strip().strip('"')
 
     if key != ADMIN_KEY:
-        print(f"DEBUG FULL: Received len={len(key)}, repr={repr(key)}")
-        print(f"DEBUG FULL: Expected len={len(ADMIN_KEY)}, repr={repr(ADMIN_KEY)}")
-        diff_pos = next((i for i in range(min(len(key), len(ADMIN_KEY))) if key[i] != ADMIN_KEY[i]), -1)
-        if diff_pos != -1:
-            print(f"DEBUG FULL: First diff at pos {diff_pos}: received '{key[diff_pos]}' vs expected '{ADMIN_KEY[diff_pos]}'")
-        else:
-            print(f"DEBUG FULL: No diff found in common length, lengths differ: {len(key)} vs {len(ADMIN_KEY)}")
+        login_guard.failure(client)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin key"
         )
 
+    login_guard.success(client)
     token = create_jwt_token({"admin": True})
     return {"token": token}
 
 @app.get("/api/admin/parcels")
-async def get_all_parcels(payload: dict = Depends(verify_jwt_token)):
-    """Get all parcels (admin only)"""
+async def get_all_parcels(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    mode: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    sort: str = Query("-createdAt", pattern="^-?createdAt$"),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """List parcels a page at a time, newest first by default (admin only)
+
+    Pass the returned `nextCursor` back as `cursor` to get the next page.
+    `created_from` is inclusive and `created_to` exclusive (ISO timestamps).
+    """
     if not payload.get("admin"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
     
-    parcels = await get_from_database("parcels")
-    return parcels if isinstance(parcels, list) else list(parcels_db.values())
+    try:
+        # One extra row tells us whether there is a next page
+        parcels = await storage.query_parcels(
+            status=status_filter,
+            mode=mode,
+            created_from=created_from,
+            created_to=created_to,
+            after=decode_cursor(cursor) if cursor else None,
+            descending=sort.startswith("-"),
+            limit=limit + 1
+        )
+    except StorageError as e:
+        print(f"Database get failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to load parcels")
+    
+    items = parcels[:limit]
+    return {
+        "items": items,
+        "nextCursor": encode_cursor(items[-1]) if len(parcels) > limit else None
+    }
+
+def parse_statuses(value: Optional[str]) -> Optional[List[str]]:
+    """A `status` query parameter holding one status or a comma-separated list"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+async def spatial_items(hits: List[tuple], distance: bool) -> List[Dict]:
+    """Parcels for spatial index hits, in order, skipping any deleted since"""
+    try:
+        parcels = await storage.get_parcels([parcel_id for parcel_id, _ in hits])
+    except StorageError as e:
+        print(f"Database get failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Storage unavailable"
+        )
+    items = []
+    for parcel_id, km in hits:
+        if parcel_id in parcels:
+            item = {"id": parcel_id, "record": parcels[parcel_id]}
+            if distance:
+                item["distanceKm"] = km
+            items.append(item)
+    return items
+
+@app.get("/api/admin/parcels/nearby")
+async def get_parcels_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float = Query(10, gt=0, le=20000),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Parcels whose current position is within `radius` km of a point, nearest first (admin only)
+
+    `status` takes one status or a comma-separated list, e.g.
+    `in-transit,out-for-delivery` for parcels still on the road. `total`
+    counts every match, `items` holds the nearest `limit`.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    require_ready()
+
+    total, hits = spatial_index.nearby(lat, lng, radius, statuses=parse_statuses(status_filter), limit=limit)
+    return {"items": await spatial_items(hits, distance=True), "total": total}
+
+@app.get("/api/admin/parcels/bbox")
+async def get_parcels_in_bbox(
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    limit: int = Query(500, ge=1, le=5000),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Parcels whose current position is inside a map viewport (admin only)
+
+    A `west` greater than `east` is a box crossing the antimeridian. When
+    more than `limit` parcels match, the ones closest to the center of the
+    box are returned; `total` counts them all.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if south > north:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="south must not be greater than north")
+    require_ready()
+
+    total, hits = spatial_index.within(south, west, north, east, statuses=parse_statuses(status_filter), limit=limit)
+    return {"items": await spatial_items(hits, distance=False), "total": total}
 
 @app.patch("/api/admin/parcel/{tracking_id}")
 async def update_parcel(
@@ -546,36 +1371,13 @@ async def update_parcel(
             detail="Tracking ID not found"
         )
     
-    # Update fields
-    if updates.status:
-        parcel["status"] = updates.status
-        # Add to history
-        parcel["history"].append({
-            "status": updates.status,
-            "timestamp": datetime.utcnow().isoformat(),
-            "location": parcel["currentPosition"]["label"] if parcel.get("currentPosition") else "Unknown",
-            "notes": updates.notes or f"Status updated to {updates.status}"
-        })
-        
-        # Update progress based on status
-        status_progress = {
-            "pending": 0,
-            "picked-up": 20,
-            "in-transit": 60,
-            "at-hub": 80,
-            "out-for-delivery": 90,
-            "delivered": 100
-        }
-        parcel["progress"] = status_progress.get(updates.status, parcel["progress"])
-    
-    if updates.mode:
-        parcel["mode"] = updates.mode
-    
-    if updates.currentPosition:
-        parcel["currentPosition"] = updates.currentPosition.dict()
+    before = snapshot(parcel)
+    delta = apply_parcel_update(parcel, updates, datetime.utcnow().isoformat())
     
     # Save updated parcel
-    await save_to_database("parcels", parcel)
+    if not await save_parcel_updates([parcel], {tracking_id: before}):
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to update parcel")
+    publish_parcel_update(parcel, delta)
     
     # Send notification if status changed to delivered
     if updates.status == "delivered" and ENABLE_EMAIL:
@@ -590,6 +1392,166 @@ async def update_parcel(
     
     return parcel
 
+@app.patch("/api/admin/parcels")
+async def batch_update_parcels(
+    batch: ParcelBatchUpdateRequest,
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Apply many parcel updates at once, e.g. a hub scan (admin only)
+
+    Updates are applied in order with one storage read and one write per
+    chunk. Each item gets its own result, so one bad tracking ID does not
+    fail the batch. Delivery emails are sent once per receiver.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if len(batch.updates) > BATCH_UPDATE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BATCH_UPDATE_LIMIT} updates per batch"
+        )
+    
+    results = []
+    delivered: Dict[str, List[Dict]] = {}
+    for start in range(0, len(batch.updates), BULK_CHUNK_SIZE):
+        chunk = batch.updates[start:start + BULK_CHUNK_SIZE]
+        try:
+            parcels = await storage.get_parcels(list({item.trackingId for item in chunk}))
+        except StorageError as e:
+            print(f"Database get failed: {e}")
+            results.extend({"trackingId": item.trackingId, "success": False, "error": "Storage unavailable"} for item in chunk)
+            continue
+        
+        now = datetime.utcnow().isoformat()
+        changed: Dict[str, Dict] = {}
+        befores: Dict[str, Dict] = {}
+        deltas = []
+        chunk_results = []
+        for item in chunk:
+            parcel = parcels.get(item.trackingId)
+            if parcel is None:
+                chunk_results.append({"trackingId": item.trackingId, "success": False, "error": "Tracking ID not found"})
+                continue
+            if parcel["id"] not in befores:
+                befores[parcel["id"]] = snapshot(parcel)
+            deltas.append((parcel, apply_parcel_update(parcel, item, now)))
+            changed[parcel["id"]] = parcel
+            chunk_results.append({"trackingId": item.trackingId, "success": True})
+        
+        if changed and not await save_parcel_updates(list(changed.values()), befores):
+            for result in chunk_results:
+                if result["success"]:
+                    result.update(success=False, error="Failed to save update")
+            results.extend(chunk_results)
+            continue
+        results.extend(chunk_results)
+        for parcel, delta in deltas:
+            publish_parcel_update(parcel, delta)
+            if delta.get("status") == "delivered":
+                delivered.setdefault(parcel["receiver"]["email"], []).append(parcel)
+    
+    # One email per receiver, however many of their parcels were delivered
+    if ENABLE_EMAIL:
+        for email, parcels in delivered.items():
+            ids = sorted({parcel["id"] for parcel in parcels})
+            email_subject = f"Package Delivered - {ids[0]}" if len(ids) == 1 else f"{len(ids)} Packages Delivered"
+            email_body = f"""
+            <h2>{"Your package has" if len(ids) == 1 else "Your packages have"} been delivered!</h2>
+            <p><strong>Tracking ID{"" if len(ids) == 1 else "s"}:</strong> {", ".join(ids)}</p>
+            <p><strong>Delivered to:</strong> {parcels[0]['receiver']['name']}</p>
+            <p>Thank you for choosing Swiftify!</p>
+            """
+            send_email_notification(email, email_subject, email_body)
+    
+    failed = sum(1 for result in results if not result["success"])
+    return {"updated": len(results) - failed, "failed": failed, "results": results}
+
+@app.get("/api/geocode")
+async def geocode_address(address: str = Query(..., min_length=1, max_length=500)):
+    """Resolve an address to coordinates with the local gazetteer"""
+    if geocoder is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Geocoding unavailable"
+        )
+    result = geocoder.geocode(address)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Address not found"
+        )
+    return result
+
+@app.post("/api/admin/geocode")
+async def geocode_addresses(
+    batch: GeocodeBatchRequest,
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Resolve many addresses at once, e.g. before a bulk import (admin only)"""
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if geocoder is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Geocoding unavailable"
+        )
+    if len(batch.addresses) > GEOCODE_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {GEOCODE_BATCH_LIMIT} addresses per batch"
+        )
+
+    results = geocoder.geocode_many(batch.addresses)
+    return {
+        "resolved": sum(1 for result in results if result is not None),
+        "results": [
+            {"address": address, "result": result}
+            for address, result in zip(batch.addresses, results)
+        ]
+    }
+
+@app.post("/api/quote/batch")
+async def quote_batch(batch: QuoteBatchRequest):
+    """Price many parcels in one call without creating them
+
+    Each item is priced from its weight band, dimensions and declared value,
+    plus `distanceKm` or the routed distance between `origin` and
+    `destination` addresses. The whole batch is priced in one vectorized pass.
+    """
+    if len(batch.items) > QUOTE_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {QUOTE_BATCH_LIMIT} items per batch"
+        )
+
+    distances = []
+    unresolved = []
+    for i, item in enumerate(batch.items):
+        distance = item.distanceKm
+        if distance is None and item.origin and item.destination:
+            distance = address_distance_km(item.origin, item.destination)
+            if distance is None:
+                unresolved.append(i)
+        distances.append(distance or 0.0)
+
+    quotes = pricing.quotes(
+        [item.weight for item in batch.items],
+        [volume_cm3(item.dimensions) for item in batch.items],
+        [item.value for item in batch.items],
+        distances
+    )
+    for i, distance in enumerate(distances):
+        quotes[i]["distanceKm"] = round(distance, 1)
+    for i in unresolved:
+        quotes[i] = {"error": "Address not found"}
+    return {"currency": pricing.currency, "quotes": quotes}
+
 @app.post("/api/contact")
 async def submit_contact(request: ContactRequest):
     """Submit contact form"""
@@ -603,10 +1565,9 @@ async def submit_contact(request: ContactRequest):
             "status": "new"
         }
         
-        contact_messages.append(message)
-        
         # Save to database
-        await save_to_database("contact_messages", message)
+        if not await save_to_database("contact_messages", message):
+            raise StorageError("message could not be saved")
         
         # Send confirmation email if enabled
         if ENABLE_EMAIL:
@@ -630,16 +1591,255 @@ async def submit_contact(request: ContactRequest):
         )
 
 @app.get("/api/admin/contacts")
-async def get_contact_messages(payload: dict = Depends(verify_jwt_token)):
-    """Get all contact messages (admin only)"""
+async def get_contact_messages(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status", pattern=CONTACT_STATUS_PATTERN),
+    since: Optional[str] = None,
+    sort: str = Query("-timestamp", pattern="^-?timestamp$"),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """List contact messages a page at a time, newest first by default (admin only)
+
+    Pass the returned `nextCursor` back as `cursor` to get the next page.
+    `counts` holds the number of messages in each inbox status.
+    """
     if not payload.get("admin"):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
         )
-    
-    messages = await get_from_database("contact_messages")
-    return messages if isinstance(messages, list) else contact_messages
+
+    try:
+        # One extra row tells us whether there is a next page
+        messages = await storage.query_contacts(
+            since=parse_since(since),
+            after=decode_cursor(cursor) if cursor else None,
+            limit=limit + 1,
+            status=status_filter,
+            descending=sort.startswith("-")
+        )
+        counts = await asyncio.gather(*(storage.count_contacts(name) for name in CONTACT_STATUSES))
+    except StorageError as e:
+        print(f"Database get failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to load contact messages")
+
+    items = messages[:limit]
+    return {
+        "items": items,
+        "nextCursor": encode_cursor(items[-1], "timestamp") if len(messages) > limit else None,
+        "counts": dict(zip(CONTACT_STATUSES, counts))
+    }
+
+@app.patch("/api/admin/contacts")
+async def update_contact_messages(
+    update: ContactStatusUpdate,
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Move contact messages to another inbox status in bulk (admin only)
+
+    Changes the messages that match all given filters: the listed `ids`,
+    messages currently in `currentStatus`, messages sent `before` a time.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if update.ids is None and update.currentStatus is None and update.before is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give ids, currentStatus or before"
+        )
+
+    try:
+        updated = await storage.set_contact_status(
+            update.status,
+            ids=update.ids,
+            status=update.currentStatus,
+            before=parse_since(update.before, "before")
+        )
+    except StorageError as e:
+        print(f"Database update failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Failed to update contact messages")
+    return {"updated": updated}
+
+@app.get("/api/admin/stats")
+async def admin_stats(
+    days: int = Query(30, ge=1, le=366),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Dashboard aggregates, served from running totals (admin only)"""
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    require_ready()
+    return dashboard_stats.summary(days)
+
+@app.post("/api/admin/stats/rebuild")
+async def admin_rebuild_stats(payload: dict = Depends(verify_jwt_token)):
+    """Recompute the aggregates from storage and report any drift (admin only)"""
+    global dashboard_stats
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    require_ready()
+
+    rebuilt = DashboardStats()
+    try:
+        await scan_storage(None, rebuilt)
+    except StorageError as e:
+        print(f"Stats rebuild failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Storage unavailable"
+        )
+    before, after = dashboard_stats.snapshot(), rebuilt.snapshot()
+    drift = [name for name in after if before[name] != after[name]]
+    dashboard_stats = rebuilt
+    return {"consistent": not drift, "drift": drift, "total": len(rebuilt)}
+
+@app.get("/api/admin/search")
+async def admin_search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: Optional[str] = Query(None, pattern="^(parcel|contact)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Search parcels and contact messages (admin only)
+
+    Matches names, emails, phones, addresses, parcel descriptions and
+    message text by token, and tracking IDs by prefix. Results are ranked,
+    best first, and paginated with `offset`.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    require_ready()
+
+    total, hits = search_index.search(q, kind=type, limit=limit, offset=offset)
+    try:
+        parcels = await storage.get_parcels([doc_id for kind, doc_id, _ in hits if kind == "parcel"])
+        messages = await storage.get_contacts([doc_id for kind, doc_id, _ in hits if kind == "contact"])
+    except StorageError as e:
+        print(f"Database get failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Storage unavailable"
+        )
+
+    items = []
+    for kind, doc_id, score in hits:
+        record = (parcels if kind == "parcel" else messages).get(doc_id)
+        if record is not None:
+            items.append({"type": kind, "id": doc_id, "score": score, "record": record})
+    return {
+        "items": items,
+        "total": total,
+        "nextOffset": offset + limit if offset + limit < total else None
+    }
+
+async def open_export(pages: AsyncIterator[List[Dict]]) -> AsyncIterator[List[Dict]]:
+    """Fetch the first page up front, so a storage outage is a 503 rather than an empty file"""
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except StorageError as e:
+        print(f"Export failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Storage unavailable"
+        )
+
+    async def stream():
+        if first is None:
+            return
+        yield first
+        try:
+            async for page in pages:
+                yield page
+        except StorageError as e:
+            # Headers are already sent; aborting the response marks the download as incomplete
+            print(f"Export interrupted: {e}")
+            raise
+
+    return stream()
+
+def export_response(request: Request, chunks: AsyncIterator[bytes], name: str, fmt: str) -> StreamingResponse:
+    """Stream an export as a download, gzip-compressed if the client accepts it"""
+    headers = {
+        "Content-Disposition": f'attachment; filename="{name}-{datetime.utcnow():%Y%m%dT%H%M%S}.{fmt}"',
+        "Vary": "Accept-Encoding",
+    }
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=FORMATS[fmt], headers=headers)
+
+def parse_since(since: Optional[str], name: str = "since") -> Optional[str]:
+    if since is None:
+        return None
+    try:
+        datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{name} must be an ISO timestamp"
+        )
+    return since
+
+@app.get("/api/admin/export/parcels")
+async def export_parcels_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    mode: Optional[str] = None,
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Stream every parcel as NDJSON or CSV, oldest first (admin only)
+
+    `since` (ISO timestamp, UTC) limits the export to parcels created or
+    updated after it, for incremental exports.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+    pages = await open_export(storage.iter_parcels(
+        EXPORT_PAGE_SIZE, status=status_filter, mode=mode, modified_since=parse_since(since)
+    ))
+    return export_response(request, export_parcels(pages, format), "parcels", format)
+
+@app.get("/api/admin/export/contacts")
+async def export_contacts_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[str] = None,
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Stream every contact message as NDJSON or CSV, oldest first (admin only)
+
+    `since` (ISO timestamp, UTC) limits the export to messages sent after it.
+    """
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+    pages = await open_export(storage.iter_contacts(EXPORT_PAGE_SIZE, since=parse_since(since)))
+    return export_response(request, export_contacts(pages, format), "contacts", format)
 
 @app.post("/api/notifications/email")
 async def send_email_endpoint(request: dict):
@@ -672,19 +1872,118 @@ async def send_sms_endpoint(request: dict):
             detail=f"Failed to send SMS: {str(e)}"
         )
 
+def component_stats() -> Dict[str, Optional[Dict]]:
+    """Counters kept by each component, for the health check and /api/metrics"""
+    return {
+        "notifications": notifier.stats(),
+        "tracking_cache": tracking_cache.stats(),
+        "tracking_streams": tracking_hub.stats(),
+        "simulation": simulator.stats(),
+        "routing": routing_engine.stats() if routing_engine else None,
+        "geocoder": geocoder.stats() if geocoder else None,
+        "search": search_index.stats(),
+        "spatial": spatial_index.stats(),
+        "storage": storage.stats(),
+        "startup": {"ready": ready, "warm_up_seconds": warm_up_seconds},
+        "tracking_ids": tracking_ids.stats(),
+        "change_feed": {**change_feed.stats(), "simulation_lease": simulation_lease.held} if change_feed else None,
+        "admission": {
+            "enabled": RATE_LIMIT_ENABLED,
+            **admission.stats(),
+            "rate_limits": rate_limiter.stats(),
+            "login": login_guard.stats()
+        },
+    }
+
+metrics.add_collector(component_stats)
+
+@app.get("/api/metrics")
+async def metrics_endpoint(request: Request):
+    """Metrics in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+
+    try:
+        storage_records.labels("parcels").set(await storage.count_parcels())
+        storage_records.labels("contact_messages").set(await storage.count_contacts())
+    except StorageError as e:
+        print(f"Database count failed: {e}")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/admin/profiler/start")
+async def start_profiler(
+    interval_ms: float = Query(5, ge=1, le=1000),
+    duration: float = Query(60, ge=1, le=600),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Start sampling the event loop's stacks for up to `duration` seconds (admin only)"""
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    # Handlers run on the event loop thread, which is the one to sample
+    profiler.start(interval=interval_ms / 1000, duration=duration)
+    return profiler.stats()
+
+@app.post("/api/admin/profiler/stop")
+async def stop_profiler(payload: dict = Depends(verify_jwt_token)):
+    """Stop the sampling profiler, keeping its samples (admin only)"""
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    profiler.stop()
+    return profiler.stats()
+
+@app.get("/api/admin/profiler")
+async def profiler_report(
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    limit: int = Query(50, ge=1, le=1000),
+    payload: dict = Depends(verify_jwt_token)
+):
+    """Hottest sampled stacks, or all of them in collapsed flame graph format (admin only)"""
+    if not payload.get("admin"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    if format == "collapsed":
+        return Response(profiler.collapsed(), media_type="text/plain")
+    return {**profiler.stats(), "top": profiler.top(limit)}
+
+@app.get("/api/ready")
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the startup rebuild has finished"""
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready}
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
+    try:
+        parcels_count = await storage.count_parcels()
+        messages_count = await storage.count_contacts()
+    except StorageError as e:
+        print(f"Database count failed: {e}")
+        parcels_count = messages_count = None
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "parcels_count": len(parcels_db),
-        "messages_count": len(contact_messages),
+        "parcels_count": parcels_count,
+        "messages_count": messages_count,
+        **component_stats(),
         "services": {
             "email": ENABLE_EMAIL,
             "sms": ENABLE_SMS,
             "google_maps": ENABLE_GOOGLE_MAPS,
-            "database": supabase is not None
+            "database": storage.persistent
         }
     }
 
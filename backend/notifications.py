@@ -0,0 +1,261 @@
+"""Background email notification dispatcher.
+
+Handlers enqueue messages; a small pool of worker tasks drains the queue,
+keeps SMTP sessions open between batches and retries failed sends with
+exponential backoff. The blocking smtplib calls run in a thread so the
+event loop is never held up by the mail server. smtplib and the MIME
+modules are imported by the first session, so a server without email
+configured never loads them.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+
+
+@dataclass
+class SMTPSettings:
+    host: Optional[str] = None
+    port: int = 587
+    user: Optional[str] = None
+    password: Optional[str] = None
+    sender: Optional[str] = None
+    starttls: bool = True
+    timeout: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "SMTPSettings":
+        """Read SMTP settings from the environment"""
+        user = os.getenv("SMTP_USER")
+        return cls(
+            host=os.getenv("SMTP_HOST"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=user,
+            password=os.getenv("SMTP_PASSWORD"),
+            sender=os.getenv("SMTP_FROM", user),
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+            timeout=float(os.getenv("SMTP_TIMEOUT", "10")),
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host and self.sender)
+
+
+@dataclass
+class EmailJob:
+    to_email: str
+    subject: str
+    body: str
+    attempts: int = 0
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class SMTPSession:
+    """A reusable SMTP connection. All methods block and run in a worker thread."""
+
+    def __init__(self, settings: SMTPSettings):
+        self.settings = settings
+        self._server: Optional["smtplib.SMTP"] = None
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+        server = smtplib.SMTP(self.settings.host, self.settings.port, timeout=self.settings.timeout)
+        if self.settings.starttls:
+            server.starttls()
+        if self.settings.user and self.settings.password:
+            server.login(self.settings.user, self.settings.password)
+        return server
+
+    def _build_message(self, job: EmailJob) -> "MIMEMultipart":
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        msg = MIMEMultipart()
+        msg['From'] = self.settings.sender
+        msg['To'] = job.to_email
+        msg['Subject'] = job.subject
+        msg.attach(MIMEText(job.body, 'html'))
+        return msg
+
+    def send_batch(self, jobs: List[EmailJob]) -> List[EmailJob]:
+        """Send a batch over the open connection and return the jobs that failed"""
+        import smtplib
+        failed = []
+        for job in jobs:
+            msg = self._build_message(job)
+            # One reconnect per message covers servers that drop idle sessions
+            for attempt in range(2):
+                try:
+                    if self._server is None:
+                        self._server = self._connect()
+                    self._server.send_message(msg)
+                    break
+                except smtplib.SMTPServerDisconnected:
+                    self._server = None
+                    if attempt:
+                        failed.append(job)
+                except (smtplib.SMTPException, OSError) as e:
+                    print(f"Email notification failed: {e}")
+                    self.close()
+                    failed.append(job)
+                    break
+        return failed
+
+    def close(self) -> None:
+        if self._server is not None:
+            import smtplib
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+class NotificationDispatcher:
+    """Bounded in-process email queue drained by background workers"""
+
+    def __init__(
+        self,
+        settings: SMTPSettings,
+        maxsize: int = 1000,
+        workers: int = 2,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        idle_timeout: float = 30.0,
+        observe_batch: Optional[Callable[[float], None]] = None,
+    ):
+        self.settings = settings
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.idle_timeout = idle_timeout
+        # Called with the seconds each batch spent in SMTP
+        self.observe_batch = observe_batch
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self._retries: set = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    @classmethod
+    def from_env(cls, observe_batch: Optional[Callable[[float], None]] = None) -> "NotificationDispatcher":
+        return cls(
+            SMTPSettings.from_env(),
+            observe_batch=observe_batch,
+            maxsize=int(os.getenv("EMAIL_QUEUE_SIZE", "1000")),
+            workers=int(os.getenv("EMAIL_WORKERS", "2")),
+            batch_size=int(os.getenv("EMAIL_BATCH_SIZE", "20")),
+            max_retries=int(os.getenv("EMAIL_MAX_RETRIES", "3")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> bool:
+        """Queue an email for delivery. Returns False if it could not be queued."""
+        if not self.settings.configured or not to_email:
+            return False
+        try:
+            self._queue.put_nowait(EmailJob(to_email, subject, body))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"Email queue full, dropping message to {to_email}")
+            return False
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Drain queued messages (bounded by timeout) and stop the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Email queue drain timed out with {self._queue.qsize()} messages left")
+        for task in list(self._retries) + self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        self._retries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "workers": len(self._tasks),
+        }
+
+    async def _next_batch(self) -> List[EmailJob]:
+        job = await asyncio.wait_for(self._queue.get(), self.idle_timeout)
+        batch = [job]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _worker(self) -> None:
+        session = SMTPSession(self.settings)
+        try:
+            while True:
+                try:
+                    batch = await self._next_batch()
+                except asyncio.TimeoutError:
+                    # Idle: release the connection until there is work again
+                    await asyncio.to_thread(session.close)
+                    continue
+                started = time.perf_counter()
+                try:
+                    failed = await asyncio.to_thread(session.send_batch, batch)
+                except Exception as e:
+                    print(f"Email batch failed: {e}")
+                    failed = batch
+                if self.observe_batch is not None:
+                    self.observe_batch(time.perf_counter() - started)
+                self.sent += len(batch) - len(failed)
+                failed_ids = {id(job) for job in failed}
+                for job in batch:
+                    if id(job) in failed_ids:
+                        self._schedule_retry(job)
+                    else:
+                        self._queue.task_done()
+        finally:
+            await asyncio.to_thread(session.close)
+
+    def _schedule_retry(self, job: EmailJob) -> None:
+        job.attempts += 1
+        if job.attempts > self.max_retries:
+            self.failed += 1
+            self._queue.task_done()
+            return
+        self.retried += 1
+        task = asyncio.create_task(self._requeue(job, self.backoff_base * 2 ** (job.attempts - 1)))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue(self, job: EmailJob, delay: float) -> None:
+        # The original task_done is deferred until the job is back in the
+        # queue so that a drain waits for pending retries as well
+        try:
+            await asyncio.sleep(delay)
+            await self._queue.put(job)
+        finally:
+            self._queue.task_done()
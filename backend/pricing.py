@@ -0,0 +1,113 @@
+"""Table-driven parcel pricing.
+
+A rate card (JSON) is compiled once into NumPy lookup tables, so pricing a
+batch of items is a few vectorized operations regardless of its size:
+
+- weight: base cost times the multiplier of the billable weight band, which
+  is the declared band or the band of the volumetric weight, whichever is
+  higher
+- distance: piecewise-linear per-km tiers over the route length
+- insurance: a rate on the declared value above a free allowance
+"""
+import json
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+class PricingEngine:
+    """Prices parcels from a compiled rate card"""
+
+    def __init__(self, card: Dict):
+        self.currency = card.get("currency", "USD")
+        self.base = float(card["base"])
+
+        bands = card["weight_bands"]
+        self.bands = [band["band"] for band in bands]
+        self._band_index = {name: i for i, name in enumerate(self.bands)}
+        self._multipliers = np.array([float(band["multiplier"]) for band in bands])
+        # Upper bound of every band but the last, for searchsorted on kilograms
+        self._band_limits = np.array([float(band["max_kg"]) for band in bands[:-1]])
+        self.volumetric_divisor = float(card.get("volumetric_divisor", 5000))
+
+        tiers = sorted(card.get("distance_tiers") or [{"from_km": 0, "per_km": 0.0}], key=lambda tier: tier["from_km"])
+        self._tier_starts = np.array([float(tier["from_km"]) for tier in tiers])
+        self._tier_rates = np.array([float(tier["per_km"]) for tier in tiers])
+        # Charge accumulated by the start of each tier
+        spans = np.diff(self._tier_starts)
+        self._tier_base = np.concatenate(([0.0], np.cumsum(spans * self._tier_rates[:-1])))
+
+        insurance = card.get("insurance") or {}
+        self.free_value = float(insurance.get("free_value", 0))
+        self.insurance_rate = float(insurance.get("rate", 0))
+
+    @classmethod
+    def from_file(cls, path: str) -> "PricingEngine":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def quote_many(
+        self,
+        weights: Sequence[str],
+        volumes_cm3: Sequence[float],
+        values: Sequence[float],
+        distances_km: Sequence[float],
+    ) -> Dict[str, np.ndarray]:
+        """Price a batch; returns per-item arrays of charges, totals and the billable band index"""
+        # Unknown band names price as the lightest band
+        declared = np.fromiter((self._band_index.get(w, 0) for w in weights), dtype=np.int64, count=len(weights))
+        volumetric_kg = np.asarray(volumes_cm3, dtype=np.float64) / self.volumetric_divisor
+        volumetric = np.searchsorted(self._band_limits, volumetric_kg, side="left")
+        band = np.maximum(declared, volumetric)
+        weight_charge = self.base * self._multipliers[band]
+
+        distance = np.maximum(np.asarray(distances_km, dtype=np.float64), 0.0)
+        tier = np.searchsorted(self._tier_starts, distance, side="right") - 1
+        tier = np.maximum(tier, 0)
+        distance_charge = self._tier_base[tier] + (distance - self._tier_starts[tier]) * self._tier_rates[tier]
+
+        insured = np.maximum(np.asarray(values, dtype=np.float64) - self.free_value, 0.0)
+        insurance_charge = insured * self.insurance_rate
+
+        total = weight_charge + distance_charge + insurance_charge
+        return {
+            "band": band,
+            "weight": np.round(weight_charge, 2),
+            "distance": np.round(distance_charge, 2),
+            "insurance": np.round(insurance_charge, 2),
+            "total": np.round(total, 2),
+        }
+
+    def quotes(
+        self,
+        weights: Sequence[str],
+        volumes_cm3: Sequence[float],
+        values: Sequence[float],
+        distances_km: Sequence[float],
+    ) -> List[Dict]:
+        """Like quote_many, as one breakdown dict per item"""
+        priced = self.quote_many(weights, volumes_cm3, values, distances_km)
+        bands = self.bands
+        return [
+            {
+                "total": total,
+                "billableWeight": bands[band],
+                "breakdown": {"weight": weight, "distance": distance, "insurance": insurance},
+            }
+            for total, band, weight, distance, insurance in zip(
+                priced["total"].tolist(),
+                priced["band"].tolist(),
+                priced["weight"].tolist(),
+                priced["distance"].tolist(),
+                priced["insurance"].tolist(),
+            )
+        ]
+
+    def quote(self, weight: str, dimensions: Optional[Dict[str, float]], value: float, distance_km: float) -> Dict:
+        return self.quotes([weight], [volume_cm3(dimensions)], [value], [distance_km])[0]
+
+
+def volume_cm3(dimensions: Optional[Dict[str, float]]) -> float:
+    if not dimensions:
+        return 0.0
+    return float(dimensions.get("length", 0)) * float(dimensions.get("width", 0)) * float(dimensions.get("height", 0))
@@ -0,0 +1,149 @@
+"""In-process pub/sub hub for live parcel tracking.
+
+Each subscriber owns a small bounded queue of pre-serialized messages.
+Publishing serializes a message once and fans it out to the topic's
+subscribers; a subscriber whose queue is full is evicted rather than
+allowed to hold memory or slow the publisher down. Heartbeats for every
+subscriber come from one shared task, so an idle connection costs a queue
+and a suspended coroutine and nothing else.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional, Set
+
+# Sentinels placed on a subscriber's queue to end its stream
+CLOSED = object()
+EVICTED = object()
+
+
+class Subscription:
+    __slots__ = ("topic", "queue", "evicted")
+
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.evicted = False
+
+    async def get(self) -> Any:
+        """Next serialized message, or CLOSED/EVICTED when the stream should end"""
+        return await self.queue.get()
+
+
+class TrackingHub:
+    """Per-parcel topics with batched heartbeats and slow-consumer eviction"""
+
+    def __init__(
+        self,
+        queue_size: int = 32,
+        heartbeat_interval: float = 15.0,
+        max_subscribers: int = 20000,
+    ):
+        self.queue_size = queue_size
+        self.heartbeat_interval = heartbeat_interval
+        self.max_subscribers = max_subscribers
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.evicted = 0
+        self.rejected = 0
+
+    @property
+    def subscribers(self) -> int:
+        return self._count
+
+    async def start(self) -> None:
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self) -> None:
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+            self._heartbeat_task = None
+        for subs in self._topics.values():
+            for sub in subs:
+                self._force(sub, CLOSED)
+
+    def subscribe(self, topic: str) -> Optional[Subscription]:
+        """Register a subscriber, or return None when the hub is at capacity"""
+        if self._count >= self.max_subscribers:
+            self.rejected += 1
+            return None
+        sub = Subscription(topic, self.queue_size)
+        self._topics.setdefault(topic, set()).add(sub)
+        self._count += 1
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        subs = self._topics.get(sub.topic)
+        if subs is None or sub not in subs:
+            return
+        subs.discard(sub)
+        self._count -= 1
+        if not subs:
+            del self._topics[sub.topic]
+
+    def has_subscribers(self, topic: str) -> bool:
+        return topic in self._topics
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> int:
+        """Serialize once and fan out to the topic. Returns the number of receivers."""
+        subs = self._topics.get(topic)
+        if not subs:
+            return 0
+        self.published += 1
+        delivered = self._fan_out(list(subs), json.dumps(message, separators=(",", ":")))
+        self.delivered += delivered
+        return delivered
+
+    def close_topic(self, topic: str) -> None:
+        """End every stream on a topic, e.g. after the parcel is deleted"""
+        for sub in list(self._topics.get(topic, ())):
+            self._force(sub, CLOSED)
+            self.unsubscribe(sub)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": self._count,
+            "topics": len(self._topics),
+            "published": self.published,
+            "delivered": self.delivered,
+            "evicted": self.evicted,
+            "rejected": self.rejected,
+        }
+
+    def _fan_out(self, subs, payload: Any) -> int:
+        delivered = 0
+        for sub in subs:
+            if sub.evicted:
+                continue
+            try:
+                sub.queue.put_nowait(payload)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._evict(sub)
+        return delivered
+
+    def _evict(self, sub: Subscription) -> None:
+        sub.evicted = True
+        self.evicted += 1
+        self._force(sub, EVICTED)
+        self.unsubscribe(sub)
+
+    @staticmethod
+    def _force(sub: Subscription, sentinel: Any) -> None:
+        # Drop whatever is buffered so the sentinel always fits
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(sentinel)
+
+    async def _heartbeat(self) -> None:
+        heartbeat = json.dumps({"type": "heartbeat"})
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            # One pass over all subscribers; a client that has not drained a
+            # full queue of heartbeats is treated as a slow consumer
+            for subs in list(self._topics.values()):
+                self._fan_out(list(subs), heartbeat)
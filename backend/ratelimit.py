@@ -0,0 +1,276 @@
+"""Rate limiting, admission control and login throttling.
+
+`AdmissionMiddleware` sits in front of the app. Requests matching a
+`RateRule` take a token from the bucket for (rule, client IP) and are
+answered with 429 when it is empty. Every other HTTP request then needs
+one of a fixed number of concurrency slots; when all are taken it waits in
+a bounded queue, and once the queue is full (or the wait times out) it is
+shed with 503, so overload turns into fast rejections instead of a growing
+backlog. Both answers carry Retry-After.
+
+`LoginGuard` locks a client out of admin login after repeated failures.
+All state is in process, bounded, and O(1) per request.
+"""
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+class RateRule(NamedTuple):
+    """A token bucket per client for one method and path (a trailing / matches a prefix)"""
+    name: str
+    method: str
+    path: str
+    rate: float  # tokens added per second
+    burst: int
+
+    def matches(self, method: str, path: str) -> bool:
+        if method != self.method:
+            return False
+        return path == self.path or (self.path.endswith("/") and path.startswith(self.path))
+
+
+def parse_rate(spec: str) -> Optional[Tuple[float, int]]:
+    """"30/minute" as (tokens per second, burst); None for "off" or an empty spec"""
+    spec = spec.strip().lower()
+    if spec in ("", "off", "0"):
+        return None
+    count, _, period = spec.partition("/")
+    seconds = PERIODS.get(period or "second")
+    if seconds is None or int(count) <= 0:
+        raise ValueError(f"Invalid rate limit: {spec!r}")
+    return int(count) / seconds, int(count)
+
+
+class RateLimiter:
+    """Token buckets keyed by (rule, client), least recently used evicted first"""
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def acquire(self, key: Hashable, rate: float, burst: int, now: Optional[float] = None) -> float:
+        """Take a token; returns 0 on success, else the seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        entry = self._buckets.get(key)
+        if entry is None:
+            tokens = float(burst)
+        else:
+            tokens, last = entry
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            self._buckets.move_to_end(key)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            self.allowed += 1
+            wait = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            wait = (1 - tokens) / rate
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+            self.evictions += 1
+        return wait
+
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evictions": self.evictions,
+        }
+
+
+class AdmissionController:
+    """Caps concurrent requests; excess requests queue up to `max_queue` deep"""
+
+    def __init__(self, max_concurrent: int = 64, max_queue: int = 256, queue_timeout: float = 2.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        # Futures of queued requests; a freed slot is handed to the oldest one
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; False if the request should be shed"""
+        if self.active < self.max_concurrent:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if self.waiting >= self.max_queue:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.waiting += 1
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                self.waiting -= 1
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot moves to the waiter, so `active` stays the same
+                self.waiting -= 1
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.queue_timeout))
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+
+class LoginGuard:
+    """Locks a client out after `max_failures` failed logins within `window` seconds"""
+
+    def __init__(self, max_failures: int = 5, window: float = 300.0, lockout: float = 900.0, maxsize: int = 100000):
+        self.max_failures = max_failures
+        self.window = window
+        self.lockout = lockout
+        self.maxsize = maxsize
+        # client -> [failures, first failure time, locked until]
+        self._clients: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.failures = 0
+        self.lockouts = 0
+        self.rejected = 0
+
+    def retry_after(self, client: str, now: Optional[float] = None) -> float:
+        """Seconds the client is still locked out for, 0 if it may try"""
+        entry = self._clients.get(client)
+        if entry is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        remaining = entry[2] - now
+        if remaining > 0:
+            self.rejected += 1
+            return remaining
+        return 0.0
+
+    def failure(self, client: str, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        self.failures += 1
+        entry = self._clients.get(client)
+        if entry is None or now - entry[1] > self.window:
+            entry = [0, now, 0.0]
+            self._clients[client] = entry
+        self._clients.move_to_end(client)
+        entry[0] += 1
+        if entry[0] >= self.max_failures:
+            entry[0], entry[1], entry[2] = 0, now, now + self.lockout
+            self.lockouts += 1
+        if len(self._clients) > self.maxsize:
+            self._clients.popitem(last=False)
+
+    def success(self, client: str) -> None:
+        self._clients.pop(client, None)
+
+    def stats(self) -> Dict:
+        return {
+            "tracked": len(self._clients),
+            "failures": self.failures,
+            "lockouts": self.lockouts,
+            "rejected": self.rejected,
+        }
+
+
+def client_ip(scope: Dict) -> str:
+    """The client address; behind a proxy uvicorn fills it in from X-Forwarded-For"""
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying per-client rate rules and the concurrency cap"""
+
+    def __init__(
+        self,
+        app,
+        limiter: RateLimiter,
+        admission: Optional[AdmissionController],
+        rules: List[RateRule],
+        exempt: Callable[[str], bool] = lambda path: False,
+    ):
+        self.app = app
+        self.limiter = limiter
+        self.admission = admission
+        self.rules = rules
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        for rule in self.rules:
+            if rule.matches(method, path):
+                wait = self.limiter.acquire((rule.name, client_ip(scope)), rule.rate, rule.burst)
+                if wait:
+                    await reject(send, 429, "Too many requests", wait)
+                    return
+                break
+
+        if self.admission is None or method == "OPTIONS" or self.exempt(path):
+            await self.app(scope, receive, send)
+            return
+        if not await self.admission.acquire():
+            await reject(send, 503, "Server busy, try again shortly", self.admission.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release()
+
+
+async def reject(send, status_code: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
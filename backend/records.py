@@ -0,0 +1,307 @@
+"""Compact in-memory parcel records.
+
+A parcel dict with its nested sender, receiver, history and route dicts
+costs several KB. `ParcelRecord` keeps the same data in a slotted object:
+nested dicts become tuples that share one interned key tuple per shape,
+all-text dicts (sender, receiver) become a single joined string, status,
+mode and location strings are interned, timestamps are epoch floats and
+route coordinates are a packed `array('d')`. `to_dict()` rebuilds the
+original JSON shape, so records only exist inside the storage layer.
+
+Encoding is lossless: a timestamp that would not format back to the same
+string, a route point that is not plain floats, or an unexpected key is
+kept as it was.
+"""
+import sys
+from array import array
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Top-level parcel keys held in slots, in the order build_parcel writes them
+FIELDS = (
+    "id", "sender", "receiver", "parcelDetails", "status", "mode", "history", "route",
+    "currentPosition", "eta", "createdAt", "estimatedCost", "progress", "updatedAt",
+)
+POINT_KEYS = ("lat", "lng")
+LABELED_POINT_KEYS = ("lat", "lng", "label")
+SEPARATOR = "\x1f"
+EPOCH = datetime(1970, 1, 1)
+
+
+class Missing:
+    """Marks a known key that the parcel did not have"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __reduce__(self) -> str:
+        return "MISSING"
+
+
+MISSING = Missing()
+
+# A packed dict is (shape, *values) for DICT shapes and (shape, joined values)
+# for TEXT shapes; a shape is (kind, keys), shared by every dict with those keys
+DICT, TEXT = 0, 1
+
+_shapes: Dict[Tuple[int, Tuple[str, ...]], Tuple[int, Tuple[str, ...]]] = {}
+
+
+def _shape(kind: int, keys: Tuple[str, ...]) -> Tuple[int, Tuple[str, ...]]:
+    shape = (kind, keys)
+    return _shapes.setdefault(shape, shape)
+
+
+_LABELED_POINT = _shape(DICT, LABELED_POINT_KEYS)
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def stamp(value: Any) -> Any:
+    """An ISO timestamp as epoch seconds, if it formats back to the same string"""
+    if type(value) is float:
+        # A real float here is wrapped so it is not mistaken for a timestamp
+        return (value,)
+    if type(value) is not str:
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None or parsed.isoformat() != value:
+        return value
+    return (parsed - EPOCH).total_seconds()
+
+
+def unstamp(value: Any) -> Any:
+    if type(value) is float:
+        return (EPOCH + timedelta(seconds=value)).isoformat()
+    return value[0] if type(value) is tuple else value
+
+
+def pack(value: Any, interned: bool = False) -> Any:
+    """Compact form of a JSON value; `interned` interns its strings"""
+    kind = type(value)
+    if kind is dict:
+        keys = tuple(value)
+        values = list(value.values())
+        if values and all(type(v) is str and SEPARATOR not in v for v in values):
+            return (_shape(TEXT, keys), SEPARATOR.join(values))
+        return (_shape(DICT, keys), *[pack(v, interned) for v in values])
+    if kind is list:
+        return [pack(v, interned) for v in value]
+    if interned and kind is str:
+        return sys.intern(value)
+    return value
+
+
+def pack_position(position: Any) -> Any:
+    """`pack(position, interned=True)`, with a fast path for the {lat, lng, label}
+    points a simulation tick writes for every moving parcel"""
+    if type(position) is dict and tuple(position) == LABELED_POINT_KEYS:
+        lat, lng, label = position.values()
+        if type(lat) is float and type(lng) is float and type(label) is str:
+            return (_LABELED_POINT, lat, lng, sys.intern(label))
+    return pack(position, interned=True)
+
+
+def unpack(value: Any) -> Any:
+    kind = type(value)
+    if kind is tuple:
+        shape = value[0]
+        if shape[0] == TEXT:
+            return dict(zip(shape[1], value[1].split(SEPARATOR)))
+        return {key: unpack(v) for key, v in zip(shape[1], value[1:])}
+    if kind is list:
+        return [unpack(v) for v in value]
+    return value
+
+
+def _pack_entry(entry: Any) -> Any:
+    """A history entry with an epoch timestamp and interned strings"""
+    if type(entry) is not dict:
+        return pack(entry)
+    return (_shape(DICT, tuple(entry)), *[
+        stamp(v) if key == "timestamp" else pack(v, interned=True) for key, v in entry.items()
+    ])
+
+
+def _unpack_entry(entry: Any) -> Any:
+    if type(entry) is not tuple or entry[0][0] != DICT:
+        return unpack(entry)
+    return {
+        key: unstamp(v) if key == "timestamp" else unpack(v)
+        for key, v in zip(entry[0][1], entry[1:])
+    }
+
+
+def _pack_route(route: Any) -> Tuple[Any, Optional[tuple]]:
+    """Route points as packed coordinates plus labels, or as-is if irregular"""
+    if type(route) is not list or not route:
+        return pack(route, interned=True), None
+    keys = tuple(route[0]) if type(route[0]) is dict else None
+    if keys not in (POINT_KEYS, LABELED_POINT_KEYS):
+        return pack(route, interned=True), None
+    labeled = len(keys) == 3
+    coords = array("d")
+    labels = []
+    for point in route:
+        if type(point) is not dict or tuple(point) != keys:
+            return pack(route, interned=True), None
+        lat, lng = point["lat"], point["lng"]
+        if type(lat) is not float or type(lng) is not float:
+            return pack(route, interned=True), None
+        coords.append(lat)
+        coords.append(lng)
+        if labeled:
+            labels.append(_intern(point["label"]))
+    return coords, tuple(labels) if labeled else None
+
+
+def _unpack_route(route: Any, labels: Optional[tuple]) -> Any:
+    if type(route) is not array:
+        return unpack(route)
+    if labels is None:
+        return [{"lat": route[i], "lng": route[i + 1]} for i in range(0, len(route), 2)]
+    return [
+        {"lat": route[2 * i], "lng": route[2 * i + 1], "label": label}
+        for i, label in enumerate(labels)
+    ]
+
+
+class ParcelRecord:
+    """One parcel in compact form"""
+
+    __slots__ = (
+        "id", "sender", "receiver", "details", "status", "mode", "history", "route",
+        "route_labels", "position", "eta", "created", "cost", "progress", "updated", "extra",
+    )
+
+    @classmethod
+    def from_dict(cls, parcel: Dict) -> "ParcelRecord":
+        get = parcel.get
+        record = cls()
+        record.id = parcel["id"]
+        record.sender = pack(get("sender", MISSING))
+        record.receiver = pack(get("receiver", MISSING))
+        record.details = pack(get("parcelDetails", MISSING))
+        record.status = _intern(get("status", MISSING))
+        record.mode = _intern(get("mode", MISSING))
+        # A history or createdAt of an unusual type is kept with the extra keys
+        history = get("history")
+        record.history = tuple(map(_pack_entry, history)) if type(history) is list else MISSING
+        record.route, record.route_labels = _pack_route(get("route", MISSING))
+        record.position = pack_position(get("currentPosition", MISSING))
+        record.eta = stamp(get("eta", MISSING))
+        # createdAt stays a string: it is the sort key of the storage indexes
+        created = get("createdAt")
+        record.created = (created, record.id) if type(created) is str else MISSING
+        record.cost = get("estimatedCost", MISSING)
+        record.progress = get("progress", MISSING)
+        record.updated = stamp(get("updatedAt", MISSING))
+        extra = {
+            key: value for key, value in parcel.items()
+            if key not in FIELDS
+            or (key == "history" and record.history is MISSING)
+            or (key == "createdAt" and record.created is MISSING)
+        }
+        record.extra = pack(extra) if extra else None
+        return record
+
+    def row(self) -> tuple:
+        """Slot values as a plain tuple, e.g. for pickling into a snapshot"""
+        return _slot_values(self)
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "ParcelRecord":
+        record = cls()
+        (
+            record.id, record.sender, record.receiver, record.details, record.status, record.mode,
+            record.history, record.route, record.route_labels, record.position, record.eta,
+            record.created, record.cost, record.progress, record.updated, record.extra,
+        ) = row
+        record.status = _intern(record.status)
+        record.mode = _intern(record.mode)
+        return record
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        """(createdAt, id), the order parcels are listed in"""
+        created = self.created
+        return created if created is not MISSING else ("", self.id)
+
+    def index_entry(self) -> Tuple[Tuple[str, str], Optional[str], Optional[str]]:
+        return (
+            self.key,
+            None if self.status is MISSING else self.status,
+            None if self.mode is MISSING else self.mode,
+        )
+
+    def to_dict(self) -> Dict:
+        created = self.created
+        history = self.history
+        values = (
+            self.id,
+            unpack(self.sender),
+            unpack(self.receiver),
+            unpack(self.details),
+            self.status,
+            self.mode,
+            list(map(_unpack_entry, history)) if history is not MISSING else MISSING,
+            _unpack_route(self.route, self.route_labels),
+            unpack(self.position),
+            unstamp(self.eta),
+            created[0] if created is not MISSING else MISSING,
+            self.cost,
+            self.progress,
+            unstamp(self.updated),
+        )
+        parcel = {key: value for key, value in zip(FIELDS, values) if value is not MISSING}
+        if self.extra is not None:
+            parcel.update(unpack(self.extra))
+        return parcel
+
+    def set_position(self, position: Dict, progress: float, updated: Any) -> None:
+        """Move the parcel; `updated` is `stamp(updatedAt)`, computed once per batch"""
+        self.position = pack_position(position)
+        self.progress = progress
+        self.updated = updated
+
+
+_slot_values = attrgetter(*ParcelRecord.__slots__)
+
+
+def set_positions(
+    records: Dict[str, ParcelRecord],
+    parcel_ids: List[str],
+    positions: List[Dict],
+    progress: List[float],
+    updated_at: str,
+) -> None:
+    """Move many parcels at once, e.g. for a simulation tick; unknown ids are skipped
+
+    The timestamp is converted once for the batch and the simulator's
+    {lat, lng, label} points are packed inline, since this runs for every
+    moving parcel on every tick.
+    """
+    updated = stamp(updated_at)
+    get = records.get
+    for parcel_id, position, pct in zip(parcel_ids, positions, progress):
+        record = get(parcel_id)
+        if record is None:
+            continue
+        if type(position) is dict and tuple(position) == LABELED_POINT_KEYS:
+            lat, lng, label = position.values()
+            if type(lat) is float and type(lng) is float and type(label) is str:
+                record.position = (_LABELED_POINT, lat, lng, sys.intern(label))
+            else:
+                record.position = pack(position, interned=True)
+        else:
+            record.position = pack(position, interned=True)
+        record.progress = pct
+        record.updated = updated
@@ -0,0 +1,245 @@
+"""Offline routing over a hub/road graph.
+
+The graph is loaded from local files (hubs and roads as CSV, or a single
+GeoJSON FeatureCollection). Shortest paths between hubs are found with A*
+using the great-circle distance as heuristic, and memoized per
+(origin hub, destination hub) pair, so repeated lanes are a dict lookup.
+Arbitrary coordinates are snapped to their nearest hub through a grid
+index.
+"""
+import csv
+import heapq
+import json
+import math
+import re
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+# Roads are never straight; used when an edge has no explicit distance
+ROAD_FACTOR = 1.2
+# Grid rings searched around a point before scanning every hub
+MAX_RINGS = 8
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def route_length_km(points: List[Dict]) -> float:
+    """Great-circle length of a route through its points"""
+    return sum(
+        haversine_km(a["lat"], a["lng"], b["lat"], b["lng"])
+        for a, b in zip(points, points[1:])
+    )
+
+
+def normalize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class Hub(NamedTuple):
+    id: str
+    name: str
+    lat: float
+    lng: float
+
+    def point(self) -> Dict:
+        return {"lat": self.lat, "lng": self.lng, "label": self.name}
+
+
+class RoutingEngine:
+    """Hub graph with cached A* shortest paths and a nearest-hub grid index"""
+
+    def __init__(
+        self,
+        hubs: Iterable[Hub],
+        roads: Iterable[Tuple[str, str, Optional[float]]],
+        cache_size: int = 4096,
+        cell_degrees: float = 1.0,
+    ):
+        self.hubs: Dict[str, Hub] = {hub.id: hub for hub in hubs}
+        self.edges: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        for origin, destination, distance in roads:
+            if origin not in self.hubs or destination not in self.hubs:
+                raise ValueError(f"Road {origin}-{destination} references an unknown hub")
+            if distance is None:
+                a, b = self.hubs[origin], self.hubs[destination]
+                distance = haversine_km(a.lat, a.lng, b.lat, b.lng) * ROAD_FACTOR
+            self.edges[origin].append((destination, distance))
+            self.edges[destination].append((origin, distance))
+
+        # Nearest-hub grid: hubs bucketed by (lat, lng) cell
+        self.cell_degrees = cell_degrees
+        self._grid: Dict[Tuple[int, int], List[Hub]] = defaultdict(list)
+        for hub in self.hubs.values():
+            self._grid[self._cell(hub.lat, hub.lng)].append(hub)
+
+        # Hub lookup by city name tokens, e.g. ("san", "francisco") -> hubs
+        self._names: Dict[str, List[Tuple[Tuple[str, ...], Optional[str], Hub]]] = defaultdict(list)
+        for hub in self.hubs.values():
+            city, _, region = hub.name.partition(",")
+            tokens = tuple(normalize(city))
+            if tokens:
+                self._names[tokens[0]].append((tokens, region.strip().lower() or None, hub))
+
+        self.shortest_path = lru_cache(maxsize=cache_size)(self._shortest_path)
+
+    @classmethod
+    def from_csv(cls, hubs_path: str, roads_path: str, **kwargs) -> "RoutingEngine":
+        """Load hubs (id,name,lat,lng) and roads (from,to[,distance_km]) from CSV files"""
+        with open(hubs_path, newline="") as f:
+            hubs = [Hub(row["id"], row["name"], float(row["lat"]), float(row["lng"])) for row in csv.DictReader(f)]
+        with open(roads_path, newline="") as f:
+            roads = [
+                (row["from"], row["to"], float(row["distance_km"]) if row.get("distance_km") else None)
+                for row in csv.DictReader(f)
+            ]
+        return cls(hubs, roads, **kwargs)
+
+    @classmethod
+    def from_geojson(cls, path: str, **kwargs) -> "RoutingEngine":
+        """Load a FeatureCollection of hub Points (id, name) and road LineStrings (from, to[, distance_km])"""
+        with open(path) as f:
+            features = json.load(f)["features"]
+        hubs, roads = [], []
+        for feature in features:
+            props = feature.get("properties") or {}
+            geometry = feature["geometry"]
+            if geometry["type"] == "Point":
+                lng, lat = geometry["coordinates"][:2]
+                hubs.append(Hub(str(props["id"]), props.get("name") or str(props["id"]), float(lat), float(lng)))
+            elif geometry["type"] == "LineString":
+                distance = props.get("distance_km")
+                roads.append((str(props["from"]), str(props["to"]), float(distance) if distance else None))
+        return cls(hubs, roads, **kwargs)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def nearest_hub(self, lat: float, lng: float) -> Optional[Hub]:
+        """Closest hub by great-circle distance, searching grid rings outwards"""
+        if not self.hubs:
+            return None
+        row, col = self._cell(lat, lng)
+        best, best_km = None, math.inf
+        for ring in range(MAX_RINGS + 1):
+            for r in range(row - ring, row + ring + 1):
+                # Only the border of the square; inner cells were searched by earlier rings
+                step = 1 if ring == 0 or r in (row - ring, row + ring) else 2 * ring
+                for c in range(col - ring, col + ring + 1, step):
+                    for hub in self._grid.get((r, c), ()):
+                        km = haversine_km(lat, lng, hub.lat, hub.lng)
+                        if km < best_km:
+                            best, best_km = hub, km
+            if best is not None:
+                # Unsearched cells are more than `ring` cells away in latitude or longitude
+                reach = ring * self.cell_degrees * 111.0 * math.cos(
+                    math.radians(min(abs(lat) + (ring + 1) * self.cell_degrees, 89.0))
+                )
+                if best_km <= reach:
+                    return best
+        # Far from every hub: fall back to a full scan
+        return min(self.hubs.values(), key=lambda hub: haversine_km(lat, lng, hub.lat, hub.lng))
+
+    def find_hub(self, address: str) -> Optional[Hub]:
+        """Hub whose city name appears in an address, preferring a matching state"""
+        tokens = normalize(address)
+        matches = []
+        for i, token in enumerate(tokens):
+            for name, region, hub in self._names.get(token, ()):
+                if tuple(tokens[i:i + len(name)]) == name:
+                    matches.append((region is not None and region in tokens[i + len(name):], len(name), hub))
+        if not matches:
+            return None
+        return max(matches, key=lambda match: (match[0], match[1]))[2]
+
+    def _shortest_path(self, origin: str, destination: str) -> Optional[Tuple[str, ...]]:
+        """A* over the road graph; returns hub ids from origin to destination"""
+        if origin == destination:
+            return (origin,)
+        goal = self.hubs[destination]
+        hubs = self.hubs
+
+        def heuristic(hub_id: str) -> float:
+            hub = hubs[hub_id]
+            return haversine_km(hub.lat, hub.lng, goal.lat, goal.lng)
+
+        best = {origin: 0.0}
+        previous: Dict[str, str] = {}
+        frontier = [(heuristic(origin), 0.0, origin)]
+        while frontier:
+            _, cost, current = heapq.heappop(frontier)
+            if current == destination:
+                path = [current]
+                while current in previous:
+                    current = previous[current]
+                    path.append(current)
+                return tuple(reversed(path))
+            if cost > best.get(current, math.inf):
+                continue
+            for neighbour, distance in self.edges.get(current, ()):
+                new_cost = cost + distance
+                if new_cost < best.get(neighbour, math.inf):
+                    best[neighbour] = new_cost
+                    previous[neighbour] = current
+                    heapq.heappush(frontier, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None
+
+    def route_between_hubs(self, origin: Hub, destination: Hub) -> Optional[List[Dict]]:
+        path = self.shortest_path(origin.id, destination.id)
+        if path is None:
+            return None
+        return [self.hubs[hub_id].point() for hub_id in path]
+
+    def route_between_points(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        origin_label: Optional[str] = None,
+        destination_label: Optional[str] = None,
+    ) -> Optional[List[Dict]]:
+        """Route between coordinates: to the nearest hub, across the network, and out again"""
+        origin_hub = self.nearest_hub(*origin)
+        destination_hub = self.nearest_hub(*destination)
+        if origin_hub is None or destination_hub is None:
+            return None
+        route = self.route_between_hubs(origin_hub, destination_hub)
+        if route is None:
+            return None
+        start = {"lat": origin[0], "lng": origin[1], "label": origin_label or "Origin"}
+        end = {"lat": destination[0], "lng": destination[1], "label": destination_label or "Destination"}
+        # Skip the first/last mile when the address is practically at the hub
+        if haversine_km(*origin, origin_hub.lat, origin_hub.lng) > 1.0:
+            route.insert(0, start)
+        if haversine_km(*destination, destination_hub.lat, destination_hub.lng) > 1.0:
+            route.append(end)
+        return route
+
+    def route_between_addresses(self, sender_address: str, receiver_address: str) -> Optional[List[Dict]]:
+        """Route between the hubs named in two addresses, or None if either is unknown"""
+        origin = self.find_hub(sender_address)
+        destination = self.find_hub(receiver_address)
+        if origin is None or destination is None:
+            return None
+        return self.route_between_hubs(origin, destination)
+
+    def stats(self) -> Dict:
+        info = self.shortest_path.cache_info()
+        return {
+            "hubs": len(self.hubs),
+            "roads": sum(len(edges) for edges in self.edges.values()) // 2,
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "cache_size": info.currsize,
+        }
+
+
+def load_routing_engine(path: str, roads_path: Optional[str] = None, **kwargs) -> RoutingEngine:
+    """Load a GeoJSON graph, or a hubs CSV plus roads CSV"""
+    if path.endswith((".geojson", ".json")):
+        return RoutingEngine.from_geojson(path, **kwargs)
+    return RoutingEngine.from_csv(path, roads_path, **kwargs)
@@ -0,0 +1,300 @@
+"""In-memory inverted index over parcels and contact messages.
+
+Every indexed document gets an increasing document number. A posting is
+`docnum << 2 | field_class` stored in a compact `array('I')` per token, so
+postings are always sorted by document and can be intersected with
+NumPy searchsorted calls, starting from the rarest token. Updates append
+a new document number and retire the old one; retired postings are
+filtered at query time and dropped by an occasional compaction.
+Tracking IDs are kept in a sorted list for prefix lookups. Contact
+messages can be capped to the most recent `max_contacts`, so a flood of
+messages does not grow the index without bound.
+"""
+import gc
+import math
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Field classes and their ranking weight
+NAME, CONTACT, ADDRESS, TEXT = 0, 1, 2, 3
+FIELD_WEIGHTS = np.array([3.0, 3.0, 1.5, 1.0])
+
+# Fields indexed per document kind, highest weight first
+PARCEL_FIELDS = (
+    (("sender", "name"), NAME),
+    (("receiver", "name"), NAME),
+    (("sender", "email"), CONTACT),
+    (("receiver", "email"), CONTACT),
+    (("sender", "phone"), CONTACT),
+    (("receiver", "phone"), CONTACT),
+    (("sender", "address"), ADDRESS),
+    (("receiver", "address"), ADDRESS),
+    (("parcelDetails", "description"), TEXT),
+)
+CONTACT_FIELDS = (
+    (("name",), NAME),
+    (("email",), CONTACT),
+    (("message",), TEXT),
+)
+KINDS = ("parcel", "contact")
+ID_MATCH_SCORE = 100.0
+MIN_ID_PREFIX = 6
+
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+def _field(record: Dict, path: Tuple[str, ...]) -> str:
+    for key in path:
+        if not isinstance(record, dict):
+            return ""
+        record = record.get(key)
+    return record if isinstance(record, str) else ""
+
+
+class SearchIndex:
+    """Ranked token search with incremental add/update/remove"""
+
+    def __init__(self, max_contacts: Optional[int] = None):
+        self.max_contacts = max_contacts
+        # Indexed contact message ids, oldest first, so the oldest can be dropped
+        self._contacts: Deque[str] = deque()
+        self._postings: Dict[str, array] = {}
+        # (kind, id) -> (docnum, indexed text) for the live version of each document
+        self._docs: Dict[Tuple[str, str], Tuple[int, str]] = {}
+        self._keys: List[Optional[Tuple[str, str]]] = []
+        self._alive = bytearray()
+        self._kinds = bytearray()
+        self._dead = 0
+        # (upper-cased tracking ID, id) and (its part after the first "-", id), for prefix queries
+        self._ids: List[Tuple[str, str]] = []
+        self._id_suffixes: List[Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add_parcel(self, parcel: Dict) -> None:
+        if self._add("parcel", parcel["id"], [(_field(parcel, path), cls) for path, cls in PARCEL_FIELDS]):
+            self._index_id(parcel["id"])
+
+    def add_parcels(self, parcels: Iterable[Dict]) -> None:
+        """Index many parcels, sorting the tracking ID lists once at the end"""
+        # Indexing allocates millions of small objects that all stay alive;
+        # collecting in between only rescans them
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            added = [
+                parcel["id"] for parcel in parcels
+                if self._add("parcel", parcel["id"], [(_field(parcel, path), cls) for path, cls in PARCEL_FIELDS])
+            ]
+        finally:
+            if collecting:
+                gc.enable()
+        if added:
+            for keys, new in zip((self._ids, self._id_suffixes), zip(*map(self._id_keys, added))):
+                keys.extend(new)
+                keys.sort()
+
+    def add_contact(self, message: Dict) -> None:
+        """Index a contact message; beyond `max_contacts`, the oldest indexed one is dropped"""
+        new = ("contact", message["id"]) not in self._docs
+        self._add("contact", message["id"], [(_field(message, path), cls) for path, cls in CONTACT_FIELDS])
+        if new:
+            self._contacts.append(message["id"])
+            while self.max_contacts is not None and len(self._contacts) > self.max_contacts:
+                self.remove("contact", self._contacts.popleft())
+
+    def remove(self, kind: str, doc_id: str) -> bool:
+        entry = self._docs.pop((kind, doc_id), None)
+        if entry is None:
+            return False
+        docnum = entry[0]
+        self._alive[docnum] = 0
+        self._keys[docnum] = None
+        self._dead += 1
+        if kind == "parcel":
+            self._unindex_id(doc_id)
+        if self._dead > max(10000, len(self._docs)):
+            self.compact()
+        return True
+
+    def _add(self, kind: str, doc_id: str, fields: List[Tuple[str, int]]) -> bool:
+        """Index a document version; returns False if its searchable text is unchanged"""
+        text = "\x1f".join(value for value, _ in fields)
+        key = (kind, doc_id)
+        old = self._docs.get(key)
+        if old is not None:
+            if old[1] == text:
+                return False
+            self.remove(kind, doc_id)
+
+        docnum = len(self._keys)
+        self._keys.append(key)
+        self._alive.append(1)
+        self._kinds.append(KINDS.index(kind))
+        self._docs[key] = (docnum, text)
+        # One posting per token, tagged with the best field it appears in
+        classes: Dict[str, int] = {}
+        for value, cls in fields:
+            if value:
+                for token in TOKEN.findall(value.lower()):
+                    classes.setdefault(token, cls)
+        postings = self._postings
+        base = docnum << 2
+        for token, cls in classes.items():
+            posting = postings.get(token)
+            if posting is None:
+                posting = postings[token] = array("I")
+            posting.append(base | cls)
+        return True
+
+    def _id_keys(self, doc_id: str) -> Tuple[Tuple[str, str], Tuple[str, str]]:
+        upper = doc_id.upper()
+        return (upper, doc_id), (upper.split("-", 1)[-1], doc_id)
+
+    def _index_id(self, doc_id: str) -> None:
+        full, suffix = self._id_keys(doc_id)
+        insort(self._ids, full)
+        insort(self._id_suffixes, suffix)
+
+    def _unindex_id(self, doc_id: str) -> None:
+        for keys, key in zip((self._ids, self._id_suffixes), self._id_keys(doc_id)):
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    def compact(self) -> None:
+        """Drop postings of retired documents"""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        for token in list(self._postings):
+            postings = np.frombuffer(self._postings[token], dtype=np.uint32)
+            kept = postings[alive[postings >> 2]]
+            if len(kept) == 0:
+                del self._postings[token]
+            elif len(kept) < len(postings):
+                self._postings[token] = array("I", kept.tobytes())
+        self._dead = 0
+
+    def _id_matches(self, term: str, limit: int) -> List[int]:
+        """Document numbers of parcels whose tracking ID, or its part after the prefix, starts with term"""
+        prefix = term.upper()
+        docs = []
+        for keys in (self._ids, self._id_suffixes):
+            i = bisect_left(keys, (prefix, ""))
+            while i < len(keys) and keys[i][0].startswith(prefix) and len(docs) < limit:
+                docs.append(self._docs[("parcel", keys[i][1])][0])
+                i += 1
+        return docs
+
+    def search(
+        self,
+        query: str,
+        kind: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[int, List[Tuple[str, str, float]]]:
+        """Ranked matches for every token in the query; returns (total, page of (kind, id, score))"""
+        raw_terms = query.split()
+        id_docs: List[int] = []
+        text_terms: List[str] = []
+        for raw in raw_terms:
+            # Terms with a digit may be tracking ID prefixes, e.g. "SWIFT-2862" or "286293"
+            if len(raw) >= MIN_ID_PREFIX and any(ch.isdigit() for ch in raw):
+                matches = self._id_matches(raw, 1000)
+                if matches:
+                    id_docs.extend(matches)
+                    continue
+            text_terms.extend(tokenize(raw))
+
+        docs = np.empty(0, dtype=np.int64)
+        scores = np.empty(0)
+        if text_terms:
+            docs, scores = self._match_terms(sorted(set(text_terms)))
+        if id_docs:
+            id_array = np.unique(np.array(id_docs, dtype=np.int64))
+            if text_terms:
+                # ID prefix and text together: keep text matches that also match the ID
+                keep = np.isin(docs, id_array)
+                docs, scores = docs[keep], scores[keep] + ID_MATCH_SCORE
+            else:
+                docs, scores = id_array, np.full(len(id_array), ID_MATCH_SCORE)
+
+        if len(docs):
+            alive = np.frombuffer(self._alive, dtype=np.uint8)[docs].astype(bool)
+            if kind is not None:
+                kinds = np.frombuffer(self._kinds, dtype=np.uint8)[docs]
+                alive &= kinds == KINDS.index(kind)
+            docs, scores = docs[alive], scores[alive]
+
+        total = len(docs)
+        if total == 0 or offset >= total:
+            return total, []
+        # Best score first, newest document first among equals. Candidates are
+        # in document order, so the newest ties are the last ones.
+        end = min(offset + limit, total)
+        if end < total:
+            kth = np.partition(scores, total - end)[total - end]
+            above = np.flatnonzero(scores > kth)
+            ties = np.flatnonzero(scores == kth)[len(above) - end:]
+            top = np.concatenate((above, ties))
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((-docs, -scores))[offset:end]
+        return total, [
+            (*self._keys[doc], round(score, 3))
+            for doc, score in zip(docs[order].tolist(), scores[order].tolist())
+        ]
+
+    def _match_terms(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Documents containing every term, with summed field-weighted idf scores"""
+        lists = []
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            lists.append(np.frombuffer(posting, dtype=np.uint32))
+        lists.sort(key=len)
+        live = max(len(self._docs), 1)
+
+        rarest = lists[0]
+        docs = (rarest >> 2).astype(np.int64)
+        scores = FIELD_WEIGHTS[rarest & 3] * math.log(1 + live / len(rarest))
+
+        for postings in lists[1:]:
+            if not len(docs):
+                break
+            # Postings are sorted by document, so this finds each candidate's
+            # posting without decoding the whole list
+            at = np.minimum(np.searchsorted(postings, (docs << 2).astype(np.uint32)), len(postings) - 1)
+            found = postings[at]
+            present = (found >> 2) == docs
+            idf = math.log(1 + live / len(postings))
+            docs = docs[present]
+            scores = scores[present] + FIELD_WEIGHTS[found[present] & 3] * idf
+        return docs, scores
+
+    def stats(self) -> Dict:
+        return {
+            "documents": len(self._docs),
+            "contacts": len(self._contacts),
+            "tokens": len(self._postings),
+            "retired": self._dead,
+        }
+
+
+def build_index(parcels: Iterable[Dict], contacts: Iterable[Dict]) -> SearchIndex:
+    index = SearchIndex()
+    for parcel in parcels:
+        index.add_parcel(parcel)
+    for message in contacts:
+        index.add_contact(message)
+    return index
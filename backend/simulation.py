@@ -0,0 +1,253 @@
+"""Server-side movement simulation for parcels in auto mode.
+
+Every in-transit auto parcel is advanced along its route by one periodic
+task. The routes of all active parcels are packed into flat NumPy arrays
+(rebuilt only when the active set changes), so a tick is a handful of
+vectorized operations followed by one batched write of the new positions.
+"""
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from routing import haversine_km as route_distance_km
+from storage import Storage, StorageError
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; works elementwise on arrays"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def route_progress(lats: List[float], lngs: List[float], position: Optional[Dict]) -> float:
+    """Percentage of a route travelled at the route point nearest to a position
+
+    Each segment is projected onto locally (latitudes scaled by the cosine
+    of the mean latitude), which is close enough at road-segment lengths.
+    A missing position counts as the origin.
+    """
+    if not isinstance(position, dict) or position.get("lat") is None or position.get("lng") is None:
+        return 0.0
+    scale = math.cos(math.radians(sum(lats) / len(lats)))
+    px, py = float(position["lng"]) * scale, float(position["lat"])
+    travelled = total = 0.0
+    best = math.inf
+    for i in range(len(lats) - 1):
+        length = route_distance_km(lats[i], lngs[i], lats[i + 1], lngs[i + 1])
+        ax, ay = lngs[i] * scale, lats[i]
+        dx, dy = lngs[i + 1] * scale - ax, lats[i + 1] - ay
+        squared = dx * dx + dy * dy
+        t = min(1.0, max(0.0, ((px - ax) * dx + (py - ay) * dy) / squared)) if squared > 0 else 0.0
+        distance = (ax + t * dx - px) ** 2 + (ay + t * dy - py) ** 2
+        if distance < best:
+            best, travelled = distance, total + t * length
+        total += length
+    return min(100.0, travelled / total * 100.0) if total > 0 else 0.0
+
+
+def is_simulated(parcel: Dict) -> bool:
+    return (
+        parcel.get("mode") == "auto"
+        and parcel.get("status") == "in-transit"
+        and len(parcel.get("route") or []) > 1
+    )
+
+
+class MovementSimulator:
+    """Advances all in-transit auto parcels along their routes in one batch per tick"""
+
+    def __init__(
+        self,
+        storage: Storage,
+        interval: float = 10.0,
+        speed_kmh: float = 80.0,
+        time_scale: float = 60.0,
+        on_tick: Optional[Callable[[List[str], List[Dict], List[float], str], Awaitable[None]]] = None,
+    ):
+        self.storage = storage
+        self.interval = interval
+        self.speed_kmh = speed_kmh
+        self.time_scale = time_scale
+        self.on_tick = on_tick
+        self._task: Optional[asyncio.Task] = None
+        # id -> (lats, lngs, labels, progress) for every simulated parcel
+        self._routes: Dict[str, tuple] = {}
+        self._changed: set = set()
+        self._dirty = True
+        self._ids: List[str] = []
+        self.ticks = 0
+        self.moved = 0
+        self.last_tick_ms = 0.0
+
+    @property
+    def active(self) -> int:
+        return len(self._routes)
+
+    def track(self, parcel: Dict) -> None:
+        """Start, refresh or stop simulating a parcel after it was written"""
+        if not is_simulated(parcel):
+            self.forget(parcel["id"])
+            return
+        route = parcel["route"]
+        lats = [float(point["lat"]) for point in route]
+        lngs = [float(point["lng"]) for point in route]
+        # The stored progress follows the status (in-transit is 60%), not the
+        # route, so resume from where the parcel actually is
+        self._routes[parcel["id"]] = (
+            lats,
+            lngs,
+            [point.get("label") for point in route],
+            route_progress(lats, lngs, parcel.get("currentPosition")),
+        )
+        self._changed.add(parcel["id"])
+        self._dirty = True
+
+    def forget(self, parcel_id: str) -> None:
+        if self._routes.pop(parcel_id, None) is not None:
+            self._dirty = True
+
+    async def load(self, page_size: int = 1000) -> None:
+        """Register the parcels that are already in transit in storage"""
+        after = None
+        while True:
+            page = await self.storage.query_parcels(
+                status="in-transit", mode="auto", after=after, descending=False, limit=page_size
+            )
+            for parcel in page:
+                try:
+                    self.track(parcel)
+                except (KeyError, TypeError, ValueError) as e:
+                    # One malformed stored route must not stop the simulation starting
+                    print(f"Not simulating parcel {parcel.get('id')}: invalid route ({e})")
+            if len(page) < page_size:
+                return
+            after = (page[-1].get("createdAt") or "", page[-1]["id"])
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "ticks": self.ticks,
+            "moved": self.moved,
+            "last_tick_ms": round(self.last_tick_ms, 2),
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except StorageError as e:
+                print(f"Simulation tick failed: {e}")
+
+    def _pack(self) -> None:
+        """Flatten the active routes into arrays with cumulative distances"""
+        # Keep progress computed by earlier ticks unless the parcel was rewritten since
+        if self._ids:
+            for i, parcel_id in enumerate(self._ids):
+                entry = self._routes.get(parcel_id)
+                if entry is not None and parcel_id not in self._changed:
+                    self._routes[parcel_id] = entry[:3] + (float(self._progress[i]),)
+        self._changed.clear()
+
+        self._ids = list(self._routes)
+        if not self._ids:
+            self._progress = np.empty(0)
+            self._dirty = False
+            return
+        entries = [self._routes[parcel_id] for parcel_id in self._ids]
+        counts = np.array([len(entry[0]) for entry in entries], dtype=np.int64)
+        self._starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self._ends = self._starts + counts - 1
+        self._lat = np.fromiter((lat for entry in entries for lat in entry[0]), dtype=np.float64, count=int(counts.sum()))
+        self._lng = np.fromiter((lng for entry in entries for lng in entry[1]), dtype=np.float64, count=int(counts.sum()))
+        self._labels = [label for entry in entries for label in entry[2]]
+        self._progress = np.array([entry[3] for entry in entries], dtype=np.float64)
+
+        # Segment lengths, zeroed where one route ends and the next begins
+        segments = np.zeros(len(self._lat))
+        if len(self._lat) > 1:
+            segments[1:] = haversine_km(self._lat[:-1], self._lng[:-1], self._lat[1:], self._lng[1:])
+        segments[self._starts] = 0.0
+        cumulative = np.cumsum(segments)
+        self._route_offset = cumulative[self._starts]
+        self._total = cumulative[self._ends] - self._route_offset
+        # Globally increasing distance key: route r's points sit in
+        # [offset_r + r, offset_r + r + total_r], so one searchsorted call
+        # finds the current segment of every parcel at once
+        self._key = cumulative + np.repeat(np.arange(len(self._ids), dtype=np.float64), counts)
+        self._key_offset = self._route_offset + np.arange(len(self._ids), dtype=np.float64)
+        self._dirty = False
+
+    def advance(self, hours: float) -> np.ndarray:
+        """Move every active parcel `hours` of simulated time; returns indices that moved"""
+        if self._dirty:
+            self._pack()
+        if not self._ids:
+            return np.empty(0, dtype=np.int64)
+
+        moving = self._progress < 100.0
+        travelled = self._progress / 100.0 * self._total + self.speed_kmh * hours
+        travelled = np.minimum(travelled, self._total)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            progress = np.where(self._total > 0, travelled / self._total * 100.0, 100.0)
+
+        target = travelled + self._key_offset
+        segment = np.searchsorted(self._key, target, side="right") - 1
+        segment = np.clip(segment, self._starts, np.maximum(self._ends - 1, self._starts))
+        span = self._key[segment + 1] - self._key[segment]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip(np.where(span > 0, (target - self._key[segment]) / span, 1.0), 0.0, 1.0)
+        self._lat_now = self._lat[segment] + t * (self._lat[segment + 1] - self._lat[segment])
+        self._lng_now = self._lng[segment] + t * (self._lng[segment + 1] - self._lng[segment])
+        self._segment = segment
+        self._progress = np.where(moving, progress, self._progress)
+        return np.flatnonzero(moving)
+
+    async def tick(self) -> List[str]:
+        """Advance all parcels by one interval and write the new positions in one batch.
+
+        Returns the ids of the parcels that moved.
+        """
+        started = time.perf_counter()
+        moved = self.advance(self.interval * self.time_scale / 3600.0)
+        if not len(moved):
+            self.last_tick_ms = (time.perf_counter() - started) * 1000
+            return []
+
+        now = datetime.utcnow().isoformat()
+        labels = self._labels
+        ids = [self._ids[i] for i in moved.tolist()]
+        positions = [
+            {"lat": lat, "lng": lng, "label": labels[segment]}
+            for lat, lng, segment in zip(
+                np.round(self._lat_now[moved], 6).tolist(),
+                np.round(self._lng_now[moved], 6).tolist(),
+                self._segment[moved].tolist(),
+            )
+        ]
+        progress = np.round(self._progress[moved], 2).tolist()
+        await self.storage.update_positions(ids, positions, progress, now)
+
+        self.ticks += 1
+        self.moved += len(ids)
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        if self.on_tick:
+            await self.on_tick(ids, positions, progress, now)
+        return ids
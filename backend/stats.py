@@ -0,0 +1,147 @@
+"""Materialized dashboard aggregates.
+
+Counts, revenue, per-day activity and stage durations are kept as running
+totals. Each parcel's last contribution is remembered, so recording a
+write only subtracts the old contribution and adds the new one, however
+many parcels there are. Revenue is summed in integer cents and durations
+in whole seconds, so incremental totals match a rebuild exactly.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+
+class Contribution(NamedTuple):
+    status: Optional[str]
+    mode: Optional[str]
+    cents: int
+    created_day: Optional[str]
+    delivered_day: Optional[str]
+    # (("from-stage", "to-stage"), seconds) for consecutive history entries
+    transitions: Tuple[Tuple[Tuple[str, str], int], ...]
+
+
+def _seconds_between(start: str, end: str) -> Optional[int]:
+    try:
+        return round((datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def contribution(parcel: Dict) -> Contribution:
+    history = parcel.get("history") or []
+    transitions = []
+    delivered_day = None
+    previous = None
+    for i, entry in enumerate(history):
+        # The first entry is the free-text scheduling note
+        stage = "pending" if i == 0 else entry.get("status")
+        timestamp = entry.get("timestamp")
+        if stage == "delivered" and delivered_day is None and timestamp:
+            delivered_day = timestamp[:10]
+        if previous is not None and stage:
+            seconds = _seconds_between(previous[1], timestamp)
+            if seconds is not None:
+                transitions.append(((previous[0], stage), seconds))
+        if stage:
+            previous = (stage, timestamp)
+    return Contribution(
+        parcel.get("status"),
+        parcel.get("mode"),
+        round(float(parcel.get("estimatedCost") or 0) * 100),
+        (parcel.get("createdAt") or "")[:10] or None,
+        delivered_day,
+        tuple(transitions),
+    )
+
+
+def _bump(counter: Counter, key, amount: int) -> None:
+    counter[key] += amount
+    if not counter[key]:
+        del counter[key]
+
+
+class DashboardStats:
+    """Running aggregates over all parcels, updated per write"""
+
+    def __init__(self):
+        self.by_status: Counter = Counter()
+        self.by_mode: Counter = Counter()
+        self.cents_by_status: Counter = Counter()
+        self.created_per_day: Counter = Counter()
+        self.delivered_per_day: Counter = Counter()
+        self.stage_seconds: Counter = Counter()
+        self.stage_count: Counter = Counter()
+        self._parcels: Dict[str, Contribution] = {}
+        self.rebuilt_at: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._parcels)
+
+    def record(self, parcel: Dict) -> None:
+        """Account for a created or updated parcel"""
+        new = contribution(parcel)
+        old = self._parcels.get(parcel["id"])
+        if old == new:
+            return
+        if old is not None:
+            self._apply(old, -1)
+        self._apply(new, 1)
+        self._parcels[parcel["id"]] = new
+
+    def record_many(self, parcels: Iterable[Dict]) -> None:
+        for parcel in parcels:
+            self.record(parcel)
+
+    def remove(self, parcel_id: str) -> None:
+        old = self._parcels.pop(parcel_id, None)
+        if old is not None:
+            self._apply(old, -1)
+
+    def _apply(self, c: Contribution, sign: int) -> None:
+        _bump(self.by_status, c.status, sign)
+        _bump(self.by_mode, c.mode, sign)
+        _bump(self.cents_by_status, c.status, sign * c.cents)
+        if c.created_day:
+            _bump(self.created_per_day, c.created_day, sign)
+        if c.delivered_day:
+            _bump(self.delivered_per_day, c.delivered_day, sign)
+        for stages, seconds in c.transitions:
+            _bump(self.stage_count, stages, sign)
+            self.stage_seconds[stages] += sign * seconds
+            if not self.stage_count[stages]:
+                self.stage_seconds.pop(stages, None)
+
+    def snapshot(self) -> Dict:
+        """Raw totals, for comparing incremental state with a rebuild"""
+        return {
+            "by_status": dict(self.by_status),
+            "by_mode": dict(self.by_mode),
+            "cents_by_status": dict(self.cents_by_status),
+            "created_per_day": dict(self.created_per_day),
+            "delivered_per_day": dict(self.delivered_per_day),
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_count": dict(self.stage_count),
+        }
+
+    def summary(self, days: int = 30, today: Optional[date] = None) -> Dict:
+        since = ((today or datetime.utcnow().date()) - timedelta(days=days - 1)).isoformat()
+        return {
+            "total": len(self._parcels),
+            "byStatus": dict(self.by_status),
+            "byMode": dict(self.by_mode),
+            "revenue": {
+                "total": sum(self.cents_by_status.values()) / 100,
+                "byStatus": {status: cents / 100 for status, cents in self.cents_by_status.items()},
+            },
+            "createdPerDay": {day: n for day, n in sorted(self.created_per_day.items()) if day >= since},
+            "deliveredPerDay": {day: n for day, n in sorted(self.delivered_per_day.items()) if day >= since},
+            "stageDurations": {
+                f"{start}->{end}": {
+                    "count": count,
+                    "avgHours": round(self.stage_seconds[(start, end)] / count / 3600, 2),
+                }
+                for (start, end), count in sorted(self.stage_count.items())
+            },
+            "rebuiltAt": self.rebuilt_at,
+        }
@@ -0,0 +1,1575 @@
+"""Storage backends for parcels and contact messages.
+
+`MemoryStorage` keeps everything in process and is used for local runs and
+tests. `SQLiteStorage` keeps a WAL-mode SQLite file that several worker
+processes on one machine share. `PostgRESTStorage` talks to Supabase's
+REST interface with a pooled HTTP/2 client, so no call ever blocks the
+event loop.
+"""
+import asyncio
+import gc
+import os
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from changes import apply_patch, parcel_patch
+from inbox import ContactInbox
+from journal import Journal, read_segment, read_snapshot, write_snapshot
+from records import ParcelRecord, set_positions, stamp, unpack, unstamp
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class StorageError(Exception):
+    """Raised when a storage backend cannot complete a request"""
+
+
+class Storage:
+    """Repository interface shared by all storage backends"""
+
+    name = "base"
+    persistent = False
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_parcel(self, parcel_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    async def get_parcels(self, parcel_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch several parcels in one round trip, keyed by id; missing ids are left out"""
+        raise NotImplementedError
+
+    async def save_parcel(self, parcel: Dict) -> None:
+        """Insert or replace a parcel keyed by its id"""
+        raise NotImplementedError
+
+    async def save_parcels(self, parcels: List[Dict]) -> None:
+        """Insert or replace many parcels with as few round trips as possible"""
+        raise NotImplementedError
+
+    async def insert_parcels(self, parcels: List[Dict]) -> List[str]:
+        """Store new parcels without ever replacing a stored one.
+
+        Returns the ids that were already taken; those parcels are not
+        written. The default looks first and then saves, which is only safe
+        while this process is the only writer.
+        """
+        taken = await self.get_parcels([parcel["id"] for parcel in parcels])
+        await self.save_parcels([parcel for parcel in parcels if parcel["id"] not in taken])
+        return list(taken)
+
+    async def update_parcels(self, parcels: List[Dict], patches: List[Dict]) -> None:
+        """Write updates to parcels that are already stored.
+
+        `parcels` are the new versions and `patches` what changed in each
+        since it was read (see `changes.parcel_patch`). Backends that
+        serialize records write only the patches: changed fields, appended
+        history entries and replaced routes. The default saves the parcels.
+        """
+        await self.save_parcels(parcels)
+
+    async def delete_parcel(self, parcel_id: str) -> bool:
+        raise NotImplementedError
+
+    async def update_positions(
+        self,
+        parcel_ids: List[str],
+        positions: List[Dict],
+        progress: List[float],
+        updated_at: str,
+    ) -> None:
+        """Batch-write currentPosition and progress for existing parcels.
+
+        Takes parallel lists so that a simulation tick over many parcels
+        does not have to build a row dict per parcel for in-memory storage.
+        """
+        raise NotImplementedError
+
+    async def list_parcels(self) -> List[Dict]:
+        raise NotImplementedError
+
+    async def count_parcels(self) -> int:
+        raise NotImplementedError
+
+    async def query_parcels(
+        self,
+        status: Optional[str] = None,
+        mode: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        descending: bool = True,
+        limit: int = 50,
+        modified_since: Optional[str] = None,
+    ) -> List[Dict]:
+        """Return up to `limit` parcels ordered by (createdAt, id).
+
+        `created_from` is inclusive and `created_to` exclusive. `after` is the
+        (createdAt, id) key of the last parcel of the previous page.
+        `modified_since` keeps parcels whose updatedAt (or createdAt, if never
+        updated) is later than the given timestamp.
+        """
+        raise NotImplementedError
+
+    async def iter_parcels(self, page_size: int = 1000, **filters) -> AsyncIterator[List[Dict]]:
+        """Every matching parcel in (createdAt, id) order, one page at a time"""
+        after = None
+        while True:
+            page = await self.query_parcels(after=after, descending=False, limit=page_size, **filters)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1].get("createdAt") or "", page[-1]["id"])
+
+    async def add_contact(self, message: Dict) -> None:
+        raise NotImplementedError
+
+    async def list_contacts(self) -> List[Dict]:
+        raise NotImplementedError
+
+    async def get_contacts(self, message_ids: List[str]) -> Dict[str, Dict]:
+        """Fetch several contact messages in one round trip, keyed by id"""
+        raise NotImplementedError
+
+    async def query_contacts(
+        self,
+        since: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict]:
+        """Return up to `limit` contact messages ordered by (timestamp, id).
+
+        `since` keeps messages sent after the given timestamp; `after` is the
+        (timestamp, id) key of the last message of the previous page.
+        `status` keeps messages in that inbox status (new, read, archived).
+        """
+        raise NotImplementedError
+
+    async def iter_contacts(self, page_size: int = 1000, since: Optional[str] = None) -> AsyncIterator[List[Dict]]:
+        """Every matching contact message in (timestamp, id) order, one page at a time"""
+        after = None
+        while True:
+            page = await self.query_contacts(since=since, after=after, limit=page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            after = (page[-1].get("timestamp") or "", page[-1]["id"])
+
+    async def count_contacts(self, status: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    async def set_contact_status(
+        self,
+        new_status: str,
+        ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> int:
+        """Move the contact messages that match all given filters to `new_status`.
+
+        `ids` limits the change to those messages, `status` to messages in
+        that status and `before` to messages sent before that timestamp.
+        Returns how many messages changed.
+        """
+        raise NotImplementedError
+
+    async def load_settings(self) -> Optional[Dict]:
+        """Admin settings saved by any process, or None if the backend does not keep them"""
+        return None
+
+    async def save_settings(self, settings: Dict) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": self.name}
+
+
+ParcelKey = Tuple[str, str]
+
+
+class MemoryStorage(Storage):
+    """In-process storage. Data does not survive a restart.
+
+    Parcels are held as compact `ParcelRecord`s and turned back into dicts
+    when read, so callers get a copy they can mutate before saving it.
+    Besides the records it keeps (createdAt, id) keys sorted overall and per
+    status and mode, so a filtered page is a bisect plus a walk over the
+    page instead of a scan of every parcel. Contact messages live in a
+    bounded `ContactInbox` that moves older ones out to segment files.
+    """
+
+    name = "memory"
+
+    def __init__(self, inbox: Optional[ContactInbox] = None):
+        self.parcels: Dict[str, ParcelRecord] = {}
+        self.inbox = inbox if inbox is not None else ContactInbox()
+        self._by_time: List[ParcelKey] = []
+        self._by_status: Dict[str, List[ParcelKey]] = {}
+        self._by_mode: Dict[str, List[ParcelKey]] = {}
+
+    def _store(self, parcel: Dict) -> None:
+        record = ParcelRecord.from_dict(parcel)
+        old = self.parcels.get(record.id)
+        self.parcels[record.id] = record
+        key, status, mode = record.index_entry()
+        if old is None:
+            self._index(key, status, mode)
+            return
+        old_key, old_status, old_mode = old.index_entry()
+        # A status change only moves the key between two status lists
+        if old_key != key:
+            self._unindex(old)
+            self._index(key, status, mode)
+            return
+        if old_status != status:
+            keys = self._by_status[old_status]
+            del keys[bisect_left(keys, key)]
+            insort(self._by_status.setdefault(status, []), key)
+        if old_mode != mode:
+            keys = self._by_mode[old_mode]
+            del keys[bisect_left(keys, key)]
+            insort(self._by_mode.setdefault(mode, []), key)
+
+    def _index(self, key: ParcelKey, status: Optional[str], mode: Optional[str]) -> None:
+        insort(self._by_time, key)
+        insort(self._by_status.setdefault(status, []), key)
+        insort(self._by_mode.setdefault(mode, []), key)
+
+    def _unindex(self, record: ParcelRecord) -> None:
+        key, status, mode = record.index_entry()
+        for keys in (self._by_time, self._by_status[status], self._by_mode[mode]):
+            del keys[bisect_left(keys, key)]
+
+    def _remove(self, parcel_id: str) -> bool:
+        record = self.parcels.pop(parcel_id, None)
+        if record is None:
+            return False
+        self._unindex(record)
+        return True
+
+    def _add_contact(self, message: Dict) -> bool:
+        try:
+            return self.inbox.add(message)
+        except OSError as e:
+            raise StorageError(f"Inbox write failed: {e}")
+
+    def _set_contact_status(self, new_status: str, **filters) -> List[str]:
+        try:
+            return self.inbox.set_status(new_status, **filters)
+        except OSError as e:
+            raise StorageError(f"Inbox write failed: {e}")
+
+    @staticmethod
+    def _modified_at(record: ParcelRecord) -> str:
+        updated = unstamp(record.updated)
+        if type(updated) is str:
+            return updated
+        return record.key[0]
+
+    def _reindex(self) -> None:
+        """Rebuild the sorted indexes from the records, sorting each list once"""
+        self._by_time, self._by_status, self._by_mode = [], {}, {}
+        for record in self.parcels.values():
+            key, status, mode = record.index_entry()
+            self._by_time.append(key)
+            self._by_status.setdefault(status, []).append(key)
+            self._by_mode.setdefault(mode, []).append(key)
+        for keys in (self._by_time, *self._by_status.values(), *self._by_mode.values()):
+            keys.sort()
+
+    async def get_parcel(self, parcel_id: str) -> Optional[Dict]:
+        record = self.parcels.get(parcel_id)
+        return record.to_dict() if record is not None else None
+
+    async def get_parcels(self, parcel_ids: List[str]) -> Dict[str, Dict]:
+        return {
+            parcel_id: self.parcels[parcel_id].to_dict()
+            for parcel_id in parcel_ids if parcel_id in self.parcels
+        }
+
+    async def save_parcel(self, parcel: Dict) -> None:
+        self._store(parcel)
+
+    async def save_parcels(self, parcels: List[Dict]) -> None:
+        for parcel in parcels:
+            self._store(parcel)
+
+    async def insert_parcels(self, parcels: List[Dict]) -> List[str]:
+        taken = [parcel["id"] for parcel in parcels if parcel["id"] in self.parcels]
+        await self.save_parcels([parcel for parcel in parcels if parcel["id"] not in self.parcels])
+        return taken
+
+    async def delete_parcel(self, parcel_id: str) -> bool:
+        return self._remove(parcel_id)
+
+    async def update_positions(
+        self,
+        parcel_ids: List[str],
+        positions: List[Dict],
+        progress: List[float],
+        updated_at: str,
+    ) -> None:
+        set_positions(self.parcels, parcel_ids, positions, progress, updated_at)
+
+    async def list_parcels(self) -> List[Dict]:
+        return [record.to_dict() for record in self.parcels.values()]
+
+    async def count_parcels(self) -> int:
+        return len(self.parcels)
+
+    async def query_parcels(
+        self,
+        status: Optional[str] = None,
+        mode: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        descending: bool = True,
+        limit: int = 50,
+        modified_since: Optional[str] = None,
+    ) -> List[Dict]:
+        # Walk the narrowest index that satisfies one of the filters
+        candidates = [self._by_time]
+        if status is not None:
+            candidates.append(self._by_status.get(status, []))
+        if mode is not None:
+            candidates.append(self._by_mode.get(mode, []))
+        keys = min(candidates, key=len)
+
+        lo = bisect_left(keys, (created_from, "")) if created_from else 0
+        hi = bisect_left(keys, (created_to, "")) if created_to else len(keys)
+        if after and descending:
+            hi = min(hi, bisect_left(keys, tuple(after)))
+        elif after:
+            lo = max(lo, bisect_right(keys, tuple(after)))
+
+        page = []
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        for i in positions:
+            record = self.parcels[keys[i][1]]
+            if status is not None and record.status != status:
+                continue
+            if mode is not None and record.mode != mode:
+                continue
+            if modified_since is not None and self._modified_at(record) <= modified_since:
+                continue
+            page.append(record.to_dict())
+            if len(page) >= limit:
+                break
+        return page
+
+    async def close(self) -> None:
+        self.inbox.close()
+
+    async def add_contact(self, message: Dict) -> None:
+        self._add_contact(message)
+
+    async def list_contacts(self) -> List[Dict]:
+        return list(self.inbox)
+
+    async def get_contacts(self, message_ids: List[str]) -> Dict[str, Dict]:
+        return self.inbox.get(message_ids)
+
+    async def query_contacts(
+        self,
+        since: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict]:
+        return self.inbox.query(status=status, since=since, after=after, descending=descending, limit=limit)
+
+    async def count_contacts(self, status: Optional[str] = None) -> int:
+        return self.inbox.count(status)
+
+    async def set_contact_status(
+        self,
+        new_status: str,
+        ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> int:
+        return len(self._set_contact_status(new_status, ids=ids, status=status, before=before))
+
+    def stats(self) -> Dict:
+        return {**super().stats(), "contacts": self.inbox.stats()}
+
+
+class LoggedMemoryStorage(MemoryStorage):
+    """In-process storage made durable by a write-ahead log and snapshots.
+
+    Each write is logged as an event describing what changed (a new parcel,
+    changed fields plus appended history entries, a deletion, a contact
+    message or a change of contact status) and acknowledged once the log is
+    fsynced; a parcel write the log fails to take is undone in memory.
+    Routes replaced by route changes are logged with the update and kept in
+    `routes` by parcel id, as SQLite keeps them in `parcel_routes`. Contact messages moved out of memory are kept in fsynced inbox
+    segments under `contacts/`, which recovery loads before the log. Simulated positions
+    change every tick, so they are logged in one batch per
+    `position_interval` instead. Once the current log segment outgrows
+    `snapshot_bytes`, a snapshot is written in the background and older
+    files are dropped, which keeps recovery to one snapshot load plus a
+    short replay.
+    """
+
+    name = "memory+log"
+    persistent = True
+
+    def __init__(
+        self,
+        directory: str,
+        commit_delay: float = 0.002,
+        snapshot_bytes: int = 16 * 1024 * 1024,
+        position_interval: float = 30.0,
+        inbox: Optional[ContactInbox] = None,
+    ):
+        if inbox is None:
+            inbox = ContactInbox(os.path.join(directory, "contacts"), durable=True)
+        super().__init__(inbox)
+        self.journal = Journal(directory, commit_delay)
+        self.snapshot_bytes = snapshot_bytes
+        self.position_interval = position_interval
+        self.routes: Dict[str, List[Dict]] = {}
+        self._moved: set = set()
+        self._snapshotting = False
+        self._task: Optional[asyncio.Task] = None
+        self.snapshots = 0
+        self.recovery_seconds = 0.0
+
+    async def start(self) -> None:
+        started = time.perf_counter()
+        snapshot, segments = self.journal.recover()
+        self.inbox.open()
+        events = 0
+        # Recovery only creates objects that stay alive; collecting in between
+        # would rescan all of them again and again
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            if snapshot:
+                for kind, items in read_snapshot(snapshot):
+                    if kind == "parcels":
+                        for record in map(ParcelRecord.from_row, items):
+                            self.parcels[record.id] = record
+                    elif kind == "routes":
+                        self.routes.update(items)
+                    else:
+                        for message in items:
+                            self._add_contact(message)
+            for path in segments:
+                for event in read_segment(path):
+                    self._replay(event)
+                    events += 1
+            self._reindex()
+        finally:
+            if collecting:
+                gc.enable()
+        self.recovery_seconds = time.perf_counter() - started
+        print(
+            f"Recovered {len(self.parcels)} parcels and {len(self.inbox)} contact messages "
+            f"from {self.journal.directory} ({events} log events) in {self.recovery_seconds:.2f}s"
+        )
+        self.journal.open()
+        self._task = asyncio.create_task(self._maintain())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._log_positions()
+        await self.journal.close()
+        await super().close()
+
+    def _replay(self, event: Dict) -> None:
+        """Apply a logged event to the records; the indexes are rebuilt afterwards"""
+        op = event["op"]
+        if op == "put":
+            self.parcels[event["parcel"]["id"]] = ParcelRecord.from_dict(event["parcel"])
+        elif op == "update":
+            record = self.parcels.get(event["id"])
+            if record is not None:
+                self.parcels[event["id"]] = ParcelRecord.from_dict(apply_patch(record.to_dict(), event))
+                self._keep_route(event)
+        elif op == "delete":
+            self.parcels.pop(event["id"], None)
+            self.routes.pop(event["id"], None)
+        elif op == "positions":
+            for parcel_id, position, progress, updated_at in event["rows"]:
+                record = self.parcels.get(parcel_id)
+                if record is not None:
+                    record.set_position(position, progress, stamp(updated_at))
+        elif op == "contact":
+            self._add_contact(event["message"])
+        elif op == "contact_status":
+            self._set_contact_status(event["status"], ids=event["ids"])
+
+    def _change(self, parcel: Dict) -> Optional[Dict]:
+        """The event that turns the stored version of a parcel into this one"""
+        record = self.parcels.get(parcel["id"])
+        if record is None:
+            return {"op": "put", "parcel": parcel}
+        patch = parcel_patch(record.to_dict(), parcel)
+        if patch is None:
+            return None
+        # Replay appends history entries wherever the record's history ends
+        patch.pop("historyFrom", None)
+        return {"op": "update", **patch}
+
+    def _keep_route(self, event: Dict) -> Optional[Dict]:
+        """Keep the route an update event replaced; returns the kept version"""
+        replaced = event.get("replaced")
+        if not replaced:
+            return None
+        kept = {
+            "version": replaced["version"],
+            "replacedAt": event.get("set", {}).get("updatedAt") or "",
+            "route": replaced["route"],
+        }
+        versions = [version for version in self.routes.get(event["id"], ()) if version["version"] != kept["version"]]
+        versions.append(kept)
+        self.routes[event["id"]] = versions
+        return kept
+
+    async def _commit(self, events: List[Dict]) -> None:
+        if not events:
+            return
+        try:
+            await self.journal.append(events)
+        except OSError as e:
+            raise StorageError(f"Log write failed: {e}")
+
+    def _undo(self, writes: List[Tuple[str, Optional[ParcelRecord], Optional[ParcelRecord], Optional[Dict]]]) -> None:
+        """Put back the records that (parcel id, before, after, kept route) writes replaced"""
+        for parcel_id, before, after, route in reversed(writes):
+            # A later write that built on this one is left alone
+            if self.parcels.get(parcel_id) is not after:
+                continue
+            if route is not None:
+                versions = self.routes[parcel_id]
+                versions.remove(route)
+                if not versions:
+                    del self.routes[parcel_id]
+            self._remove(parcel_id)
+            if before is not None:
+                self.parcels[parcel_id] = before
+                self._index(*before.index_entry())
+
+    async def save_parcel(self, parcel: Dict) -> None:
+        await self.save_parcels([parcel])
+
+    async def save_parcels(self, parcels: List[Dict]) -> None:
+        # Changes are applied at once, so that readers and writers after this
+        # see them, and undone if the log does not take them
+        events, writes = [], []
+        for parcel in parcels:
+            event = self._change(parcel)
+            before = self.parcels.get(parcel["id"])
+            self._store(parcel)
+            if event:
+                events.append(event)
+                writes.append((parcel["id"], before, self.parcels[parcel["id"]], self._keep_route(event)))
+        try:
+            await self._commit(events)
+        except StorageError:
+            self._undo(writes)
+            raise
+
+    async def delete_parcel(self, parcel_id: str) -> bool:
+        before = self.parcels.get(parcel_id)
+        if not self._remove(parcel_id):
+            return False
+        self._moved.discard(parcel_id)
+        routes = self.routes.pop(parcel_id, None)
+        try:
+            await self._commit([{"op": "delete", "id": parcel_id}])
+        except StorageError:
+            self._undo([(parcel_id, before, None, None)])
+            if routes and self.parcels.get(parcel_id) is before:
+                self.routes[parcel_id] = routes
+            raise
+        return True
+
+    async def update_positions(
+        self,
+        parcel_ids: List[str],
+        positions: List[Dict],
+        progress: List[float],
+        updated_at: str,
+    ) -> None:
+        await super().update_positions(parcel_ids, positions, progress, updated_at)
+        self._moved.update(parcel_ids)
+
+    async def add_contact(self, message: Dict) -> None:
+        if self._add_contact(message):
+            await self._commit([{"op": "contact", "message": message}])
+
+    async def set_contact_status(
+        self,
+        new_status: str,
+        ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> int:
+        # Logged by id, so replaying it does not depend on what else matched at the time
+        changed = self._set_contact_status(new_status, ids=ids, status=status, before=before)
+        await self._commit([{"op": "contact_status", "ids": changed, "status": new_status}] if changed else [])
+        return len(changed)
+
+    def _log_positions(self) -> None:
+        """Log the current position of every parcel moved since the last batch"""
+        rows = []
+        for parcel_id in self._moved:
+            record = self.parcels.get(parcel_id)
+            if record is not None:
+                rows.append([parcel_id, unpack(record.position), record.progress, unstamp(record.updated)])
+        self._moved.clear()
+        if rows:
+            # Positions can be recomputed, so nobody waits on this commit
+            self.journal.append([{"op": "positions", "rows": rows}])
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.position_interval)
+            try:
+                self._log_positions()
+                if self.journal.segment_bytes >= self.snapshot_bytes:
+                    await self.snapshot()
+            except (OSError, ValueError) as e:
+                print(f"Log maintenance failed: {e}")
+
+    async def snapshot(self) -> None:
+        """Write the current state to a snapshot and drop the files it replaces"""
+        if self._snapshotting:
+            return
+        self._snapshotting = True
+        try:
+            # State captured here is exactly what the segments before the new one hold
+            self._moved.clear()
+            failures = self.journal.failures
+            rotated = self.journal.rotate()
+            # In (createdAt, id) order, so the indexes need no real sort on load
+            rows = [self.parcels[key[1]].row() for key in self._by_time]
+            # Older contact messages are already in their own segment files
+            contacts = self.inbox.hot()
+            routes = [(parcel_id, list(versions)) for parcel_id, versions in self.routes.items()]
+            number = await rotated
+            path = self.journal.snapshot_path(number)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, write_snapshot, path, rows, contacts, routes)
+            if self.journal.failures != failures:
+                # The captured state may hold writes that failed and were undone since
+                os.remove(path)
+                return
+            self.journal.prune(number)
+            self.snapshots += 1
+        finally:
+            self._snapshotting = False
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            **self.journal.stats(),
+            "route_versions": sum(map(len, self.routes.values())),
+            "snapshots": self.snapshots,
+            "recovery_seconds": round(self.recovery_seconds, 2),
+        }
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parcels (
+    id TEXT PRIMARY KEY,
+    createdAt TEXT NOT NULL,
+    status TEXT,
+    mode TEXT,
+    modifiedAt TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS parcels_by_time ON parcels (createdAt, id);
+CREATE INDEX IF NOT EXISTS parcels_by_status ON parcels (status, createdAt, id);
+CREATE INDEX IF NOT EXISTS parcels_by_mode ON parcels (mode, createdAt, id);
+CREATE TABLE IF NOT EXISTS parcel_history (
+    parcel_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    entry BLOB NOT NULL,
+    PRIMARY KEY (parcel_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS parcel_routes (
+    parcel_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    replacedAt TEXT NOT NULL,
+    route BLOB NOT NULL,
+    PRIMARY KEY (parcel_id, version)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS contact_messages (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new',
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS contacts_by_time ON contact_messages (timestamp, id);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
+
+# Bound parameters per statement; SQLite builds before 3.32 allow 999
+SQLITE_MAX_VARIABLES = 900
+
+
+def open_sqlite(path: str, timeout: float) -> sqlite3.Connection:
+    """Connection in WAL mode, so readers in any process never wait for a writer"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    # Commits reach the WAL without an fsync; a power loss can drop the last
+    # few, a process crash cannot
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def _parcel_row(parcel: Dict) -> Tuple:
+    created = parcel.get("createdAt") or ""
+    return (
+        parcel["id"],
+        created,
+        parcel.get("status"),
+        parcel.get("mode"),
+        parcel.get("updatedAt") or created,
+        orjson.dumps(parcel),
+    )
+
+
+def _split_history(parcel: Dict) -> Tuple[Dict, List]:
+    """The parcel without its history, and the history entries"""
+    if type(parcel.get("history")) is not list:
+        return parcel, []
+    head = dict(parcel)
+    return head, head.pop("history")
+
+
+class SQLiteStorage(Storage):
+    """Storage in one SQLite file shared by the worker processes of a machine.
+
+    The file runs in WAL mode, so readers in every process proceed while one
+    process writes. Parcels are stored as JSON next to the columns that the
+    listing queries filter and sort on, each with a (createdAt, id) index.
+    History entries are rows of `parcel_history`, so an update writes the
+    parcel row and its new entries only, however long the history is;
+    routes it replaces are kept in `parcel_routes`. Every call runs on one thread per process that owns the connection, so
+    the event loop never waits on the file lock or the disk.
+    """
+
+    name = "sqlite"
+    persistent = True
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._db: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+    async def _run(self, fn: Callable, *args):
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except sqlite3.Error as e:
+            raise StorageError(f"SQLite {fn.__name__}: {e}") from e
+
+    def _open(self) -> None:
+        if self._db is None:
+            self._db = open_sqlite(self.path, self.timeout)
+            self._db.executescript(SQLITE_SCHEMA)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(contact_messages)")]
+            if "status" not in columns:
+                # Files written before messages had an inbox status
+                self._db.execute("ALTER TABLE contact_messages ADD COLUMN status TEXT NOT NULL DEFAULT 'new'")
+            self._db.execute("CREATE INDEX IF NOT EXISTS contacts_by_status ON contact_messages (status, timestamp, id)")
+
+    def _write(self, statements: List[Tuple[str, List[Tuple]]]) -> None:
+        """Run statements in one transaction that takes the write lock up front"""
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, rows in statements:
+                db.executemany(sql, rows)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _select(self, sql: str, args: Tuple = ()) -> List[Tuple]:
+        return self._db.execute(sql, args).fetchall()
+
+    def _select_in(self, sql: str, ids: List[str]) -> List[Tuple]:
+        rows = []
+        for i in range(0, len(ids), SQLITE_MAX_VARIABLES):
+            chunk = ids[i:i + SQLITE_MAX_VARIABLES]
+            rows.extend(self._db.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall())
+        return rows
+
+    async def start(self) -> None:
+        await self._run(self._open)
+
+    async def close(self) -> None:
+        def close():
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        await self._run(close)
+        self._executor.shutdown()
+
+    def _parcels(self, rows: List[Tuple]) -> List[Dict]:
+        """Parcels from (id, body) rows, with their history"""
+        parcels = [orjson.loads(body) for _, body in rows]
+        if not parcels:
+            return parcels
+        if len(rows) > SQLITE_MAX_VARIABLES:
+            # One pass over the table beats many IN lookups for large reads
+            history_rows = self._select("SELECT parcel_id, seq, entry FROM parcel_history ORDER BY parcel_id, seq")
+        else:
+            history_rows = self._select_in(
+                "SELECT parcel_id, seq, entry FROM parcel_history WHERE parcel_id IN ({}) ORDER BY parcel_id, seq",
+                [parcel_id for parcel_id, _ in rows],
+            )
+        appended: Dict[str, List[Tuple]] = {}
+        for parcel_id, seq, entry in history_rows:
+            appended.setdefault(parcel_id, []).append((seq, entry))
+        for parcel in parcels:
+            history = parcel.setdefault("history", [])
+            # Rows written before history had its own table keep it in the body
+            base = len(history)
+            history.extend(orjson.loads(entry) for seq, entry in appended.get(parcel["id"], ()) if seq >= base)
+        return parcels
+
+    def _select_parcels(self, sql: str, args: Tuple = ()) -> List[Dict]:
+        return self._parcels(self._select(sql, args))
+
+    async def get_parcel(self, parcel_id: str) -> Optional[Dict]:
+        parcels = await self._run(self._select_parcels, "SELECT id, body FROM parcels WHERE id = ?", (parcel_id,))
+        return parcels[0] if parcels else None
+
+    async def get_parcels(self, parcel_ids: List[str]) -> Dict[str, Dict]:
+        def select() -> List[Dict]:
+            return self._parcels(self._select_in("SELECT id, body FROM parcels WHERE id IN ({})", list(parcel_ids)))
+        return {parcel["id"]: parcel for parcel in await self._run(select)}
+
+    async def save_parcel(self, parcel: Dict) -> None:
+        await self.save_parcels([parcel])
+
+    async def save_parcels(self, parcels: List[Dict]) -> None:
+        if not parcels:
+            return
+        rows, history = [], []
+        for parcel in parcels:
+            head, entries = _split_history(parcel)
+            rows.append(_parcel_row(head))
+            history.extend((parcel["id"], seq, orjson.dumps(entry)) for seq, entry in enumerate(entries))
+        await self._run(self._write, [(
+            "INSERT INTO parcels (id, createdAt, status, mode, modifiedAt, body) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET createdAt = excluded.createdAt, status = excluded.status, "
+            "mode = excluded.mode, modifiedAt = excluded.modifiedAt, body = excluded.body",
+            rows,
+        ), (
+            "DELETE FROM parcel_history WHERE parcel_id = ?",
+            [(parcel["id"],) for parcel in parcels],
+        ), (
+            "INSERT INTO parcel_history (parcel_id, seq, entry) VALUES (?, ?, ?)",
+            history,
+        )])
+
+    async def insert_parcels(self, parcels: List[Dict]) -> List[str]:
+        def insert() -> List[str]:
+            db = self._db
+            taken = []
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for parcel in parcels:
+                    head, entries = _split_history(parcel)
+                    cursor = db.execute(
+                        "INSERT INTO parcels (id, createdAt, status, mode, modifiedAt, body) "
+                        "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO NOTHING",
+                        _parcel_row(head),
+                    )
+                    if cursor.rowcount == 0:
+                        taken.append(parcel["id"])
+                        continue
+                    db.executemany(
+                        "INSERT INTO parcel_history (parcel_id, seq, entry) VALUES (?, ?, ?)",
+                        [(parcel["id"], seq, orjson.dumps(entry)) for seq, entry in enumerate(entries)],
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return taken
+        if not parcels:
+            return []
+        return await self._run(insert)
+
+    async def update_parcels(self, parcels: List[Dict], patches: List[Dict]) -> None:
+        def update() -> None:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [patch["id"] for patch in patches]
+                heads = {parcel_id: orjson.loads(body) for parcel_id, body in self._select_in(
+                    "SELECT id, body FROM parcels WHERE id IN ({})", ids,
+                )}
+                for patch in patches:
+                    parcel_id = patch["id"]
+                    head = heads.get(parcel_id)
+                    if head is None:
+                        # Deleted since it was read
+                        continue
+                    changes = dict(patch.get("set", {}))
+                    entries = patch.get("history", [])
+                    if type(changes.get("history")) is list:
+                        # Rewritten rather than appended to
+                        db.execute("DELETE FROM parcel_history WHERE parcel_id = ?", (parcel_id,))
+                        head.pop("history", None)
+                        entries = changes.pop("history")
+                    apply_patch(head, {"set": changes, "unset": patch.get("unset", ())})
+                    if entries:
+                        last = db.execute(
+                            "SELECT max(seq) FROM parcel_history WHERE parcel_id = ?", (parcel_id,),
+                        ).fetchone()[0]
+                        start = max(len(head.get("history") or []), 0 if last is None else last + 1)
+                        db.executemany(
+                            "INSERT INTO parcel_history (parcel_id, seq, entry) VALUES (?, ?, ?)",
+                            [(parcel_id, start + i, orjson.dumps(entry)) for i, entry in enumerate(entries)],
+                        )
+                    replaced = patch.get("replaced")
+                    if replaced:
+                        db.execute(
+                            "INSERT OR REPLACE INTO parcel_routes (parcel_id, version, replacedAt, route) VALUES (?, ?, ?, ?)",
+                            (parcel_id, replaced["version"], head.get("updatedAt") or "", orjson.dumps(replaced["route"])),
+                        )
+                db.executemany(
+                    "UPDATE parcels SET createdAt = ?, status = ?, mode = ?, modifiedAt = ?, body = ? WHERE id = ?",
+                    [(*row[1:], row[0]) for row in map(_parcel_row, heads.values())],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if patches:
+            await self._run(update)
+
+    async def delete_parcel(self, parcel_id: str) -> bool:
+        def delete() -> bool:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = db.execute("DELETE FROM parcels WHERE id = ?", (parcel_id,)).rowcount > 0
+                db.execute("DELETE FROM parcel_history WHERE parcel_id = ?", (parcel_id,))
+                db.execute("DELETE FROM parcel_routes WHERE parcel_id = ?", (parcel_id,))
+                db.execute("COMMIT")
+                return deleted
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return await self._run(delete)
+
+    async def update_positions(
+        self,
+        parcel_ids: List[str],
+        positions: List[Dict],
+        progress: List[float],
+        updated_at: str,
+    ) -> None:
+        def update() -> None:
+            moves = {parcel_id: (position, pct) for parcel_id, position, pct in zip(parcel_ids, positions, progress)}
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._select_in("SELECT id, body FROM parcels WHERE id IN ({})", list(moves))
+                updated = []
+                for parcel_id, body in rows:
+                    parcel = orjson.loads(body)
+                    parcel["currentPosition"], parcel["progress"] = moves[parcel_id]
+                    parcel["updatedAt"] = updated_at
+                    updated.append((updated_at, orjson.dumps(parcel), parcel_id))
+                db.executemany("UPDATE parcels SET modifiedAt = ?, body = ? WHERE id = ?", updated)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        if parcel_ids:
+            await self._run(update)
+
+    async def list_parcels(self) -> List[Dict]:
+        return await self._run(self._select_parcels, "SELECT id, body FROM parcels ORDER BY createdAt, id")
+
+    async def count_parcels(self) -> int:
+        rows = await self._run(self._select, "SELECT count(*) FROM parcels")
+        return rows[0][0]
+
+    async def query_parcels(
+        self,
+        status: Optional[str] = None,
+        mode: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        descending: bool = True,
+        limit: int = 50,
+        modified_since: Optional[str] = None,
+    ) -> List[Dict]:
+        conditions, args = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            args.append(status)
+        if mode is not None:
+            conditions.append("mode = ?")
+            args.append(mode)
+        if created_from:
+            conditions.append("createdAt >= ?")
+            args.append(created_from)
+        if created_to:
+            conditions.append("createdAt < ?")
+            args.append(created_to)
+        if after:
+            conditions.append("(createdAt, id) < (?, ?)" if descending else "(createdAt, id) > (?, ?)")
+            args.extend(after)
+        if modified_since:
+            conditions.append("modifiedAt > ?")
+            args.append(modified_since)
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            "SELECT id, body FROM parcels"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + f" ORDER BY createdAt {direction}, id {direction} LIMIT ?"
+        )
+        return await self._run(self._select_parcels, sql, (*args, limit))
+
+    async def add_contact(self, message: Dict) -> None:
+        await self._run(self._write, [(
+            "INSERT OR REPLACE INTO contact_messages (id, timestamp, status, body) VALUES (?, ?, ?, ?)",
+            [(message["id"], message.get("timestamp") or "", message.get("status") or "new", orjson.dumps(message))],
+        )])
+
+    async def list_contacts(self) -> List[Dict]:
+        rows = await self._run(self._select, "SELECT body FROM contact_messages ORDER BY rowid")
+        return [orjson.loads(body) for body, in rows]
+
+    async def get_contacts(self, message_ids: List[str]) -> Dict[str, Dict]:
+        rows = await self._run(self._select_in, "SELECT id, body FROM contact_messages WHERE id IN ({})", list(message_ids))
+        return {message_id: orjson.loads(body) for message_id, body in rows}
+
+    async def query_contacts(
+        self,
+        since: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict]:
+        conditions, args = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            args.append(status)
+        if since:
+            conditions.append("timestamp > ?")
+            args.append(since)
+        if after:
+            conditions.append("(timestamp, id) < (?, ?)" if descending else "(timestamp, id) > (?, ?)")
+            args.extend(after)
+        direction = "DESC" if descending else "ASC"
+        sql = (
+            "SELECT body FROM contact_messages"
+            + (" WHERE " + " AND ".join(conditions) if conditions else "")
+            + f" ORDER BY timestamp {direction}, id {direction} LIMIT ?"
+        )
+        rows = await self._run(self._select, sql, (*args, limit))
+        return [orjson.loads(body) for body, in rows]
+
+    async def count_contacts(self, status: Optional[str] = None) -> int:
+        if status is None:
+            rows = await self._run(self._select, "SELECT count(*) FROM contact_messages")
+        else:
+            rows = await self._run(self._select, "SELECT count(*) FROM contact_messages WHERE status = ?", (status,))
+        return rows[0][0]
+
+    async def set_contact_status(
+        self,
+        new_status: str,
+        ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> int:
+        conditions, args = ["status != ?"], [new_status]
+        if status is not None:
+            conditions.append("status = ?")
+            args.append(status)
+        if before:
+            conditions.append("timestamp < ?")
+            args.append(before)
+        where = " AND ".join(conditions)
+
+        def update() -> int:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if ids is None:
+                    rows = db.execute(f"SELECT id, body FROM contact_messages WHERE {where}", args).fetchall()
+                else:
+                    rows = []
+                    for i in range(0, len(ids), SQLITE_MAX_VARIABLES - len(args)):
+                        chunk = list(ids[i:i + SQLITE_MAX_VARIABLES - len(args)])
+                        rows.extend(db.execute(
+                            f"SELECT id, body FROM contact_messages WHERE id IN ({','.join('?' * len(chunk))}) AND {where}",
+                            (*chunk, *args),
+                        ).fetchall())
+                updated = []
+                for message_id, body in rows:
+                    message = orjson.loads(body)
+                    message["status"] = new_status
+                    updated.append((new_status, orjson.dumps(message), message_id))
+                db.executemany("UPDATE contact_messages SET status = ?, body = ? WHERE id = ?", updated)
+                db.execute("COMMIT")
+                return len(updated)
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return await self._run(update)
+
+    async def load_settings(self) -> Optional[Dict]:
+        rows = await self._run(self._select, "SELECT value FROM settings WHERE key = 'admin'")
+        return orjson.loads(rows[0][0]) if rows else None
+
+    async def save_settings(self, settings: Dict) -> None:
+        await self._run(self._write, [(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('admin', ?)",
+            [(orjson.dumps(settings),)],
+        )])
+
+    def stats(self) -> Dict:
+        try:
+            wal_bytes = os.path.getsize(self.path + "-wal")
+        except OSError:
+            wal_bytes = 0
+        return {**super().stats(), "path": self.path, "wal_bytes": wal_bytes}
+
+
+# Parcels are read together with the history entries appended by updates
+PARCEL_SELECT = "*,parcel_history(seq,entry)"
+
+
+def _with_history(row: Dict) -> Dict:
+    """A parcel row with its embedded history rows folded into `history`"""
+    appended = row.pop("parcel_history", None)
+    if appended:
+        history = row.get("history") or []
+        # Rows below the stored length were already in the row when it was last saved in full
+        base = len(history)
+        row["history"] = history + [
+            item["entry"] for item in sorted(appended, key=lambda item: item["seq"]) if item["seq"] >= base
+        ]
+    return row
+
+
+class PostgRESTStorage(Storage):
+    """Supabase/PostgREST storage over a pooled async HTTP/2 client.
+
+    Updates to stored parcels send only the changed columns; appended
+    history entries become rows of `parcel_history` and replaced routes
+    rows of `parcel_routes`, both keyed by parcel id.
+    """
+
+    name = "postgrest"
+    persistent = True
+
+    def __init__(
+        self,
+        url: str,
+        key: str,
+        max_connections: int = 10,
+        timeout: float = 5.0,
+    ):
+        self.base_url = url.rstrip("/") + "/rest/v1"
+        self.key = key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        # Callers beyond the pool size wait here instead of piling up inside httpx
+        self._slots = asyncio.Semaphore(max_connections)
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None:
+            # httpx (with HTTP/2) takes a while to import and only Supabase needs it
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                headers={
+                    "apikey": self.key,
+                    "Authorization": f"Bearer {self.key}",
+                },
+            )
+        return self._client
+
+    async def start(self) -> None:
+        self._get_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> "httpx.Response":
+        import httpx
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise StorageError(f"{method} {path}: no free connection after {self.timeout}s")
+        try:
+            response = await self._get_client().request(method, path, **kwargs)
+            response.raise_for_status()
+            return response
+        except httpx.HTTPError as e:
+            raise StorageError(f"{method} {path}: {e}") from e
+        finally:
+            self._slots.release()
+
+    async def _count(self, table: str, **filters: str) -> int:
+        response = await self._request(
+            "HEAD", f"/{table}",
+            params={"select": "id", **filters},
+            headers={"Prefer": "count=exact"},
+        )
+        # Content-Range looks like "0-24/3573" or "*/0"
+        total = response.headers.get("content-range", "*/0").rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def _patch_parcels(self, changes: List[Tuple[str, Dict]], chunk_size: int) -> None:
+        """Update columns of existing parcels, given (id, {column: value}) pairs
+
+        An upsert with only some columns would be an INSERT ... ON CONFLICT,
+        which fails the NOT NULL columns it leaves out, so changes are PATCHes
+        filtered by id. Parcels getting the same values share one request;
+        the rest run concurrently, as many at a time as the pool allows.
+        """
+        groups: Dict[bytes, Tuple[Dict, List[str]]] = {}
+        for parcel_id, values in changes:
+            key = orjson.dumps(values, option=orjson.OPT_SORT_KEYS)
+            groups.setdefault(key, (values, []))[1].append(parcel_id)
+        batches = [
+            (values, ids[i:i + chunk_size])
+            for values, ids in groups.values()
+            for i in range(0, len(ids), chunk_size)
+        ]
+
+        async def patch(values: Dict, ids: List[str]) -> None:
+            quoted = ",".join(f'"{parcel_id}"' for parcel_id in ids)
+            await self._request(
+                "PATCH", "/parcels",
+                params={"id": f"eq.{ids[0]}" if len(ids) == 1 else f"in.({quoted})"},
+                json=values,
+                headers={"Prefer": "return=minimal"},
+            )
+
+        for i in range(0, len(batches), self.max_connections):
+            await asyncio.gather(*(patch(values, ids) for values, ids in batches[i:i + self.max_connections]))
+
+    async def get_parcel(self, parcel_id: str) -> Optional[Dict]:
+        response = await self._request(
+            "GET", "/parcels",
+            params={"select": PARCEL_SELECT, "id": f"eq.{parcel_id}", "limit": 1},
+        )
+        rows = response.json()
+        return _with_history(rows[0]) if rows else None
+
+    async def get_parcels(self, parcel_ids: List[str]) -> Dict[str, Dict]:
+        if not parcel_ids:
+            return {}
+        quoted = ",".join(f'"{parcel_id}"' for parcel_id in parcel_ids)
+        response = await self._request(
+            "GET", "/parcels",
+            params={"select": PARCEL_SELECT, "id": f"in.({quoted})"},
+        )
+        return {row["id"]: _with_history(row) for row in response.json()}
+
+    async def save_parcel(self, parcel: Dict) -> None:
+        await self._request(
+            "POST", "/parcels",
+            params={"on_conflict": "id"},
+            json=parcel,
+            headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+        )
+
+    async def save_parcels(self, parcels: List[Dict], chunk_size: int = 500) -> None:
+        for i in range(0, len(parcels), chunk_size):
+            await self._request(
+                "POST", "/parcels",
+                params={"on_conflict": "id"},
+                json=parcels[i:i + chunk_size],
+                headers={"Prefer": "resolution=merge-duplicates,return=minimal"},
+            )
+
+    async def insert_parcels(self, parcels: List[Dict], chunk_size: int = 500) -> List[str]:
+        taken = []
+        for i in range(0, len(parcels), chunk_size):
+            chunk = parcels[i:i + chunk_size]
+            # Rows that hit an existing id are skipped and left out of the response
+            response = await self._request(
+                "POST", "/parcels",
+                params={"on_conflict": "id", "select": "id"},
+                json=chunk,
+                headers={"Prefer": "resolution=ignore-duplicates,return=representation"},
+            )
+            inserted = {row["id"] for row in response.json()}
+            taken.extend(parcel["id"] for parcel in chunk if parcel["id"] not in inserted)
+        return taken
+
+    async def update_parcels(self, parcels: List[Dict], patches: List[Dict], chunk_size: int = 500) -> None:
+        changed: List[Tuple[str, Dict]] = []
+        history, routes = [], []
+        for patch in patches:
+            # Unset columns are cleared to null
+            changes = dict(patch.get("set", {}))
+            changes.update(dict.fromkeys(patch.get("unset", ())))
+            if changes:
+                changed.append((patch["id"], changes))
+            start = patch.get("historyFrom", 0)
+            history.extend(
+                {"parcel_id": patch["id"], "seq": start + i, "entry": entry}
+                for i, entry in enumerate(patch.get("history", ()))
+            )
+            replaced = patch.get("replaced")
+            if replaced:
+                routes.append({
+                    "parcel_id": patch["id"],
+                    "version": replaced["version"],
+                    "replacedAt": patch.get("set", {}).get("updatedAt") or "",
+                    "route": replaced["route"],
+                })
+        await self._patch_parcels(changed, chunk_size)
+        for table, rows, conflict, resolution in (
+            ("parcel_history", history, "parcel_id,seq", "merge-duplicates"),
+            ("parcel_routes", routes, "parcel_id,version", "ignore-duplicates"),
+        ):
+            for i in range(0, len(rows), chunk_size):
+                await self._request(
+                    "POST", f"/{table}",
+                    params={"on_conflict": conflict},
+                    json=rows[i:i + chunk_size],
+                    headers={"Prefer": f"resolution={resolution},return=minimal"},
+                )
+
+    async def delete_parcel(self, parcel_id: str) -> bool:
+        response = await self._request(
+            "DELETE", "/parcels",
+            params={"id": f"eq.{parcel_id}", "select": "id"},
+            headers={"Prefer": "return=representation"},
+        )
+        return bool(response.json())
+
+    async def update_positions(
+        self,
+        parcel_ids: List[str],
+        positions: List[Dict],
+        progress: List[float],
+        updated_at: str,
+        chunk_size: int = 1000,
+    ) -> None:
+        await self._patch_parcels(
+            [
+                (parcel_id, {"currentPosition": position, "progress": pct, "updatedAt": updated_at})
+                for parcel_id, position, pct in zip(parcel_ids, positions, progress)
+            ],
+            chunk_size,
+        )
+
+    async def list_parcels(self) -> List[Dict]:
+        response = await self._request("GET", "/parcels", params={"select": PARCEL_SELECT})
+        return [_with_history(row) for row in response.json()]
+
+    async def count_parcels(self) -> int:
+        return await self._count("parcels")
+
+    async def query_parcels(
+        self,
+        status: Optional[str] = None,
+        mode: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        descending: bool = True,
+        limit: int = 50,
+        modified_since: Optional[str] = None,
+    ) -> List[Dict]:
+        direction = "desc" if descending else "asc"
+        params = [
+            ("select", PARCEL_SELECT),
+            ("order", f"createdAt.{direction},id.{direction}"),
+            ("limit", str(limit)),
+        ]
+        if status is not None:
+            params.append(("status", f"eq.{status}"))
+        if mode is not None:
+            params.append(("mode", f"eq.{mode}"))
+        if created_from:
+            params.append(("createdAt", f"gte.{created_from}"))
+        if created_to:
+            params.append(("createdAt", f"lt.{created_to}"))
+        conditions = []
+        if after:
+            # Keyset condition; values are quoted because timestamps contain
+            # characters that are reserved inside PostgREST logic trees
+            op = "lt" if descending else "gt"
+            created_at, parcel_id = after
+            conditions.append(
+                f'or(createdAt.{op}."{created_at}",and(createdAt.eq."{created_at}",id.{op}."{parcel_id}"))'
+            )
+        if modified_since:
+            conditions.append(
+                f'or(updatedAt.gt."{modified_since}",and(updatedAt.is.null,createdAt.gt."{modified_since}"))'
+            )
+        if conditions:
+            params.append(("and", f"({','.join(conditions)})"))
+        response = await self._request("GET", "/parcels", params=params)
+        return [_with_history(row) for row in response.json()]
+
+    async def add_contact(self, message: Dict) -> None:
+        await self._request(
+            "POST", "/contact_messages",
+            json=message,
+            headers={"Prefer": "return=minimal"},
+        )
+
+    async def list_contacts(self) -> List[Dict]:
+        response = await self._request("GET", "/contact_messages", params={"select": "*"})
+        return response.json()
+
+    async def get_contacts(self, message_ids: List[str]) -> Dict[str, Dict]:
+        if not message_ids:
+            return {}
+        quoted = ",".join(f'"{message_id}"' for message_id in message_ids)
+        response = await self._request(
+            "GET", "/contact_messages",
+            params={"select": "*", "id": f"in.({quoted})"},
+        )
+        return {row["id"]: row for row in response.json()}
+
+    async def query_contacts(
+        self,
+        since: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: int = 50,
+        status: Optional[str] = None,
+        descending: bool = False,
+    ) -> List[Dict]:
+        direction = "desc" if descending else "asc"
+        params = [
+            ("select", "*"),
+            ("order", f"timestamp.{direction},id.{direction}"),
+            ("limit", str(limit)),
+        ]
+        if status is not None:
+            params.append(("status", f"eq.{status}"))
+        if since:
+            params.append(("timestamp", f"gt.{since}"))
+        if after:
+            op = "lt" if descending else "gt"
+            timestamp, message_id = after
+            params.append((
+                "or",
+                f'(timestamp.{op}."{timestamp}",and(timestamp.eq."{timestamp}",id.{op}."{message_id}"))',
+            ))
+        response = await self._request("GET", "/contact_messages", params=params)
+        return response.json()
+
+    async def count_contacts(self, status: Optional[str] = None) -> int:
+        if status is None:
+            return await self._count("contact_messages")
+        return await self._count("contact_messages", status=f"eq.{status}")
+
+    async def set_contact_status(
+        self,
+        new_status: str,
+        ids: Optional[List[str]] = None,
+        status: Optional[str] = None,
+        before: Optional[str] = None,
+        chunk_size: int = 200,
+    ) -> int:
+        params = [("select", "id"), ("status", f"neq.{new_status}")]
+        if status is not None:
+            params.append(("status", f"eq.{status}"))
+        if before:
+            params.append(("timestamp", f"lt.{before}"))
+        # Ids go into the query string, so long lists are sent in chunks
+        chunks = [None] if ids is None else [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+        changed = 0
+        for chunk in chunks:
+            filters = list(params)
+            if chunk is not None:
+                filters.append(("id", "in.({})".format(",".join(f'"{message_id}"' for message_id in chunk))))
+            response = await self._request(
+                "PATCH", "/contact_messages",
+                params=filters,
+                json={"status": new_status},
+                headers={"Prefer": "return=representation"},
+            )
+            changed += len(response.json())
+        return changed
+
+
+def create_storage() -> Storage:
+    """Pick a storage backend from the environment"""
+    backend = os.getenv("STORAGE_BACKEND", "").lower()
+    url = os.getenv("SUPABASE_URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+    if backend not in ("", "memory", "sqlite", "postgrest"):
+        raise StorageError(f"Unknown STORAGE_BACKEND: {backend}")
+    if backend == "sqlite":
+        return SQLiteStorage(
+            os.getenv("STORAGE_SQLITE_PATH", "data/swiftify.db"),
+            timeout=float(os.getenv("STORAGE_TIMEOUT", "5")),
+        )
+    if backend == "memory" or (not backend and not (url and key)):
+        # Contact messages beyond the hot window are moved to segment files
+        hot_size = int(os.getenv("CONTACT_HOT_WINDOW", "5000"))
+        segment_size = int(os.getenv("CONTACT_SEGMENT_SIZE", "1000"))
+        log_dir = os.getenv("STORAGE_LOG_DIR")
+        if not log_dir:
+            return MemoryStorage(ContactInbox(hot_size=hot_size, segment_size=segment_size))
+        return LoggedMemoryStorage(
+            log_dir,
+            commit_delay=float(os.getenv("STORAGE_LOG_COMMIT_MS", "2")) / 1000,
+            snapshot_bytes=int(float(os.getenv("STORAGE_LOG_SNAPSHOT_MB", "16")) * 1024 * 1024),
+            position_interval=float(os.getenv("STORAGE_LOG_POSITION_INTERVAL", "30")),
+            inbox=ContactInbox(
+                os.path.join(log_dir, "contacts"), hot_size=hot_size, segment_size=segment_size, durable=True
+            ),
+        )
+    if not (url and key):
+        raise StorageError(f"STORAGE_BACKEND={backend} requires SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY")
+    return PostgRESTStorage(
+        url,
+        key,
+        max_connections=int(os.getenv("STORAGE_MAX_CONNECTIONS", "10")),
+        timeout=float(os.getenv("STORAGE_TIMEOUT", "5")),
+    )
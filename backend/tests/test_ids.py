@@ -0,0 +1,58 @@
+"""Tracking IDs: order, uniqueness and shard of issue."""
+import os
+import sys
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ids import MAX_SEQUENCE, TrackingIdGenerator, created_at, decode, id_bounds, shard_of  # noqa: E402
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ids_increase_within_and_across_shards():
+    clock = Clock(1780000000.0)
+    generators = [TrackingIdGenerator(shard, clock=clock) for shard in (0, 1, 7)]
+    issued = []
+    for step in range(200):
+        # Several IDs per millisecond, and a clock that steps back now and then
+        clock.now += -0.002 if step % 50 == 49 else 0.0004
+        for generator in generators:
+            issued.append((generator.shard, generator.next_id()))
+
+    for generator in generators:
+        own = [tracking_id for shard, tracking_id in issued if shard == generator.shard]
+        assert own == sorted(own)
+        assert len(set(own)) == len(own)
+        assert {shard_of(tracking_id) for tracking_id in own} == {generator.shard}
+    assert len({tracking_id for _, tracking_id in issued}) == len(issued)
+
+    # Across shards, IDs issued in a later millisecond sort after earlier ones
+    by_time = sorted(issued, key=lambda item: (decode(item[1])[0], item[1]))
+    assert [tracking_id for _, tracking_id in by_time] == sorted(tracking_id for _, tracking_id in issued)
+
+
+def test_exhausted_sequence_borrows_the_next_millisecond():
+    clock = Clock(1780000000.0)
+    generator = TrackingIdGenerator(3, clock=clock)
+    ids = [generator.next_id() for _ in range(MAX_SEQUENCE + 3)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert generator.borrowed_ms == 1
+    assert decode(ids[-1])[0] == decode(ids[0])[0] + 1
+
+
+def test_id_bounds_cover_creation_time():
+    clock = Clock(1780000000.5)
+    tracking_id = TrackingIdGenerator(5, clock=clock).next_id()
+    moment = created_at(tracking_id)
+    assert moment == datetime.fromtimestamp(1780000000.5, tz=timezone.utc)
+    low, high = id_bounds(datetime(2026, 1, 1), datetime(2027, 1, 1))
+    assert low <= tracking_id < high
@@ -0,0 +1,73 @@
+"""ContactInbox pages across the hot window and segment files."""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from inbox import ContactInbox, message_key  # noqa: E402
+
+
+def message(i: int) -> dict:
+    return {
+        "id": f"msg-{i:04d}",
+        "name": "Ann",
+        "email": "ann@example.com",
+        "message": f"Question {i}",
+        # Pairs of messages share a timestamp, so the id breaks ties
+        "timestamp": f"2026-06-01T00:{i // 2 // 60:02d}:{i // 2 % 60:02d}",
+        "status": ("new", "read", "archived")[i % 3],
+    }
+
+
+def pages(inbox: ContactInbox, limit: int, **filters) -> list:
+    """Every message, following the last key of each page"""
+    seen, after = [], None
+    while True:
+        page = inbox.query(after=after, limit=limit, **filters)
+        assert len(page) <= limit
+        seen.extend(page)
+        if len(page) < limit:
+            return seen
+        after = message_key(page[-1])
+
+
+def filled(tmp_path, count: int = 250) -> ContactInbox:
+    inbox = ContactInbox(str(tmp_path), hot_size=40, segment_size=30)
+    inbox.open()
+    # Out of order, so segments and the hot window interleave by key
+    for i in list(range(0, count, 2)) + list(range(1, count, 2)):
+        assert inbox.add(message(i))
+    return inbox
+
+
+def test_pages_cover_every_message_once(tmp_path):
+    inbox = filled(tmp_path)
+    expected = sorted((message(i) for i in range(250)), key=message_key)
+    assert inbox.stats()["segments"] > 1
+    for limit in (1, 7, 50, 500):
+        assert pages(inbox, limit) == expected
+        assert pages(inbox, limit, descending=True) == expected[::-1]
+
+
+def test_pages_by_status_and_since(tmp_path):
+    inbox = filled(tmp_path)
+    for status in ("new", "read", "archived"):
+        expected = sorted((message(i) for i in range(250) if message(i)["status"] == status), key=message_key)
+        assert pages(inbox, 9, status=status) == expected
+        assert pages(inbox, 9, status=status, descending=True) == expected[::-1]
+        assert inbox.count(status) == len(expected)
+
+    since = message(100)["timestamp"]
+    expected = sorted((message(i) for i in range(250) if message(i)["timestamp"] > since), key=message_key)
+    assert pages(inbox, 11, since=since) == expected
+
+
+def test_pages_after_status_change(tmp_path):
+    inbox = filled(tmp_path)
+    changed = inbox.set_status("archived", status="new", before=message(120)["timestamp"])
+    assert changed
+    archived = pages(inbox, 13, status="archived")
+    assert {m["id"] for m in archived} >= set(changed)
+    assert len(archived) == inbox.count("archived")
+    assert all(m["status"] == "archived" for m in archived)
@@ -0,0 +1,56 @@
+"""Incremental CSV and NDJSON parsing of bulk order uploads."""
+import asyncio
+import os
+import sys
+from typing import List
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ingest import MAX_ROW_BYTES, RowTooLarge, iter_csv_rows, iter_lines, iter_ndjson_rows  # noqa: E402
+
+CSV = (
+    "sender_name,sender_address,receiver_name,receiver_address,weight\r\n"
+    "Ann,\"San Francisco, CA\",Bob,\"Los Angeles, CA\",1-5kg\r\n"
+)
+
+
+async def body(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+def collect(rows, data: bytes, chunk_size: int = 7) -> List:
+    async def main():
+        return [row async for row in rows(body(data, chunk_size))]
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_csv_with_byte_order_mark(chunk_size):
+    rows = collect(iter_csv_rows, b"\xef\xbb\xbf" + CSV.encode(), chunk_size)
+    assert rows == [(1, {
+        "sender": {"name": "Ann", "address": "San Francisco, CA"},
+        "receiver": {"name": "Bob", "address": "Los Angeles, CA"},
+        "parcelDetails": {"dimensions": {}, "weight": "1-5kg"},
+    }, None)]
+
+
+def test_multibyte_characters_split_across_chunks():
+    lines = collect(iter_lines, "Zoë → Søren\nnaïve\n".encode(), chunk_size=1)
+    assert lines == ["Zoë → Søren", "naïve"]
+
+
+def test_row_limit_counts_bytes():
+    # Fewer characters than MAX_ROW_BYTES, but more bytes
+    row = '{"description": "' + "é" * (MAX_ROW_BYTES // 2) + '"}\n'
+    assert len(row) < MAX_ROW_BYTES < len(row.encode())
+    for chunk_size in (1024, len(row.encode()) + 1):
+        with pytest.raises(RowTooLarge):
+            collect(iter_ndjson_rows, row.encode(), chunk_size)
+
+    fits = '{"description": "' + "é" * (MAX_ROW_BYTES // 3) + '"}\n'
+    assert collect(iter_ndjson_rows, fits.encode(), 1024)[0][2] is None
@@ -0,0 +1,136 @@
+"""Write-ahead log replay of the logged in-memory storage."""
+import asyncio
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from journal import frame, read_frames  # noqa: E402
+from storage import LoggedMemoryStorage, StorageError  # noqa: E402
+
+
+def parcel(parcel_id: str, status: str = "pending") -> dict:
+    return {
+        "id": parcel_id,
+        "status": status,
+        "mode": "auto",
+        "createdAt": "2026-06-01T00:00:00",
+        "history": [{"status": status, "timestamp": "2026-06-01T00:00:00"}],
+    }
+
+
+def segments(directory: str) -> list:
+    return sorted(name for name in os.listdir(directory) if name.startswith("wal-"))
+
+
+async def reopen(directory: str) -> LoggedMemoryStorage:
+    storage = LoggedMemoryStorage(directory, position_interval=3600)
+    await storage.start()
+    return storage
+
+
+def test_read_frames_stops_at_torn_or_corrupt_frame():
+    payloads = [b"first", b"second", b"third"]
+    data = b"".join(map(frame, payloads))
+    assert list(read_frames(data)) == payloads
+    assert list(read_frames(data + frame(b"fourth")[:-2])) == payloads
+    corrupt = bytearray(data)
+    corrupt[-1] ^= 0xFF
+    assert list(read_frames(bytes(corrupt))) == payloads[:2]
+
+
+def test_replay_after_restart(tmp_path):
+    async def main():
+        storage = await reopen(str(tmp_path))
+        await storage.save_parcels([parcel("SWIFT-1"), parcel("SWIFT-2"), parcel("SWIFT-3")])
+        updated = parcel("SWIFT-1", "in-transit")
+        updated["history"].insert(0, parcel("SWIFT-1")["history"][0])
+        await storage.save_parcel(updated)
+        await storage.delete_parcel("SWIFT-3")
+        await storage.close()
+
+        storage = await reopen(str(tmp_path))
+        assert sorted(storage.parcels) == ["SWIFT-1", "SWIFT-2"]
+        restored = await storage.get_parcel("SWIFT-1")
+        assert restored["status"] == "in-transit"
+        assert [entry["status"] for entry in restored["history"]] == ["pending", "in-transit"]
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    async def main():
+        storage = await reopen(str(tmp_path))
+        await storage.save_parcel(parcel("SWIFT-1"))
+        await storage.save_parcel(parcel("SWIFT-2"))
+        await storage.close()
+        # A crash in the middle of the next write leaves part of a frame behind
+        last = os.path.join(str(tmp_path), segments(str(tmp_path))[-1])
+        with open(last, "ab") as f:
+            f.write(frame(b'{"op":"delete","id":"SWIFT-1"}')[:-4])
+
+        storage = await reopen(str(tmp_path))
+        assert sorted(storage.parcels) == ["SWIFT-1", "SWIFT-2"]
+        await storage.save_parcel(parcel("SWIFT-3"))
+        await storage.close()
+
+        # Writes after the restart went to a new segment, past the torn frame
+        storage = await reopen(str(tmp_path))
+        assert sorted(storage.parcels) == ["SWIFT-1", "SWIFT-2", "SWIFT-3"]
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_failed_write_is_undone_and_not_replayed(tmp_path):
+    async def main():
+        storage = await reopen(str(tmp_path))
+        await storage.save_parcel(parcel("SWIFT-1"))
+        flush = storage.journal._flush
+
+        def torn_write(pending):
+            if pending:
+                os.write(storage.journal._fd, pending[0][:5])
+                raise OSError(28, "No space left on device")
+            flush(pending)
+
+        storage.journal._flush = torn_write
+        try:
+            await storage.save_parcels([parcel("SWIFT-1", "in-transit"), parcel("SWIFT-2")])
+        except StorageError:
+            pass
+        else:
+            raise AssertionError("failed log write was acknowledged")
+        assert (await storage.get_parcel("SWIFT-1"))["status"] == "pending"
+        assert await storage.get_parcel("SWIFT-2") is None
+
+        storage.journal._flush = flush
+        await storage.save_parcel(parcel("SWIFT-3"))
+        await storage.close()
+
+        storage = await reopen(str(tmp_path))
+        assert sorted(storage.parcels) == ["SWIFT-1", "SWIFT-3"]
+        assert (await storage.get_parcel("SWIFT-1"))["status"] == "pending"
+        await storage.close()
+
+    asyncio.run(main())
+
+
+def test_replay_from_snapshot(tmp_path):
+    async def main():
+        storage = await reopen(str(tmp_path))
+        await storage.save_parcels([parcel(f"SWIFT-{i}") for i in range(10)])
+        await storage.snapshot()
+        await storage.delete_parcel("SWIFT-0")
+        await storage.save_parcel(parcel("SWIFT-10"))
+        await storage.close()
+        assert len(segments(str(tmp_path))) == 1
+
+        storage = await reopen(str(tmp_path))
+        assert sorted(storage.parcels) == sorted(f"SWIFT-{i}" for i in range(1, 11))
+        assert await storage.count_parcels() == 10
+        await storage.close()
+
+    asyncio.run(main())
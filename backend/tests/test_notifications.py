@@ -0,0 +1,128 @@
+"""NotificationDispatcher and SMTPSession against a local aiosmtpd server."""
+import asyncio
+import os
+import socket
+import sys
+import time
+
+from aiosmtpd.controller import Controller
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from notifications import NotificationDispatcher, SMTPSettings  # noqa: E402
+
+
+class Mailbox:
+    """aiosmtpd handler that keeps what it receives and can refuse the first messages"""
+
+    def __init__(self, refuse: int = 0):
+        self.refuse = refuse
+        self.attempts = []
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts.append(time.monotonic())
+        if self.refuse:
+            self.refuse -= 1
+            return "451 Try again later"
+        self.received.append((session.peer, envelope.rcpt_tos[0]))
+        return "250 OK"
+
+    @property
+    def connections(self) -> int:
+        return len({peer for peer, _ in self.received})
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run(test, refuse: int = 0, server_timeout: float = 300, **options) -> Mailbox:
+    mailbox = Mailbox(refuse)
+    controller = Controller(mailbox, hostname="127.0.0.1", port=free_port(), timeout=server_timeout)
+    controller.start()
+    settings = SMTPSettings(host="127.0.0.1", port=controller.port, sender="noreply@example.com", starttls=False)
+    try:
+        asyncio.run(test(NotificationDispatcher(settings, **options)))
+    finally:
+        controller.stop()
+    return mailbox
+
+
+def test_batch_shares_one_connection():
+    batches = []
+
+    async def test(dispatcher):
+        for i in range(5):
+            assert dispatcher.enqueue(f"user{i}@example.com", "Parcel update", "<p>In transit</p>")
+        await dispatcher.start()
+        await dispatcher.stop()
+        assert dispatcher.stats() == {"depth": 0, "sent": 5, "failed": 0, "retried": 0, "dropped": 0, "workers": 0}
+
+    mailbox = run(test, workers=1, observe_batch=batches.append)
+    assert sorted(to for _, to in mailbox.received) == [f"user{i}@example.com" for i in range(5)]
+    assert mailbox.connections == 1
+    assert len(batches) == 1
+
+
+def test_reconnects_after_server_disconnect():
+    async def test(dispatcher):
+        await dispatcher.start()
+        dispatcher.enqueue("first@example.com", "Parcel update", "first")
+        await dispatcher._queue.join()
+        # The server drops the idle session; the next send finds it closed
+        await asyncio.sleep(0.5)
+        dispatcher.enqueue("second@example.com", "Parcel update", "second")
+        await dispatcher.stop()
+        assert dispatcher.sent == 2
+        assert dispatcher.retried == dispatcher.failed == 0
+
+    mailbox = run(test, server_timeout=0.2, workers=1)
+    assert [to for _, to in mailbox.received] == ["first@example.com", "second@example.com"]
+    assert mailbox.connections == 2
+
+
+def test_refused_message_is_retried_with_backoff():
+    async def test(dispatcher):
+        await dispatcher.start()
+        dispatcher.enqueue("user@example.com", "Parcel update", "body")
+        # stop() waits for the pending retries as well
+        await dispatcher.stop()
+        assert dispatcher.sent == 1
+        assert dispatcher.retried == 2
+        assert dispatcher.failed == 0
+
+    mailbox = run(test, refuse=2, workers=1, backoff_base=0.1)
+    assert len(mailbox.received) == 1
+    first, second, third = mailbox.attempts
+    assert second - first >= 0.1
+    assert third - second >= 0.2
+
+
+def test_gives_up_after_max_retries():
+    async def test(dispatcher):
+        await dispatcher.start()
+        dispatcher.enqueue("user@example.com", "Parcel update", "body")
+        await dispatcher.stop()
+        assert dispatcher.stats()["depth"] == 0
+        assert (dispatcher.sent, dispatcher.retried, dispatcher.failed) == (0, 2, 1)
+
+    mailbox = run(test, refuse=10, workers=1, max_retries=2, backoff_base=0.01)
+    assert len(mailbox.attempts) == 3
+    assert mailbox.received == []
+
+
+def test_stop_drains_queue():
+    async def test(dispatcher):
+        await dispatcher.start()
+        for i in range(50):
+            dispatcher.enqueue(f"user{i}@example.com", "Parcel update", "body")
+        await dispatcher.stop()
+        assert dispatcher.sent == 50
+        assert not dispatcher.running
+
+    mailbox = run(test, workers=2, batch_size=8)
+    assert len(mailbox.received) == 50
@@ -0,0 +1,117 @@
+"""PostgRESTStorage against the PostgREST stand-in in benchmarks/stubs.py.
+
+The stand-in rejects rows that leave out a NOT NULL column of `parcels`,
+as Postgres does for an upsert even when the parcel already exists.
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+from storage import PostgRESTStorage, StorageError  # noqa: E402
+from stubs import PostgRESTStub  # noqa: E402
+
+
+def parcel(parcel_id: str) -> dict:
+    return {
+        "id": parcel_id,
+        "sender": {"name": "Ann", "address": "San Francisco, CA"},
+        "receiver": {"name": "Bob", "address": "Los Angeles, CA"},
+        "parcelDetails": {"description": "Books", "weight": "1-5kg"},
+        "status": "in-transit",
+        "mode": "auto",
+        "history": [{"status": "Package scheduled", "timestamp": "2026-06-01T00:00:00"}],
+        "route": [{"lat": 37.77, "lng": -122.42}, {"lat": 34.05, "lng": -118.24}],
+        "currentPosition": {"lat": 37.77, "lng": -122.42},
+        "createdAt": "2026-06-01T00:00:00",
+        "progress": 0,
+    }
+
+
+def run(test) -> None:
+    async def main():
+        stub = PostgRESTStub()
+        store = PostgRESTStorage("http://stub", "key", max_connections=2)
+        store._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub.app()), base_url=store.base_url)
+        try:
+            await test(store, stub)
+        finally:
+            await store.close()
+
+    asyncio.run(main())
+
+
+def test_stub_rejects_partial_upsert():
+    async def test(store, stub):
+        await store.save_parcels([parcel("SWIFT-1")])
+        try:
+            await store.save_parcel({"id": "SWIFT-1", "progress": 50})
+        except StorageError as e:
+            assert "400" in str(e)
+        else:
+            raise AssertionError("partial upsert was accepted")
+
+    run(test)
+
+
+def test_update_positions():
+    async def test(store, stub):
+        await store.save_parcels([parcel(f"SWIFT-{i}") for i in range(5)])
+        ids = [f"SWIFT-{i}" for i in range(5)] + ["SWIFT-MISSING"]
+        positions = [{"lat": 36.0 + i, "lng": -120.0} for i in range(5)] + [{"lat": 0, "lng": 0}]
+        # Two parcels at the same spot share a request
+        positions[4] = positions[3]
+        await store.update_positions(ids, positions, [10, 20, 30, 40, 40, 0], "2026-06-01T01:00:00", chunk_size=2)
+
+        stored = await store.get_parcels(ids)
+        assert sorted(stored) == ids[:5]
+        for i in range(5):
+            assert stored[ids[i]]["currentPosition"] == positions[i]
+            assert stored[ids[i]]["updatedAt"] == "2026-06-01T01:00:00"
+            assert stored[ids[i]]["status"] == "in-transit"
+        assert [stored[parcel_id]["progress"] for parcel_id in ids[:5]] == [10, 20, 30, 40, 40]
+
+    run(test)
+
+
+def test_update_parcels_patches_changed_columns():
+    async def test(store, stub):
+        await store.save_parcels([parcel("SWIFT-1"), parcel("SWIFT-2")])
+        patches = [
+            {
+                "id": "SWIFT-1",
+                "set": {"status": "delivered", "updatedAt": "2026-06-02T00:00:00"},
+                "unset": ["currentPosition"],
+                "historyFrom": 1,
+                "history": [{"status": "delivered", "timestamp": "2026-06-02T00:00:00"}],
+            },
+            {"id": "SWIFT-2", "set": {"status": "delivered", "updatedAt": "2026-06-02T00:00:00"}},
+        ]
+        await store.update_parcels([], patches)
+
+        stored = await store.get_parcels(["SWIFT-1", "SWIFT-2"])
+        assert stored["SWIFT-1"]["status"] == stored["SWIFT-2"]["status"] == "delivered"
+        assert stored["SWIFT-1"]["currentPosition"] is None
+        assert stored["SWIFT-2"]["currentPosition"] == {"lat": 37.77, "lng": -122.42}
+        assert [entry["status"] for entry in stored["SWIFT-1"]["history"]] == ["Package scheduled", "delivered"]
+        assert stored["SWIFT-1"]["sender"]["name"] == "Ann"
+
+    run(test)
+
+
+def test_insert_parcels_never_replaces():
+    async def test(store, stub):
+        assert await store.insert_parcels([parcel("SWIFT-1"), parcel("SWIFT-2")]) == []
+        other = dict(parcel("SWIFT-2"), sender={"name": "Eve"})
+        assert await store.insert_parcels([other, parcel("SWIFT-3")]) == ["SWIFT-2"]
+
+        stored = await store.get_parcels(["SWIFT-1", "SWIFT-2", "SWIFT-3"])
+        assert sorted(stored) == ["SWIFT-1", "SWIFT-2", "SWIFT-3"]
+        assert stored["SWIFT-2"]["sender"]["name"] == "Ann"
+
+    run(test)
@@ -0,0 +1,47 @@
+"""Token bucket refill of the per-client rate limiter."""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from ratelimit import RateLimiter, parse_rate  # noqa: E402
+
+
+def test_parse_rate():
+    assert parse_rate("30/minute") == (0.5, 30)
+    assert parse_rate("5") == (5.0, 5)
+    assert parse_rate("off") is None
+    with pytest.raises(ValueError):
+        parse_rate("10/fortnight")
+
+
+def test_bucket_refills_at_rate_up_to_burst():
+    limiter = RateLimiter()
+    rate, burst = parse_rate("60/minute")
+    key = ("track", "10.0.0.1")
+    for _ in range(burst):
+        assert limiter.acquire(key, rate, burst, now=100.0) == 0
+    assert limiter.acquire(key, rate, burst, now=100.0) == pytest.approx(1.0)
+    # Half a token back after half a second is not enough yet
+    assert limiter.acquire(key, rate, burst, now=100.5) == pytest.approx(0.5)
+    assert limiter.acquire(key, rate, burst, now=101.0) == 0
+    assert limiter.acquire(key, rate, burst, now=101.0) > 0
+
+    # A long pause refills no more than the burst
+    allowed = sum(limiter.acquire(key, rate, burst, now=1000.0) == 0 for _ in range(burst + 5))
+    assert allowed == burst
+    assert limiter.stats()["allowed"] == 2 * burst + 1
+
+
+def test_clients_have_separate_buckets():
+    limiter = RateLimiter(maxsize=2)
+    assert limiter.acquire("a", 1.0, 1, now=0.0) == 0
+    assert limiter.acquire("a", 1.0, 1, now=0.0) > 0
+    assert limiter.acquire("b", 1.0, 1, now=0.0) == 0
+    # The least recently used bucket goes first, and comes back full
+    assert limiter.acquire("c", 1.0, 1, now=0.0) == 0
+    assert limiter.stats()["evictions"] == 1
+    assert limiter.acquire("a", 1.0, 1, now=0.0) == 0
@@ -74,6 +74,40 @@ export interface TrackingResponse {
   progress: number;
 }
 
+export interface ParcelListParams {
+  limit?: number;
+  cursor?: string;
+  status?: string;
+  mode?: string;
+  created_from?: string;
+  created_to?: string;
+  sort?: 'createdAt' | '-createdAt';
+}
+
+export interface ParcelPage {
+  items: TrackingResponse[];
+  nextCursor: string | null;
+}
+
+export interface DashboardStats {
+  total: number;
+  byStatus: Record<string, number>;
+  byMode: Record<string, number>;
+  revenue: { total: number; byStatus: Record<string, number> };
+  createdPerDay: Record<string, number>;
+  deliveredPerDay: Record<string, number>;
+  stageDurations: Record<string, { count: number; avgHours: number }>;
+  rebuiltAt: string | null;
+}
+
+export type TrackingStreamMessage =
+  | { type: 'snapshot'; parcel: TrackingResponse }
+  | ({ type: 'update'; id: string; updatedAt: string; historyEntry?: TrackingResponse['history'][number] } &
+      Partial<Pick<TrackingResponse, 'status' | 'mode' | 'progress' | 'currentPosition'>>)
+  | { type: 'route'; id: string; updatedAt: string; route: TrackingResponse['route'] }
+  | { type: 'deleted'; id: string }
+  | { type: 'heartbeat' };
+
 class ApiClient {
   private async request<T>(
     endpoint: string,
@@ -249,14 +283,42 @@ class ApiClient {
     });
   }
 
-  async getAllParcels(token: string): Promise<ApiResponse<TrackingResponse[]>> {
-    return this.request('/api/admin/parcels', {
+  async getAllParcels(
+    token: string,
+    params: ParcelListParams = {}
+  ): Promise<ApiResponse<ParcelPage>> {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) query.set(key, String(value));
+    });
+    const suffix = query.toString() ? `?${query}` : '';
+    return this.request(`/api/admin/parcels${suffix}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+  }
+
+  async getStats(token: string, days = 30): Promise<ApiResponse<DashboardStats>> {
+    return this.request(`/api/admin/stats?days=${days}`, {
       headers: {
         Authorization: `Bearer ${token}`,
       },
     });
   }
 
+  subscribeToParcel(
+    trackingId: string,
+    onMessage: (message: TrackingStreamMessage) => void
+  ): () => void {
+    const source = new EventSource(`${API_BASE_URL}/api/track/${trackingId}/stream`);
+    source.onmessage = (event) => {
+      const message = JSON.parse(event.data) as TrackingStreamMessage;
+      if (message.type !== 'heartbeat') onMessage(message);
+    };
+    return () => source.close();
+  }
+
   async submitContact(data: {
     name: string;
     email: string;
@@ -1,5 +1,7 @@
 import L from 'leaflet';
 
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+
 // Map configuration and utilities
 export const DEFAULT_CENTER = { lat: 39.8283, lng: -98.5795 }; // Center of USA
 export const DEFAULT_ZOOM = 4;
@@ -69,6 +71,8 @@ const generateDirectRoute = (start: { lat: number; lng: number }, end: { lat: nu
 // Geocoding utilities
 export const geocodeAddress = async (address: string): Promise<{ lat: number; lng: number } | null> => {
   try {
+    const local = await geocodeWithBackend(address);
+    if (local) return local;
     if (isGoogleMapsAvailable()) {
       return await geocodeWithGoogle(address);
     } else {
@@ -80,6 +84,20 @@ export const geocodeAddress = async (address: string): Promise<{ lat: number; ln
   }
 };
 
+// Backend gazetteer (offline, cached server-side)
+const geocodeWithBackend = async (address: string) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/geocode?address=${encodeURIComponent(address)}`);
+    if (!response.ok) return null;
+
+    const data = await response.json();
+    return { lat: data.lat, lng: data.lng };
+  } catch (error) {
+    console.warn('Backend geocoding failed:', error);
+    return null;
+  }
+};
+
 // Google Geocoding
 const geocodeWithGoogle = async (address: string) => {
   // In a real implementation, this would use Google Geocoding API